@@ -5,127 +5,282 @@ Provides consistent field name resolution across all endpoints.
 
 import re
 import logging
+import threading
+from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
+# Handle common field aliases that the frontend might use
+COMMON_ALIASES = {
+    'household_average_income': 'median_income',
+    'household_income': 'median_income',
+    'average_income': 'median_income',
+    'income': 'median_income',
+    'household_median_income': 'median_income',
+    'disposable_household_income': 'disposable_income',
+    'mortgage_approval': 'mortgage_approvals',
+    'mortgage_approval_rate': 'mortgage_approvals',
+    'approval_rate': 'mortgage_approvals',
+}
+
+# If field has specific housing/demographic terms, columns sharing them can match
+KEY_TERMS = frozenset({'single', 'detached', 'house', 'apartment', 'condominium', 'condo',
+                       'visible', 'minority', 'income', 'population', 'structure', 'type'})
+
+_NON_WORD = re.compile(r'[^\w\s-]')  # Keep hyphens
+_SEPARATORS = re.compile(r'[-\s]+')
+_YEAR_WORDS = re.compile(r'\b(2024|2023|2022|2021|census|current|year|\$|%)\b')
+_YEARS = re.compile(r'\b(2024|2023|2022|2021)\b')
+_WORDS = re.compile(r'\w+')
+
+# Resolvers kept per (column set, schema); see FieldResolver.for_columns
+RESOLVER_CACHE_SIZE = 32
+RESULT_CACHE_SIZE = 4096  # Memoized field names per resolver
+_resolver_cache = OrderedDict()
+_resolver_cache_lock = threading.Lock()
+
+
+def _schema_fingerprint(master_schema):
+    """Content fingerprint of the parts of a schema a resolver uses: each entry's aliases and raw mapping"""
+    if not master_schema:
+        return None
+    return hash(repr([(details.get('aliases', []), details.get('raw_mapping'))
+                      for details in master_schema.values()]))
+
+
+def _snake(text):
+    """Convert hyphens and spaces to underscores after dropping punctuation"""
+    return _SEPARATORS.sub('_', _NON_WORD.sub('', text).strip())
+
+
+class FieldResolver:
+    """
+    Precompiled field resolver for one column set and schema.
+
+    Every normalized form of every column (lower case, snake case, without
+    year words, percentage base names) is computed once and indexed, so
+    exact, alias, snake and clean matches are dictionary lookups. The fuzzy
+    partial-percentage and key-term rules are only evaluated for columns
+    ahead of the best exact match, which keeps the result identical to
+    checking every rule column by column. Results are memoized per field.
+
+    Use `FieldResolver.for_columns` to share resolvers between requests with
+    the same columns and schema contents.
+    """
+
+    def __init__(self, available_columns, master_schema=None):
+        self.columns = list(available_columns)
+        self.column_set = set(self.columns)
+        self.schema_aliases = {}
+        self._results = {}
+
+        for details in (master_schema or {}).values():
+            for alias in details.get('aliases', []):
+                self.schema_aliases.setdefault(alias.lower(), details)
+
+        # Normalized key -> first column position, per rule
+        self.by_lower = {}
+        self.by_snake = {}
+        self.by_clean = {}
+        self.by_pct_base = {}
+        self.by_pct_clean = {}
+        # (position, clean base snake) for percentage columns, for partial matches
+        self.pct_columns = []
+        # (position, key terms, is percentage) for columns containing key terms
+        self.key_term_columns = []
+
+        for position, col in enumerate(self.columns):
+            col_lower = col.lower()
+            self.by_lower.setdefault(col_lower, position)
+            self.by_snake.setdefault(_snake(col_lower), position)
+            self.by_clean.setdefault(_snake(_YEAR_WORDS.sub('', col_lower)), position)
+
+            is_pct = '(%)' in col
+            if is_pct:
+                col_base = col.replace('(%)', '').strip()
+                self.by_pct_base.setdefault(_snake(col_base.lower()), position)
+                col_base_clean = _YEARS.sub('', col_base).strip()
+                if col_base_clean:
+                    col_base_clean_snake = _snake(col_base_clean.lower())
+                    self.by_pct_clean.setdefault(col_base_clean_snake, position)
+                    self.pct_columns.append((position, col_base_clean_snake))
+
+            col_key_terms = set(_WORDS.findall(col_lower)) & KEY_TERMS
+            if col_key_terms:
+                self.key_term_columns.append((position, col_key_terms, is_pct))
+
+    @classmethod
+    def for_columns(cls, available_columns, master_schema=None):
+        """
+        Return a cached resolver for this column set and schema, building it on first use.
+        Keyed on the schema's contents, so a schema edited in place gets a fresh index.
+        """
+        columns = tuple(available_columns)
+        key = (hash(columns), len(columns), _schema_fingerprint(master_schema))
+        with _resolver_cache_lock:
+            resolver = _resolver_cache.get(key)
+            if resolver is not None and resolver.columns == list(columns):
+                _resolver_cache.move_to_end(key)
+                return resolver
+        # Build outside the lock; a concurrent build of the same key just replaces this one
+        resolver = cls(columns, master_schema)
+        with _resolver_cache_lock:
+            _resolver_cache[key] = resolver
+            _resolver_cache.move_to_end(key)
+            while len(_resolver_cache) > RESOLVER_CACHE_SIZE:
+                _resolver_cache.popitem(last=False)
+        return resolver
+
+    def resolve(self, field_name):
+        """
+        Resolve one field name.
+
+        Returns:
+            tuple: (resolved name, rule that matched or None if unmatched)
+        """
+        result = self._results.get(field_name)
+        if result is None:
+            result = self._resolve(field_name)
+            if len(self._results) >= RESULT_CACHE_SIZE:
+                self._results.clear()
+            self._results[field_name] = result
+        return result
+
+    def _resolve(self, field_name):
+        if field_name in self.column_set:
+            return field_name, 'direct'
+
+        field_lower = field_name.lower()
+        if field_lower in COMMON_ALIASES:
+            return COMMON_ALIASES[field_lower], 'common_alias'
+
+        # Exact match in MASTER_SCHEMA aliases (if provided)
+        if field_lower in self.schema_aliases:
+            return self.schema_aliases[field_lower]['raw_mapping'], 'schema_alias'
+
+        is_pct_field = field_name.endswith('_pct')
+        base_field = field_name[:-4] if is_pct_field else None
+
+        # Earliest column matched by any exact rule
+        candidates = [
+            (self.by_lower.get(field_lower), 'lower'),
+            (self.by_snake.get(field_lower), 'snake'),
+            (self.by_clean.get(field_lower), 'clean'),
+        ]
+        if is_pct_field:
+            candidates.append((self.by_pct_base.get(base_field), 'percentage'))
+            candidates.append((self.by_pct_clean.get(base_field), 'clean_percentage'))
+        found = [(position, rule) for position, rule in candidates if position is not None]
+        best_position, best_rule = min(found, key=lambda item: item[0]) if found else (len(self.columns), None)
+
+        # Fuzzy rules only matter for columns ahead of the best exact match
+        fuzzy_position, fuzzy_rule = best_position, None
+        if is_pct_field:
+            base_terms = set(base_field.split('_'))
+            for position, col_base_clean_snake in self.pct_columns:
+                if position >= fuzzy_position:
+                    break
+                if base_field in col_base_clean_snake and base_terms.issubset(col_base_clean_snake.split('_')):
+                    fuzzy_position, fuzzy_rule = position, 'partial_percentage'
+                    break
+
+        important_field_terms = set(_WORDS.findall(field_lower)) & KEY_TERMS
+        if important_field_terms:
+            for position, col_key_terms, is_pct_col in self.key_term_columns:
+                if position >= fuzzy_position:
+                    break
+                # Percentage fields only match percentage columns and vice versa
+                if important_field_terms.issubset(col_key_terms) and is_pct_field == is_pct_col:
+                    fuzzy_position, fuzzy_rule = position, 'key_terms'
+                    break
+
+        if fuzzy_rule is not None:
+            return self.columns[fuzzy_position], fuzzy_rule
+        if best_rule is not None:
+            return self.columns[best_position], best_rule
+        return field_name, None
+
+
 def resolve_field_name(field_name, available_columns, master_schema=None):
     """
     Resolve field names from aliases and common variations.
-    
+
     Args:
         field_name (str): The field name to resolve
         available_columns (list): List of available column names in the dataset
         master_schema (dict): Optional master schema for additional aliases
-    
+
     Returns:
         str: The resolved field name
     """
     logger.info(f"Attempting to resolve field: '{field_name}'")
-    
-    if field_name in available_columns:
-        logger.info(f"Field '{field_name}' found directly in available columns")
-        return field_name
-    
-    # Handle common field aliases that the frontend might use
-    common_aliases = {
-        'household_average_income': 'median_income',
-        'household_income': 'median_income',
-        'average_income': 'median_income',
-        'income': 'median_income',
-        'household_median_income': 'median_income',
-        'disposable_household_income': 'disposable_income',
-        'mortgage_approval': 'mortgage_approvals',
-        'mortgage_approval_rate': 'mortgage_approvals',
-        'approval_rate': 'mortgage_approvals',
-    }
-    
-    if field_name.lower() in common_aliases:
-        resolved_field = common_aliases[field_name.lower()]
-        logger.info(f"Resolved common alias: '{field_name}' -> '{resolved_field}'")
-        return resolved_field
-    
-    # Dynamic field resolution for all fields
-    field_lower = field_name.lower()
-    logger.info(f"Searching for field with lowercase: '{field_lower}'")
-    
-    # First, try exact match in MASTER_SCHEMA aliases (if provided)
-    if master_schema:
-        for canonical_name, details in master_schema.items():
-            if field_lower in [alias.lower() for alias in details.get('aliases', [])]:
-                logger.info(f"Found field '{field_name}' in MASTER_SCHEMA aliases, mapping to '{details['raw_mapping']}'")
-                return details['raw_mapping']
-    
-    # If not found in aliases, try pattern matching for all fields
-    for col in available_columns:
-        col_lower = col.lower()
-        
-        # Direct match
-        if field_lower == col_lower:
-            logger.info(f"Direct match found: '{field_name}' -> '{col}'")
-            return col
-        
-        # Try snake_case conversion of the column name (preserve hyphens as underscores)
-        col_snake = re.sub(r'[^\w\s-]', '', col_lower)  # Keep hyphens
-        col_snake = re.sub(r'[-\s]+', '_', col_snake.strip())  # Convert hyphens and spaces to underscores
-        if field_lower == col_snake:
-            logger.info(f"Snake case match found: '{field_name}' -> '{col}' (snake: '{col_snake}')")
-            return col
-        
-        # Try without year prefixes
-        col_clean = re.sub(r'\b(2024|2023|2022|2021|census|current|year|\$|%)\b', '', col_lower)
-        col_clean = re.sub(r'[^\w\s-]', '', col_clean)  # Keep hyphens
-        col_clean = re.sub(r'[-\s]+', '_', col_clean.strip())  # Convert hyphens and spaces to underscores
-        if field_lower == col_clean:
-            logger.info(f"Clean match found: '{field_name}' -> '{col}' (clean: '{col_clean}')")
-            return col
-        
-        # For percentage fields, try with _pct suffix
-        if field_name.endswith('_pct') and '(%)' in col:
-            base_field = field_name[:-4]  # Remove _pct
-            col_base = col.replace('(%)', '').strip()
-            col_base_snake = re.sub(r'[^\w\s-]', '', col_base.lower())  # Keep hyphens
-            col_base_snake = re.sub(r'[-\s]+', '_', col_base_snake.strip())  # Convert hyphens and spaces to underscores
-            
-            if base_field == col_base_snake:
-                logger.info(f"Percentage match found: '{field_name}' -> '{col}' (base: '{col_base_snake}')")
-                return col
-            
-            # Try without year prefixes
-            col_base_clean = re.sub(r'\b(2024|2023|2022|2021)\b', '', col_base).strip()
-            if col_base_clean:
-                col_base_clean_snake = re.sub(r'[^\w\s-]', '', col_base_clean.lower())  # Keep hyphens
-                col_base_clean_snake = re.sub(r'[-\s]+', '_', col_base_clean_snake.strip())  # Convert hyphens and spaces to underscores
-                if base_field == col_base_clean_snake:
-                    logger.info(f"Clean percentage match found: '{field_name}' -> '{col}' (clean base: '{col_base_clean_snake}')")
-                    return col
-                
-                # Try partial matching - check if the base field is contained in the clean snake case
-                if base_field in col_base_clean_snake:
-                    # Additional validation: check if key terms match
-                    base_terms = set(base_field.split('_'))
-                    col_terms = set(col_base_clean_snake.split('_'))
-                    if base_terms.issubset(col_terms):
-                        logger.info(f"Partial percentage match found: '{field_name}' -> '{col}' (partial: '{base_field}' in '{col_base_clean_snake}')")
-                        return col
-        
-        # Try partial matching for key terms
-        field_terms = set(re.findall(r'\w+', field_lower))
-        col_terms = set(re.findall(r'\w+', col_lower))
-        
-        # If field has specific housing/demographic terms, check for matches
-        key_terms = {'single', 'detached', 'house', 'apartment', 'condominium', 'condo', 
-                    'visible', 'minority', 'income', 'population', 'structure', 'type'}
-        
-        if field_terms & key_terms:  # If field contains key terms
-            # Check if most important terms match
-            important_field_terms = field_terms & key_terms
-            important_col_terms = col_terms & key_terms
-            
-            if important_field_terms and important_field_terms.issubset(important_col_terms):
-                # Additional check for percentage fields
-                if (field_name.endswith('_pct') and '(%)' in col) or (not field_name.endswith('_pct') and '(%)' not in col):
-                    logger.info(f"Key terms match found: '{field_name}' -> '{col}' (terms: {important_field_terms})")
-                    return col
-    
-    logger.warning(f"No match found for field: '{field_name}'")
-    return field_name 
\ No newline at end of file
+
+    resolved_field, rule = FieldResolver.for_columns(available_columns, master_schema).resolve(field_name)
+
+    if rule is None:
+        logger.warning(f"No match found for field: '{field_name}'")
+    else:
+        logger.info(f"Resolved field '{field_name}' -> '{resolved_field}' ({rule} match)")
+    return resolved_field
+
+
+class ResolutionReport:
+    """
+    Structured diagnostics for resolve_many, in place of per-lookup log lines.
+
+    Attributes:
+        matches (dict): field name -> {'resolved': column, 'rule': rule that matched}
+        unresolved (list): field names that matched nothing and were passed through
+        rules (dict): rule -> number of fields it resolved
+    """
+
+    def __init__(self):
+        self.matches = {}
+        self.unresolved = []
+        self.rules = {}
+
+    def add(self, field_name, resolved_field, rule):
+        if rule is None:
+            self.unresolved.append(field_name)
+            return
+        self.matches[field_name] = {'resolved': resolved_field, 'rule': rule}
+        self.rules[rule] = self.rules.get(rule, 0) + 1
+
+    def to_dict(self):
+        return {
+            'resolved_count': len(self.matches),
+            'unresolved_count': len(self.unresolved),
+            'rules': dict(self.rules),
+            'unresolved': list(self.unresolved),
+            'matches': dict(self.matches)
+        }
+
+
+def resolve_many(field_names, available_columns, master_schema=None, report=None):
+    """
+    Resolve many field names against one column set.
+
+    The column index is built once (and reused from the resolver LRU for
+    column sets seen before), so each field is a lookup. Nothing is logged
+    per field; pass a ResolutionReport to collect which rule resolved each
+    field and which were unmatched.
+
+    Args:
+        field_names (iterable): Field names to resolve
+        available_columns (list): List of available column names in the dataset
+        master_schema (dict): Optional master schema for additional aliases
+        report (ResolutionReport): Optional report to fill with diagnostics
+
+    Returns:
+        dict: field name -> resolved field name (unmatched names map to themselves)
+    """
+    resolver = FieldResolver.for_columns(available_columns, master_schema)
+    mappings = {}
+    for field_name in field_names:
+        resolved_field, rule = resolver.resolve(field_name)
+        mappings[field_name] = resolved_field
+        if report is not None:
+            report.add(field_name, resolved_field, rule)
+    if report is not None and report.unresolved:
+        logger.debug(f"resolve_many: {len(report.unresolved)} of {len(mappings)} fields unresolved")
+    return mappings
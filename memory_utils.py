@@ -4,14 +4,46 @@ Provides streaming batch processing and memory monitoring to prevent OOM errors
 """
 
 import gc
+import atexit
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import warnings
 import psutil
 import numpy as np
 import pandas as pd
-from typing import List, Tuple, Any, Optional
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Any, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Conservative estimate of SHAP working memory per sample, in MB
+MEMORY_PER_SAMPLE_MB = 10
+
+# Learned batch cost coefficients, shared by every process on the host
+BATCH_PROFILE_PATH = os.environ.get(
+    'SHAP_BATCH_PROFILE_PATH', os.path.join(tempfile.gettempdir(), 'shap_batch_profiles.json')
+)
+TARGET_BATCH_SECONDS = float(os.environ.get('SHAP_TARGET_BATCH_SECONDS', '2.0'))
+ADAPTIVE_BATCHING = os.environ.get('SHAP_ADAPTIVE_BATCHING', 'True').lower() == 'true'
+
+# Per-endpoint telemetry used to size endpoints from observed cost
+ENDPOINT_PROFILE_PATH = os.environ.get(
+    'ENDPOINT_PROFILE_PATH', os.path.join(tempfile.gettempdir(), 'shap_endpoint_profiles.json')
+)
+ENDPOINT_MEMORY_FRACTION = float(os.environ.get('ENDPOINT_MEMORY_FRACTION', '0.7'))  # Of the container limit
+ENDPOINT_TARGET_SECONDS = float(os.environ.get('ENDPOINT_TARGET_SECONDS', '30'))
+ENDPOINT_PROFILE_SAVE_SECONDS = float(os.environ.get('ENDPOINT_PROFILE_SAVE_SECONDS', '30'))
+
+# Reference feature matrices shared between worker processes (tmpfs when available)
+SHARED_FEATURES_DIR = os.environ.get(
+    'SHARED_FEATURES_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+)
+
 def get_memory_usage() -> float:
     """Get current memory usage in MB"""
     try:
@@ -20,6 +52,20 @@ def get_memory_usage() -> float:
     except:
         return 0.0
 
+def get_unique_memory_usage(pid: Optional[int] = None) -> float:
+    """
+    Memory held only by a process (USS) in MB, without the pages it shares
+    with its parent after fork. Falls back to RSS where USS is unavailable.
+    """
+    try:
+        process = psutil.Process(pid)
+        try:
+            return process.memory_full_info().uss / 1024 / 1024
+        except (psutil.AccessDenied, AttributeError):
+            return process.memory_info().rss / 1024 / 1024
+    except:
+        return 0.0
+
 def get_available_memory() -> float:
     """Get available system memory in MB"""
     try:
@@ -27,6 +73,56 @@ def get_available_memory() -> float:
     except:
         return 1000.0  # Default fallback
 
+def get_container_memory_limit() -> float:
+    """
+    Memory limit of the container in MB, read from the cgroup (v2, then v1).
+    Falls back to total system memory when no limit is set.
+    """
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit():
+            limit_mb = int(value) / 1024 / 1024
+            # cgroup v1 reports "no limit" as a huge number
+            if limit_mb < psutil.virtual_memory().total / 1024 / 1024:
+                return limit_mb
+    try:
+        return psutil.virtual_memory().total / 1024 / 1024
+    except:
+        return 1000.0  # Default fallback
+
+class PeakMemoryMonitor:
+    """Samples RSS in a background thread to find the peak over a block of code"""
+    
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.baseline_mb = 0.0
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def __enter__(self):
+        self.baseline_mb = self.peak_mb = get_memory_usage()
+        self._thread = threading.Thread(target=self._run, name='peak-memory-monitor', daemon=True)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, get_memory_usage())
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, get_memory_usage())
+    
+    @property
+    def delta_mb(self) -> float:
+        return max(0.0, self.peak_mb - self.baseline_mb)
+
 def force_garbage_collection():
     """Force garbage collection and return memory freed in MB"""
     before = get_memory_usage()
@@ -37,12 +133,22 @@ def force_garbage_collection():
     return freed
 
 def calculate_optimal_batch_size(total_samples: int, max_memory_mb: float = 800) -> int:
-    """Calculate optimal batch size based on available memory and sample count"""
+    """
+    Calculate optimal batch size based on available memory and sample count
+    
+    Deprecated: uses the fixed MEMORY_PER_SAMPLE_MB guess. batch_shap_calculation
+    and iter_shap_batches size batches with AdaptiveBatchSizer when batch_size is None.
+    """
+    warnings.warn(
+        "calculate_optimal_batch_size is deprecated; pass batch_size=None to "
+        "batch_shap_calculation to size batches adaptively",
+        DeprecationWarning, stacklevel=2
+    )
     available_memory = get_available_memory()
     current_memory = get_memory_usage()
     
     # Conservative estimate: 10MB per sample for SHAP calculations
-    memory_per_sample = 10
+    memory_per_sample = MEMORY_PER_SAMPLE_MB
     safe_memory_limit = min(max_memory_mb, available_memory * 0.7)
     
     # Calculate batch size that won't exceed memory limit
@@ -60,70 +166,235 @@ def calculate_optimal_batch_size(total_samples: int, max_memory_mb: float = 800)
     
     return batch_size
 
-def batch_shap_calculation(explainer, X: pd.DataFrame, 
-                          batch_size: Optional[int] = None,
-                          max_memory_mb: float = 800,
-                          progress_callback=None) -> np.ndarray:
+class AdaptiveBatchSizer:
     """
-    Calculate SHAP values in memory-safe batches
+    Sizes SHAP batches from measured cost instead of a fixed per-sample guess.
+    
+    For each explainer (keyed by explainer class, model class, feature count
+    and tree shape), the sizer keeps the RSS growth and compute time per
+    sample it has observed. With no history it starts with a small probe
+    batch. After that, each batch is as large as the memory headroom and the
+    target batch duration both allow, at most doubling from one batch to the
+    next. Memory coefficients rise immediately on a larger observation and
+    decay slowly, and a failed batch doubles them.
+    
+    Coefficients are persisted to a JSON file, so later requests and new
+    workers start tuned.
+    """
+    
+    MIN_MB_PER_SAMPLE = 0.01
+    MIN_SECONDS_PER_SAMPLE = 1e-5
+    
+    def __init__(self, profile_path: Optional[str] = BATCH_PROFILE_PATH,
+                 target_batch_seconds: float = TARGET_BATCH_SECONDS,
+                 memory_safety: float = 0.7,
+                 min_batch_size: int = 10,
+                 max_batch_size: int = 5000,
+                 probe_size: int = 10,
+                 smoothing: float = 0.3):
+        self.profile_path = profile_path
+        self.target_batch_seconds = target_batch_seconds
+        self.memory_safety = memory_safety
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.probe_size = probe_size
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._profiles: Dict[str, Dict[str, float]] = self._load()
+    
+    @staticmethod
+    def explainer_key(explainer, n_features: int) -> str:
+        """Identify an explainer by what drives its per-sample cost"""
+        model = getattr(explainer, 'model', None)
+        parts = [type(explainer).__name__, type(getattr(model, 'original_model', model)).__name__, str(n_features)]
+        trees = getattr(model, 'trees', None)
+        if trees is not None:
+            parts.append(f"trees={len(trees)}")
+        max_depth = getattr(model, 'max_depth', None)
+        if max_depth is not None:
+            parts.append(f"depth={max_depth}")
+        return ':'.join(parts)
+    
+    def coefficients(self, key: str) -> Optional[Dict[str, float]]:
+        with self._lock:
+            profile = self._profiles.get(key)
+            return dict(profile) if profile else None
+    
+    def next_batch_size(self, key: str, remaining: int, max_memory_mb: float,
+                        previous: Optional[int] = None,
+                        headroom_mb: Optional[float] = None) -> int:
+        """
+        Largest batch within the memory headroom and the target batch duration.
+        The headroom defaults to max_memory_mb less this process's RSS; callers
+        that share the budget (e.g. ShapWorkerPool) pass their own share.
+        """
+        profile = self.coefficients(key)
+        if profile is None:
+            size = self.probe_size
+        else:
+            if headroom_mb is None:
+                headroom_mb = max(0.0, max_memory_mb - get_memory_usage())
+            headroom_mb = min(headroom_mb, get_available_memory())
+            by_memory = headroom_mb * self.memory_safety / max(profile['mb_per_sample'], self.MIN_MB_PER_SAMPLE)
+            by_time = self.target_batch_seconds / max(profile['seconds_per_sample'], self.MIN_SECONDS_PER_SAMPLE)
+            size = int(min(by_memory, by_time))
+            if previous:
+                size = min(size, previous * 2)
+        return max(1, min(max(size, self.min_batch_size), self.max_batch_size, remaining))
+    
+    def record(self, key: str, batch_size: int, memory_delta_mb: float, seconds: float):
+        """Fold one measured batch into the coefficients for this explainer"""
+        if batch_size <= 0:
+            return
+        mb_per_sample = max(memory_delta_mb / batch_size, self.MIN_MB_PER_SAMPLE)
+        seconds_per_sample = max(seconds / batch_size, self.MIN_SECONDS_PER_SAMPLE)
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is None:
+                self._profiles[key] = {
+                    'mb_per_sample': mb_per_sample,
+                    'seconds_per_sample': seconds_per_sample,
+                    'observations': 1
+                }
+                return
+            # Memory: take larger observations at once, let smaller ones pull the estimate down slowly
+            if mb_per_sample > profile['mb_per_sample']:
+                profile['mb_per_sample'] = mb_per_sample
+            else:
+                profile['mb_per_sample'] += self.smoothing * (mb_per_sample - profile['mb_per_sample'])
+            profile['seconds_per_sample'] += self.smoothing * (seconds_per_sample - profile['seconds_per_sample'])
+            profile['observations'] += 1
+    
+    def record_failure(self, key: str, batch_size: int):
+        """Treat a failed batch as a sign the memory estimate was too low"""
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is not None:
+                profile['mb_per_sample'] *= 2
+                logger.info(f"Batch of {batch_size} failed; raised memory estimate for {key} "
+                            f"to {profile['mb_per_sample']:.3f}MB/sample")
+    
+    def save(self):
+        """Write the coefficients to profile_path, replacing the file atomically"""
+        if not self.profile_path:
+            return
+        with self._lock:
+            data = json.dumps(self._profiles, indent=2, sort_keys=True)
+        try:
+            tmp_path = f"{self.profile_path}.tmp-{os.getpid()}"
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, self.profile_path)
+        except OSError as e:
+            logger.warning(f"Could not save SHAP batch profiles to {self.profile_path}: {str(e)}")
+    
+    def _load(self) -> Dict[str, Dict[str, float]]:
+        if not self.profile_path or not os.path.isfile(self.profile_path):
+            return {}
+        try:
+            with open(self.profile_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable SHAP batch profiles {self.profile_path}: {str(e)}")
+            return {}
+
+_default_batch_sizer: Optional[AdaptiveBatchSizer] = None
+
+def get_batch_sizer() -> AdaptiveBatchSizer:
+    """Process-wide AdaptiveBatchSizer backed by BATCH_PROFILE_PATH"""
+    global _default_batch_sizer
+    if _default_batch_sizer is None:
+        _default_batch_sizer = AdaptiveBatchSizer()
+    return _default_batch_sizer
+
+def iter_shap_batches(explainer, X: pd.DataFrame,
+                      batch_size: Optional[int] = None,
+                      max_memory_mb: float = 800,
+                      progress_callback=None,
+                      out: Optional[np.ndarray] = None) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Calculate SHAP values in memory-safe batches, yielding each batch as it completes
     
     Args:
         explainer: SHAP explainer object
         X: Input data for SHAP calculation
-        batch_size: Batch size (auto-calculated if None)
+        batch_size: Batch size (sized adaptively from measured cost if None)
         max_memory_mb: Maximum memory to use
         progress_callback: Optional callback for progress updates
+        out: Optional preallocated (or memory-mapped) array of len(X) rows; each
+            batch is written into it and the yielded block is a view of it
     
-    Returns:
-        numpy array of SHAP values
+    Yields:
+        Tuples of (row_offset, shap_block) in row order
     """
     total_samples = len(X)
+    if out is not None and len(out) != total_samples:
+        raise ValueError(f"Output array has {len(out)} rows, expected {total_samples}")
     
-    if batch_size is None:
-        batch_size = calculate_optimal_batch_size(total_samples, max_memory_mb)
+    sizer = get_batch_sizer() if batch_size is None else None
+    if sizer:
+        sizer_key = sizer.explainer_key(explainer, X.shape[1])
+        batch_size = sizer.next_batch_size(sizer_key, total_samples, max_memory_mb)
     
     logger.info(f"Starting batch SHAP calculation: {total_samples} samples, "
-                f"batch size {batch_size}")
+                f"batch size {batch_size}{' (adaptive)' if sizer else ''}")
     
-    results = []
+    i = 0
+    batch_num = 0
     
-    for i in range(0, total_samples, batch_size):
+    while i < total_samples:
+        if sizer and batch_num:
+            batch_size = sizer.next_batch_size(sizer_key, total_samples - i, max_memory_mb, previous=batch_size)
         start_mem = get_memory_usage()
         
         # Force garbage collection if memory is getting high
         if start_mem > max_memory_mb * 0.8:
             force_garbage_collection()
+            start_mem = get_memory_usage()
         
         # Get batch
         end_idx = min(i + batch_size, total_samples)
         batch = X.iloc[i:end_idx]
+        batch_start = time.perf_counter()
         
         try:
             # Calculate SHAP values for batch
             batch_shap = explainer.shap_values(batch)
+            if sizer:
+                sizer.record(sizer_key, end_idx - i, get_memory_usage() - start_mem,
+                             time.perf_counter() - batch_start)
             
             # Convert to list if single output
             if not isinstance(batch_shap, list):
                 batch_shap = [batch_shap]
             
-            results.append(batch_shap[0])  # Take first output for binary classification
+            block = batch_shap[0]  # Take first output for binary classification
+            if out is not None:
+                out[i:end_idx] = block
+                block = out[i:end_idx]
             
             # Clean up immediately
             del batch_shap
             del batch
             
+            yield i, block
+            del block
+            
         except Exception as e:
             logger.error(f"Error in batch {i}-{end_idx}: {str(e)}")
+            if sizer:
+                sizer.record_failure(sizer_key, end_idx - i)
             # Try with smaller batch size
             if batch_size > 10:
                 smaller_batch_size = max(10, batch_size // 2)
                 logger.info(f"Retrying with smaller batch size: {smaller_batch_size}")
                 
                 # Recursively process this batch with smaller size
-                sub_batch_shap = batch_shap_calculation(
-                    explainer, batch, smaller_batch_size, max_memory_mb
-                )
-                results.append(sub_batch_shap)
+                sub_out = out[i:end_idx] if out is not None else None
+                for sub_offset, sub_block in iter_shap_batches(
+                    explainer, batch, smaller_batch_size, max_memory_mb, out=sub_out
+                ):
+                    yield i + sub_offset, sub_block
             else:
                 raise e
         
@@ -136,22 +407,302 @@ def batch_shap_calculation(explainer, X: pd.DataFrame,
             progress_callback(progress)
         
         end_mem = get_memory_usage()
-        logger.info(f"Batch {i//batch_size + 1}/{(total_samples-1)//batch_size + 1} complete. "
+        batch_num += 1
+        logger.info(f"Batch {batch_num} complete ({end_idx}/{total_samples} samples, size {end_idx - i}). "
                    f"Memory: {start_mem:.1f}MB → {end_mem:.1f}MB")
+        i = end_idx
     
-    # Combine all results
-    if not results:
-        raise ValueError("No SHAP values calculated - all batches failed")
+    if sizer:
+        sizer.save()
+
+def allocate_shap_output(n_rows: int, n_features: int, path: Optional[str] = None,
+                         dtype: Any = np.float32) -> np.ndarray:
+    """
+    Allocate an output array for iter_shap_batches / batch_shap_calculation,
+    as a memory-mapped .npy file when a path is given
+    """
+    if path:
+        return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(n_rows, n_features))
+    return np.empty((n_rows, n_features), dtype=dtype)
+
+def batch_shap_calculation(explainer, X: pd.DataFrame, 
+                          batch_size: Optional[int] = None,
+                          max_memory_mb: float = 800,
+                          progress_callback=None,
+                          n_jobs: int = 1,
+                          out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Calculate SHAP values in memory-safe batches
+    
+    Args:
+        explainer: SHAP explainer object
+        X: Input data for SHAP calculation
+        batch_size: Batch size (sized adaptively from measured cost if None)
+        max_memory_mb: Maximum memory to use
+        progress_callback: Optional callback for progress updates
+        n_jobs: Worker processes to spread batches over (1 = in-process, -1 = all cores)
+        out: Optional preallocated (or memory-mapped) array to write the results into
     
-    combined_shap = np.concatenate(results, axis=0)
+    Returns:
+        numpy array of SHAP values (`out` itself, if given)
+    """
+    total_samples = len(X)
     
-    # Final cleanup
-    del results
-    force_garbage_collection()
+    if n_jobs != 1 and total_samples > (batch_size or get_batch_sizer().min_batch_size):
+        with ShapWorkerPool(explainer, n_jobs) as pool:
+            return pool.compute(X, batch_size, max_memory_mb, progress_callback, out=out)
+    
+    # Write each batch into one array as it completes, instead of concatenating at the end
+    combined_shap = out
+    for offset, block in iter_shap_batches(explainer, X, batch_size, max_memory_mb, progress_callback, out=out):
+        if out is None:
+            if combined_shap is None:
+                combined_shap = np.empty((total_samples,) + block.shape[1:], dtype=block.dtype)
+            combined_shap[offset:offset + len(block)] = block
+        del block
+    
+    if combined_shap is None:
+        raise ValueError("No SHAP values calculated - all batches failed")
     
     logger.info(f"Batch SHAP calculation complete. Final shape: {combined_shap.shape}")
     return combined_shap
 
+# Explainer held by each ShapWorkerPool process, set once by the pool initializer
+_worker_explainer = None
+
+def _init_shap_worker(explainer):
+    global _worker_explainer
+    _worker_explainer = explainer
+
+def _shap_worker_batch(batch: pd.DataFrame) -> Tuple[np.ndarray, float, float]:
+    """Compute one batch in a pool worker; returns (shap values, peak RSS growth in MB, seconds)"""
+    batch_start = time.perf_counter()
+    with PeakMemoryMonitor() as monitor:
+        batch_shap = _worker_explainer.shap_values(batch)
+        if isinstance(batch_shap, list):
+            batch_shap = batch_shap[0]  # Take first output for binary classification
+        batch_shap = np.asarray(batch_shap)
+    return batch_shap, monitor.delta_mb, time.perf_counter() - batch_start
+
+class ShapWorkerPool:
+    """
+    Process pool that computes SHAP batches in parallel.
+    
+    The explainer is sent to each worker once, when the worker starts, rather
+    than with every batch. Batches are only submitted while the parent and
+    every live worker, busy or idle, stay within `max_memory_mb`. Workers are
+    measured by their unique memory (USS), so pages they still share with the
+    parent after fork are counted once, and each in-flight batch reserves the
+    peak memory growth measured for batches of its size. Results are written
+    into one preallocated array by row offset, so they come back in input order.
+    
+    Keep a pool open across calls to reuse the workers:
+    
+        with ShapWorkerPool(explainer, n_jobs=-1) as pool:
+            shap_values = pool.compute(X, batch_size=100, max_memory_mb=2000)
+    """
+    
+    def __init__(self, explainer, n_jobs: int = -1):
+        self.workers = (os.cpu_count() or 1) if n_jobs in (-1, 0, None) else max(1, n_jobs)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_shap_worker,
+            initargs=(explainer,)
+        )
+        self.explainer = explainer
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+    
+    def worker_memory_usage(self) -> float:
+        """Unique memory (USS) of every live worker process, in MB"""
+        processes = getattr(self.executor, '_processes', None) or {}
+        return sum(get_unique_memory_usage(pid) for pid in list(processes))
+    
+    def pool_memory_usage(self) -> float:
+        """Parent RSS plus the unique memory of every live worker, in MB"""
+        return get_memory_usage() + self.worker_memory_usage()
+    
+    def compute(self, X: pd.DataFrame, batch_size: Optional[int] = None, max_memory_mb: float = 800,
+                progress_callback=None, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Calculate SHAP values for X across the pool
+        
+        Args:
+            X: Input data for SHAP calculation
+            batch_size: Rows per batch sent to a worker (sized adaptively from measured cost if None)
+            max_memory_mb: Memory budget for the parent and all workers together
+            progress_callback: Optional callback for progress updates
+            out: Optional preallocated (or memory-mapped) array to write the results into
+        
+        Returns:
+            numpy array of SHAP values, in the row order of X
+        """
+        total_samples = len(X)
+        sizer = get_batch_sizer()
+        sizer_key = sizer.explainer_key(self.explainer, X.shape[1])
+        adaptive = batch_size is None
+        
+        # Until a worker has measured a batch, cost batches from the sizer's learned
+        # MB per sample, or the conservative default when there is no history yet
+        profile = sizer.coefficients(sizer_key)
+        mb_per_sample = profile['mb_per_sample'] if profile else MEMORY_PER_SAMPLE_MB
+        
+        logger.info(f"Starting parallel SHAP calculation: {total_samples} samples, "
+                    f"batch size {'adaptive' if adaptive else batch_size}, {self.workers} workers")
+        
+        output = out
+        done_samples = 0
+        pending: Dict[Any, Tuple[int, int]] = {}
+        next_start = 0
+        
+        while next_start < total_samples or pending:
+            # Fill the pool: every submitted batch reserves its measured cost on
+            # top of what the parent and the live workers hold right now
+            while next_start < total_samples and len(pending) < self.workers:
+                if adaptive:
+                    batch_size = self._next_batch_size(sizer, sizer_key, total_samples - next_start,
+                                                       max_memory_mb, batch_size)
+                end_idx = min(next_start + batch_size, total_samples)
+                reserved_mb = sum(end - start for start, end in pending.values()) * mb_per_sample
+                # In-flight batches keep their full reservation, even if part of it already shows in USS
+                if pending and (self.pool_memory_usage() + reserved_mb
+                                + (end_idx - next_start) * mb_per_sample > max_memory_mb):
+                    break
+                future = self.executor.submit(_shap_worker_batch, X.iloc[next_start:end_idx])
+                pending[future] = (next_start, end_idx)
+                next_start = end_idx
+            
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                start, end_idx = pending.pop(future)
+                try:
+                    batch_shap, batch_mb, seconds = future.result()
+                    sizer.record(sizer_key, end_idx - start, batch_mb, seconds)
+                    # Memory estimates only rise, so reservations never undercut a measured batch
+                    mb_per_sample = max(mb_per_sample, batch_mb / (end_idx - start))
+                except Exception as e:
+                    logger.error(f"Error in parallel batch {start}-{end_idx}: {str(e)}")
+                    sizer.record_failure(sizer_key, end_idx - start)
+                    if end_idx - start <= 10:
+                        raise e
+                    # Retry this slice in-process with smaller batches
+                    smaller_batch_size = max(10, (end_idx - start) // 2)
+                    logger.info(f"Retrying batch {start}-{end_idx} in-process with batch size "
+                                f"{smaller_batch_size}")
+                    batch_shap = batch_shap_calculation(
+                        self.explainer, X.iloc[start:end_idx], smaller_batch_size, max_memory_mb,
+                        out=output[start:end_idx] if output is not None else None
+                    )
+                
+                if output is None:
+                    output = np.empty((total_samples,) + batch_shap.shape[1:], dtype=batch_shap.dtype)
+                output[start:end_idx] = batch_shap
+                done_samples += end_idx - start
+                del batch_shap
+                
+                if progress_callback:
+                    progress_callback((done_samples / total_samples) * 100)
+        
+        sizer.save()
+        
+        if output is None:
+            raise ValueError("No SHAP values calculated - all batches failed")
+        
+        logger.info(f"Parallel SHAP calculation complete. Final shape: {output.shape}, "
+                    f"pool memory: {self.pool_memory_usage():.1f}MB")
+        return output
+    
+    def _next_batch_size(self, sizer: AdaptiveBatchSizer, key: str, remaining: int,
+                         max_memory_mb: float, previous: Optional[int]) -> int:
+        """Sizer's next batch for one worker's share of the headroom, leaving work for every worker"""
+        headroom_mb = max(0.0, max_memory_mb - self.pool_memory_usage()) / self.workers
+        size = sizer.next_batch_size(key, remaining, max_memory_mb, previous=previous, headroom_mb=headroom_mb)
+        per_worker = -(-remaining // self.workers)
+        return min(size, max(per_worker, sizer.min_batch_size))
+
+def _sample_bins(bins: np.ndarray, quotas: List[int], rng: np.random.Generator) -> np.ndarray:
+    """
+    Row positions drawn without replacement from each bin: up to quotas[b]
+    rows with bins == b. Rows in bin -1 are never drawn.
+    """
+    picks = []
+    for b, quota in enumerate(quotas):
+        members = np.flatnonzero(bins == b)
+        take = min(int(quota), len(members))
+        if take > 0:
+            picks.append(members[rng.choice(len(members), size=take, replace=False)])
+    return np.concatenate(picks) if picks else np.empty(0, dtype=np.intp)
+
+def _fill_quotas(quotas: List[int], counts: np.ndarray, total: int) -> List[int]:
+    """
+    Cap each bin's quota at the rows it has and hand the quota it can't use to
+    the bins that still have rows, until the quotas add up to `total` (or
+    every bin is exhausted).
+    """
+    quotas = np.minimum(np.asarray(quotas, dtype=np.int64), counts)
+    shortfall = total - int(quotas.sum())
+    while shortfall > 0:
+        open_bins = np.flatnonzero(quotas < counts)
+        if not len(open_bins):
+            break
+        share = max(1, shortfall // len(open_bins))
+        for b in open_bins:
+            extra = min(share, int(counts[b] - quotas[b]), shortfall)
+            quotas[b] += extra
+            shortfall -= extra
+            if not shortfall:
+                break
+    return quotas.tolist()
+
+def reservoir_sample(chunks: Iterable[pd.DataFrame], max_samples: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Uniform sample of max_samples rows from a stream of DataFrame chunks
+    (e.g. `pd.read_csv(path, chunksize=100_000)`) without materializing it.
+    
+    Each row gets a random key and the rows with the smallest keys are kept,
+    so every row is equally likely to be chosen and none is chosen twice.
+    Memory is bounded by max_samples plus one chunk.
+    """
+    rng = np.random.default_rng(seed)
+    reservoir: Optional[pd.DataFrame] = None
+    keys = np.empty(0)
+    seen = 0
+    
+    for chunk in chunks:
+        seen += len(chunk)
+        chunk_keys = rng.random(len(chunk))
+        if reservoir is None:
+            candidates, candidate_keys = chunk, chunk_keys
+        else:
+            # Only chunk rows that beat the current worst key can enter a full reservoir
+            if len(reservoir) >= max_samples:
+                keep = chunk_keys < keys.max()
+                chunk, chunk_keys = chunk[keep], chunk_keys[keep]
+            candidates = pd.concat([reservoir, chunk], ignore_index=True)
+            candidate_keys = np.concatenate([keys, chunk_keys])
+        if len(candidates) > max_samples:
+            best = np.argpartition(candidate_keys, max_samples - 1)[:max_samples]
+            candidates, candidate_keys = candidates.iloc[best], candidate_keys[best]
+        reservoir, keys = candidates.reset_index(drop=True), candidate_keys
+    
+    if reservoir is None:
+        return pd.DataFrame()
+    logger.info(f"Reservoir-sampled {len(reservoir)} of {seen} records")
+    return reservoir
+
+def _target_values(df: pd.DataFrame, target_field: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Target column as floats, its missing mask and the values that are present"""
+    values = df[target_field].to_numpy(dtype=float)
+    missing = np.isnan(values)
+    return values, missing, values[~missing]
+
 def memory_safe_sample_selection(df: pd.DataFrame, 
                                 target_field: str,
                                 max_samples: int,
@@ -166,63 +717,183 @@ def memory_safe_sample_selection(df: pd.DataFrame,
         strategy: Sampling strategy ('balanced', 'random', 'extremes')
     
     Returns:
-        Sampled dataframe
+        Sampled dataframe (never contains a row twice). The 'random' strategy
+        keeps the source index labels; the stratified strategies renumber rows.
     """
     if len(df) <= max_samples:
         return df
     
     logger.info(f"Sampling {max_samples} from {len(df)} records using '{strategy}' strategy")
     
+    rng = np.random.default_rng(42)
+    
     if strategy == 'balanced':
         # Sample equally from different quantiles of target variable
+        values, missing, present_values = _target_values(df, target_field)
         quantiles = [0, 0.25, 0.5, 0.75, 1.0]
         samples_per_quantile = max_samples // (len(quantiles) - 1)
         
-        sampled_dfs = []
-        for i in range(len(quantiles) - 1):
-            q_low = df[target_field].quantile(quantiles[i])
-            q_high = df[target_field].quantile(quantiles[i + 1])
-            
-            mask = (df[target_field] >= q_low) & (df[target_field] <= q_high)
-            quantile_df = df[mask]
-            
-            if len(quantile_df) > 0:
-                n_samples = min(samples_per_quantile, len(quantile_df))
-                sampled = quantile_df.sample(n=n_samples, random_state=42)
-                sampled_dfs.append(sampled)
-        
-        result = pd.concat(sampled_dfs, ignore_index=True)
+        # Quantile edges once; every row with a target lands in exactly one bin
+        edges = np.quantile(present_values, quantiles) if len(present_values) else np.full(len(quantiles), np.nan)
+        bins = np.searchsorted(edges[1:-1], values, side='right')
+        bins[missing] = -1
+        # Bins short of their share (e.g. a skewed target) pass the rest to the others
+        counts = np.bincount(bins[bins >= 0], minlength=len(quantiles) - 1)
+        quotas = _fill_quotas([samples_per_quantile] * (len(quantiles) - 1), counts, max_samples)
+        positions = _sample_bins(bins, quotas, rng)
         
     elif strategy == 'extremes':
         # Focus on outliers and extreme values
-        q_low = df[target_field].quantile(0.05)
-        q_high = df[target_field].quantile(0.95)
-        
-        low_extremes = df[df[target_field] <= q_low]
-        high_extremes = df[df[target_field] >= q_high]
-        middle = df[(df[target_field] > q_low) & (df[target_field] < q_high)]
+        values, missing, present_values = _target_values(df, target_field)
+        q_low, q_high = np.quantile(present_values, [0.05, 0.95]) if len(present_values) else (np.nan, np.nan)
+        bins = np.where(values <= q_low, 0, np.where(values >= q_high, 2, 1))
+        bins[missing] = -1
+        counts = np.bincount(bins[bins >= 0], minlength=3)
         
         # 40% low extremes, 40% high extremes, 20% middle
-        n_low = min(int(max_samples * 0.4), len(low_extremes))
-        n_high = min(int(max_samples * 0.4), len(high_extremes))
+        n_low = min(int(max_samples * 0.4), counts[0])
+        n_high = min(int(max_samples * 0.4), counts[2])
         n_middle = max_samples - n_low - n_high
-        
-        sampled_parts = []
-        if n_low > 0:
-            sampled_parts.append(low_extremes.sample(n=n_low, random_state=42))
-        if n_high > 0:
-            sampled_parts.append(high_extremes.sample(n=n_high, random_state=42))
-        if n_middle > 0 and len(middle) > 0:
-            sampled_parts.append(middle.sample(n=min(n_middle, len(middle)), random_state=42))
-        
-        result = pd.concat(sampled_parts, ignore_index=True)
+        positions = _sample_bins(bins, [n_low, n_middle, n_high], rng)
         
     else:  # random
-        result = df.sample(n=max_samples, random_state=42)
+        positions = rng.choice(len(df), size=max_samples, replace=False)
+    
+    result = df.iloc[positions]
+    if strategy in ('balanced', 'extremes'):
+        # Stratified samples are renumbered; random samples keep the source index labels
+        result = result.reset_index(drop=True)
     
     logger.info(f"Selected {len(result)} samples for analysis")
     return result
 
+class SharedFeatureMatrix:
+    """
+    Read-only float32 feature matrix in a memory-mapped .npy file.
+    
+    The matrix is published once (see load_shared_feature_matrix) and every
+    worker process that attaches it maps the same pages, so N workers cost
+    one copy of the reference data instead of N. `frame()` wraps the mapping
+    in a DataFrame without copying; row subsets taken from it (e.g. by
+    memory_safe_sample_selection) are ordinary small copies.
+    
+    Layout:
+        <path>/matrix.npy   float32 [rows, columns]
+        <path>/meta.json    column names, row count, source fingerprint
+    """
+    
+    def __init__(self, path: str):
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.path = path
+        self.columns: List[str] = self.meta['columns']
+        self.fingerprint: Optional[str] = self.meta.get('fingerprint')
+        self.values = np.load(os.path.join(path, 'matrix.npy'), mmap_mode='r')
+    
+    def __len__(self) -> int:
+        return self.values.shape[0]
+    
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes
+    
+    def frame(self) -> pd.DataFrame:
+        """Zero-copy DataFrame view of the matrix"""
+        return pd.DataFrame(self.values, columns=self.columns, copy=False)
+    
+    @classmethod
+    def publish(cls, df: pd.DataFrame, path: str, fingerprint: Optional[str] = None) -> 'SharedFeatureMatrix':
+        """
+        Write the numeric columns of df as float32 and open the result.
+        The matrix is written to a staging directory and renamed into place,
+        so readers never see a partial file. The row index is not kept.
+        """
+        numeric_df = df.select_dtypes(include='number')
+        skipped = [col for col in df.columns if col not in numeric_df.columns]
+        if skipped:
+            logger.info(f"Shared feature matrix skips {len(skipped)} non-numeric columns: {skipped[:10]}")
+        
+        staging_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(staging_path, ignore_errors=True)
+        os.makedirs(staging_path)
+        matrix = np.lib.format.open_memmap(
+            os.path.join(staging_path, 'matrix.npy'), mode='w+', dtype='<f4', shape=numeric_df.shape
+        )
+        # Column by column, so the conversion never holds a second full-size copy
+        for col_idx, col in enumerate(numeric_df.columns):
+            matrix[:, col_idx] = numeric_df[col].to_numpy(dtype=np.float32, na_value=np.nan)
+        matrix.flush()
+        del matrix
+        with open(os.path.join(staging_path, 'meta.json'), 'w') as f:
+            json.dump({
+                'columns': [str(col) for col in numeric_df.columns],
+                'rows': len(numeric_df),
+                'fingerprint': fingerprint,
+                'created_at': time.time()
+            }, f)
+        
+        shutil.rmtree(path, ignore_errors=True)
+        os.rename(staging_path, path)
+        logger.info(f"Published shared feature matrix {path}: {numeric_df.shape[0]} x {numeric_df.shape[1]} "
+                    f"({numeric_df.shape[0] * numeric_df.shape[1] * 4 / 1024 / 1024:.1f}MB)")
+        return cls(path)
+
+_shared_matrices: Dict[str, SharedFeatureMatrix] = {}
+
+def load_shared_feature_matrix(name: str, loader: Callable[[], pd.DataFrame],
+                               fingerprint: Optional[str] = None,
+                               directory: str = SHARED_FEATURES_DIR) -> SharedFeatureMatrix:
+    """
+    Attach the shared matrix `name`, publishing it from loader() if needed
+    
+    The first worker to get here builds the matrix while holding a file lock;
+    the others wait and then attach the published file. A matrix whose stored
+    fingerprint differs from `fingerprint` (e.g. the source file's mtime) is
+    rebuilt.
+    
+    Args:
+        name: File-system safe name of the matrix
+        loader: Returns the reference DataFrame; only called by the publishing worker
+        fingerprint: Identifies the source data version
+        directory: Where matrices are kept (SHARED_FEATURES_DIR by default)
+    
+    Returns:
+        SharedFeatureMatrix attached in this process
+    """
+    attached = _shared_matrices.get(name)
+    if attached is not None and attached.fingerprint == fingerprint:
+        return attached
+    
+    path = os.path.join(directory, name)
+    
+    def attach_existing() -> Optional[SharedFeatureMatrix]:
+        if not os.path.isfile(os.path.join(path, 'meta.json')):
+            return None
+        try:
+            matrix = SharedFeatureMatrix(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not attach shared feature matrix {path}: {str(e)}")
+            return None
+        return matrix if matrix.fingerprint == fingerprint else None
+    
+    matrix = attach_existing()
+    if matrix is None:
+        os.makedirs(directory, exist_ok=True)
+        with open(f"{path}.lock", 'w') as lock_file:
+            try:
+                import fcntl
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            except ImportError:
+                pass  # No cross-process lock on this platform; workers may each publish
+            # Another worker may have published while we waited for the lock
+            matrix = attach_existing()
+            if matrix is None:
+                matrix = SharedFeatureMatrix.publish(loader(), path, fingerprint)
+    
+    _shared_matrices[name] = matrix
+    logger.info(f"Attached shared feature matrix {name} ({matrix.nbytes / 1024 / 1024:.1f}MB mapped)")
+    return matrix
+
 # Endpoint-specific configurations
 ENDPOINT_MEMORY_CONFIGS = {
     '/analyze': {
@@ -269,25 +940,179 @@ ENDPOINT_MEMORY_CONFIGS = {
     }
 }
 
-def get_endpoint_config(endpoint_path: str) -> dict:
-    """Get memory configuration for specific endpoint"""
-    return ENDPOINT_MEMORY_CONFIGS.get(endpoint_path, {
-        'max_samples': 100,
-        'batch_size': 25,
-        'memory_limit_mb': 500,
-        'sampling_strategy': 'random'
-    })
+DEFAULT_ENDPOINT_CONFIG = {
+    'max_samples': 100,
+    'batch_size': 25,
+    'memory_limit_mb': 500,
+    'sampling_strategy': 'random'
+}
 
-def memory_safe_shap_wrapper(explainer, df: pd.DataFrame, 
-                           target_field: str, endpoint_path: str) -> Tuple[np.ndarray, pd.DataFrame]:
+class EndpointProfileStore:
     """
-    Complete memory-safe wrapper for SHAP calculations
+    Sizes endpoints from their observed cost instead of fixed numbers.
     
-    Returns:
-        Tuple of (shap_values, sampled_dataframe)
+    Every memory_safe_shap_wrapper call records the sample count, the peak
+    RSS growth and the latency for its endpoint. Once an endpoint has
+    `min_observations` calls, its config is derived from the p95 memory and
+    time per sample. `max_samples` is then the most that fits both the
+    process memory budget and ENDPOINT_TARGET_SECONDS. The process budget is
+    ENDPOINT_MEMORY_FRACTION of the container's cgroup memory limit, split
+    across WEB_CONCURRENCY workers.
+    
+    Until then, ENDPOINT_MEMORY_CONFIGS (or DEFAULT_ENDPOINT_CONFIG for new
+    endpoints) is used, with memory_limit_mb capped at the process budget.
+    
+    Observations are persisted to a JSON file shared by all worker processes.
+    Every `save_interval` seconds (and at exit) a process merges its new
+    observations into the file under a file lock and takes up the other
+    workers' observations, so each window covers calls from every worker.
     """
-    config = get_endpoint_config(endpoint_path)
     
+    def __init__(self, profile_path: Optional[str] = ENDPOINT_PROFILE_PATH,
+                 memory_fraction: float = ENDPOINT_MEMORY_FRACTION,
+                 target_seconds: float = ENDPOINT_TARGET_SECONDS,
+                 window: int = 200,
+                 min_observations: int = 5,
+                 min_samples: int = 50,
+                 max_samples: int = 5000,
+                 save_interval: float = ENDPOINT_PROFILE_SAVE_SECONDS):
+        self.profile_path = profile_path
+        self.memory_fraction = memory_fraction
+        self.target_seconds = target_seconds
+        self.window = window
+        self.min_observations = min_observations
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._observations: Dict[str, List[Dict[str, float]]] = self._load()
+        # Observations recorded by this process since the last save
+        self._pending: Dict[str, List[Dict[str, float]]] = {}
+        self._last_save = time.monotonic()
+    
+    def memory_budget_mb(self) -> float:
+        """RSS budget for one worker process"""
+        workers = max(1, int(os.environ.get('WEB_CONCURRENCY', '1')))
+        return get_container_memory_limit() * self.memory_fraction / workers
+    
+    def record(self, endpoint_path: str, samples: int, peak_delta_mb: float, seconds: float):
+        """Add one call's telemetry to the endpoint's rolling window"""
+        if samples <= 0:
+            return
+        observation = {'samples': samples, 'peak_delta_mb': peak_delta_mb, 'seconds': seconds}
+        with self._lock:
+            self._append(self._observations, endpoint_path, [observation])
+            self._append(self._pending, endpoint_path, [observation])
+            due = time.monotonic() - self._last_save >= self.save_interval
+        if due:
+            self.save()
+    
+    def _append(self, windows: Dict[str, List[Dict[str, float]]], endpoint_path: str,
+                observations: List[Dict[str, float]]):
+        window = windows.setdefault(endpoint_path, [])
+        window.extend(observations)
+        del window[:-self.window]
+    
+    def config_for(self, endpoint_path: str) -> dict:
+        """Memory configuration for an endpoint, learned once enough calls were observed"""
+        config = dict(ENDPOINT_MEMORY_CONFIGS.get(endpoint_path, DEFAULT_ENDPOINT_CONFIG))
+        budget_mb = self.memory_budget_mb()
+        with self._lock:
+            observations = list(self._observations.get(endpoint_path, []))
+        
+        if len(observations) < self.min_observations:
+            config['memory_limit_mb'] = min(config['memory_limit_mb'], budget_mb)
+            config['source'] = 'default'
+            return config
+        
+        mb_per_sample = np.percentile([o['peak_delta_mb'] / o['samples'] for o in observations], 95)
+        seconds_per_sample = np.percentile([o['seconds'] / o['samples'] for o in observations], 95)
+        headroom_mb = max(0.0, budget_mb - get_memory_usage())
+        by_memory = headroom_mb / max(mb_per_sample, AdaptiveBatchSizer.MIN_MB_PER_SAMPLE)
+        by_time = self.target_seconds / max(seconds_per_sample, AdaptiveBatchSizer.MIN_SECONDS_PER_SAMPLE)
+        max_samples = int(max(self.min_samples, min(by_memory, by_time, self.max_samples)))
+        
+        config.update({
+            'max_samples': max_samples,
+            'batch_size': max(10, max_samples // 4),
+            'memory_limit_mb': budget_mb,
+            'source': 'learned'
+        })
+        return config
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {path: len(observations) for path, observations in self._observations.items()}
+        return {
+            'container_memory_limit_mb': get_container_memory_limit(),
+            'memory_budget_mb': self.memory_budget_mb(),
+            'observations': endpoints
+        }
+    
+    def save(self):
+        """Merge this process's new observations into profile_path and adopt the merged windows"""
+        if not self.profile_path:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_save = time.monotonic()
+        
+        try:
+            with open(f"{self.profile_path}.lock", 'w') as lock_file:
+                try:
+                    import fcntl
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                except ImportError:
+                    pass  # No cross-process lock on this platform; concurrent saves may drop observations
+                # Re-read under the lock so other workers' saves since our last one are kept
+                merged = self._load()
+                for endpoint_path, observations in pending.items():
+                    self._append(merged, endpoint_path, observations)
+                tmp_path = f"{self.profile_path}.tmp-{os.getpid()}"
+                with open(tmp_path, 'w') as f:
+                    f.write(json.dumps(merged))
+                os.replace(tmp_path, self.profile_path)
+        except OSError as e:
+            logger.warning(f"Could not save endpoint profiles to {self.profile_path}: {str(e)}")
+            with self._lock:
+                # Keep them for the next save
+                for endpoint_path, observations in pending.items():
+                    observations.extend(self._pending.get(endpoint_path, []))
+                    self._pending[endpoint_path] = observations[-self.window:]
+            return
+        
+        with self._lock:
+            # Observations recorded while saving go to the next save but count locally now
+            for endpoint_path, observations in self._pending.items():
+                self._append(merged, endpoint_path, observations)
+            self._observations = merged
+    
+    def _load(self) -> Dict[str, List[Dict[str, float]]]:
+        if not self.profile_path or not os.path.isfile(self.profile_path):
+            return {}
+        try:
+            with open(self.profile_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable endpoint profiles {self.profile_path}: {str(e)}")
+            return {}
+
+_profile_store: Optional[EndpointProfileStore] = None
+
+def get_profile_store() -> EndpointProfileStore:
+    """Process-wide EndpointProfileStore backed by ENDPOINT_PROFILE_PATH"""
+    global _profile_store
+    if _profile_store is None:
+        _profile_store = EndpointProfileStore()
+        atexit.register(_profile_store.save)
+    return _profile_store
+
+def get_endpoint_config(endpoint_path: str) -> dict:
+    """Get memory configuration for specific endpoint"""
+    return get_profile_store().config_for(endpoint_path)
+
+def _sample_shap_inputs(df: pd.DataFrame, target_field: str, config: dict) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Sample rows for an endpoint and split off the feature columns"""
     # Sample data if needed
     sampled_df = memory_safe_sample_selection(
         df, target_field, 
@@ -297,13 +1122,56 @@ def memory_safe_shap_wrapper(explainer, df: pd.DataFrame,
     
     # Prepare features (exclude target)
     feature_cols = [col for col in sampled_df.columns if col != target_field]
-    X = sampled_df[feature_cols]
+    return sampled_df, sampled_df[feature_cols]
+
+def memory_safe_shap_wrapper(explainer, df: pd.DataFrame, 
+                           target_field: str, endpoint_path: str) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    Complete memory-safe wrapper for SHAP calculations
     
-    # Calculate SHAP values in batches
-    shap_values = batch_shap_calculation(
-        explainer, X,
-        batch_size=config['batch_size'],
-        max_memory_mb=config['memory_limit_mb']
-    )
+    Returns:
+        Tuple of (shap_values, sampled_dataframe)
+    """
+    config = get_endpoint_config(endpoint_path)
+    sampled_df, X = _sample_shap_inputs(df, target_field, config)
+    start_time = time.perf_counter()
+    
+    with PeakMemoryMonitor() as monitor:
+        # Calculate SHAP values in batches, sized from measured cost unless adaptive batching is off
+        shap_values = batch_shap_calculation(
+            explainer, X,
+            batch_size=None if ADAPTIVE_BATCHING else config['batch_size'],
+            max_memory_mb=config['memory_limit_mb']
+        )
+    
+    get_profile_store().record(endpoint_path, len(X), monitor.delta_mb, time.perf_counter() - start_time)
+    return shap_values, sampled_df
+
+def memory_safe_shap_stream(explainer, df: pd.DataFrame, target_field: str, endpoint_path: str,
+                            out: Optional[np.ndarray] = None) -> Tuple[pd.DataFrame, Iterator[Tuple[int, np.ndarray]]]:
+    """
+    Streaming variant of memory_safe_shap_wrapper
+    
+    Sampling happens up front; SHAP values are computed lazily as the
+    iterator is consumed, so records for row_offset..row_offset+len(block)
+    of the sampled dataframe can be written out while later batches run.
+    
+    Returns:
+        Tuple of (sampled_dataframe, iterator of (row_offset, shap_block))
+    """
+    config = get_endpoint_config(endpoint_path)
+    sampled_df, X = _sample_shap_inputs(df, target_field, config)
+    
+    def blocks() -> Iterator[Tuple[int, np.ndarray]]:
+        start_time = time.perf_counter()
+        with PeakMemoryMonitor() as monitor:
+            yield from iter_shap_batches(
+                explainer, X,
+                batch_size=None if ADAPTIVE_BATCHING else config['batch_size'],
+                max_memory_mb=config['memory_limit_mb'],
+                out=out
+            )
+        # Only complete runs are recorded; time spent by the consumer is included
+        get_profile_store().record(endpoint_path, len(X), monitor.delta_mb, time.perf_counter() - start_time)
     
-    return shap_values, sampled_df 
\ No newline at end of file
+    return sampled_df, blocks()
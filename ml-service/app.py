@@ -1,18 +1,20 @@
 import os
 import time
-import json
 import logging
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
-import numpy as np
-import pandas as pd
-import xgboost as xgb
-import shap
 from typing import Dict, Any, List, Optional
 import redis
-import hashlib
 import traceback
+from prediction_cache import PredictionCache, SingleFlight
+from encoding import MSGPACK_MIME, wants_msgpack, pack, to_json_ready
+from model_registry import LoadedModel
+import metrics
+from predictor import (
+    model_registry, shap_table_store, load_models, get_model_for_query,
+    generate_cache_key, format_prediction_response, score_inputs
+)
 
 # Setup logging
 logging.basicConfig(
@@ -32,6 +34,12 @@ REDIS_URL = os.environ.get('REDIS_URL')
 REDIS_TIMEOUT = int(os.environ.get('REDIS_TIMEOUT', '5'))
 REDIS_CACHE_TTL = int(os.environ.get('REDIS_CACHE_TTL', '3600'))  # Default 1 hour TTL
 CACHE_ENABLED = os.environ.get('CACHE_ENABLED', 'True').lower() == 'true'
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '5000'))
+LOCAL_CACHE_MAX_BYTES = int(os.environ.get('LOCAL_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))  # Default 64MB
+LOCAL_CACHE_TTL = int(os.environ.get('LOCAL_CACHE_TTL', '60'))  # Default 1 minute TTL
+CACHE_CLEAR_BATCH_SIZE = int(os.environ.get('CACHE_CLEAR_BATCH_SIZE', '500'))
+SINGLE_FLIGHT_TIMEOUT = float(os.environ.get('SINGLE_FLIGHT_TIMEOUT', '120'))  # Seconds to wait on an identical in-flight request
+MODEL_PRELOAD = os.environ.get('MODEL_PRELOAD', 'False').lower() == 'true'
 
 # Initialize Redis client for caching if configured
 redis_client = None
@@ -42,7 +50,7 @@ if REDIS_URL and CACHE_ENABLED:
             REDIS_URL,
             socket_timeout=REDIS_TIMEOUT,
             socket_connect_timeout=REDIS_TIMEOUT,
-            decode_responses=True
+            decode_responses=False  # Cache entries are binary msgpack
         )
         redis_client.ping()  # Test the connection
         logger.info("Redis connection successful")
@@ -53,130 +61,71 @@ if REDIS_URL and CACHE_ENABLED:
 else:
     logger.warning("Redis URL not configured or caching disabled. Continuing without Redis caching.")
 
-# Model registry
-models = {}
-feature_maps = {}
-shap_explainers = {}
+# In-process LRU tier in front of Redis (local-only when Redis is unavailable)
+prediction_cache = PredictionCache(
+    redis_client,
+    redis_ttl=REDIS_CACHE_TTL,
+    local_max_bytes=LOCAL_CACHE_MAX_BYTES if CACHE_ENABLED else 0,
+    local_ttl=LOCAL_CACHE_TTL
+)
 
-def load_models():
-    """Load all XGBoost models into memory"""
-    global models, feature_maps, shap_explainers
-    
-    model_types = [
-        'hotspot',
-        'multivariate',
-        'prediction',
-        'anomaly',
-        'network',
-        'correlation'
-    ]
-    
-    for model_type in model_types:
-        try:
-            logger.info(f"Loading {model_type} model...")
-            
-            # In a real implementation, load the model from a file
-            # models[model_type] = xgb.Booster()
-            # models[model_type].load_model(f"models/{model_type}.model")
-            
-            # For this skeleton, we'll create a dummy model
-            if model_type == 'prediction':
-                # Create a simple regressor
-                X = np.random.rand(100, 10)
-                y = np.random.rand(100) * 10
-                dtrain = xgb.DMatrix(X, label=y)
-                params = {
-                    'max_depth': 3,
-                    'eta': 0.1,
-                    'objective': 'reg:squarederror',
-                    'eval_metric': 'rmse'
-                }
-                models[model_type] = xgb.train(params, dtrain, num_boost_round=10)
-            else:
-                # Create a simple classifier
-                X = np.random.rand(100, 10)
-                y = np.random.randint(0, 2, 100)
-                dtrain = xgb.DMatrix(X, label=y)
-                params = {
-                    'max_depth': 3,
-                    'eta': 0.1,
-                    'objective': 'binary:logistic',
-                    'eval_metric': 'logloss'
-                }
-                models[model_type] = xgb.train(params, dtrain, num_boost_round=10)
-            
-            # Create SHAP explainer for the model
-            X_shap = pd.DataFrame(X, columns=[f'feature_{i}' for i in range(X.shape[1])])
-            feature_maps[model_type] = X_shap.columns.tolist()
-            shap_explainers[model_type] = shap.TreeExplainer(models[model_type])
-            
-            logger.info(f"Successfully loaded {model_type} model")
-        except Exception as e:
-            logger.error(f"Failed to load {model_type} model: {str(e)}")
-            # Log the full traceback for debugging
-            logger.error(traceback.format_exc())
+# Coalesces identical concurrent predictions (keyed by cache key) into one computation
+prediction_flights = SingleFlight(timeout=SINGLE_FLIGHT_TIMEOUT)
 
-def get_feature_vector(input_data: Dict[str, Any], model_type: str) -> pd.DataFrame:
-    """
-    Convert input data to feature vector for model prediction
-    """
-    # In a real implementation, this would transform the geospatial data
-    # into features the model expects
-    
-    # For this skeleton, we'll create dummy features
-    features = {}
-    feature_list = feature_maps.get(model_type, [])
-    
-    # Create random features for demonstration
-    for feature in feature_list:
-        features[feature] = np.random.rand()
-    
-    # Add some basic features from the input
-    if 'query' in input_data:
-        query = input_data['query'].lower()
-        features['query_length'] = len(query)
-        features['has_predict'] = 'predict' in query
-        features['has_correlation'] = 'correlation' in query
+def compute_prediction(model: LoadedModel, input_data: Dict[str, Any], cache_key: Optional[str],
+                       timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """Run the model and SHAP for one input and store the result in the cache"""
+    logger.info(f"Cache miss or caching disabled. Computing prediction with model: {model.model_type}")
+    response = score_inputs(model, [input_data], timings)[0]
     
-    if 'visualizationType' in input_data:
-        viz_type = input_data['visualizationType']
-        features['is_complex_viz'] = viz_type in ['HOTSPOT', 'MULTIVARIATE', 'BIVARIATE', 'NETWORK']
+    # Cache the result in both tiers
+    if cache_key:
+        prediction_cache.set(cache_key, response)
+        logger.info(f"Cached result with key: {cache_key}, TTL: {REDIS_CACHE_TTL}s")
     
-    return pd.DataFrame([features])
+    return response
 
-def get_model_for_query(input_data: Dict[str, Any]) -> str:
+def prediction_response(body: Dict[str, Any], timings: Optional[Dict[str, float]] = None) -> Response:
     """
-    Determine which model to use based on the query and visualization type
+    Encode a prediction body as msgpack if the client asked for it, JSON otherwise.
+    The encoding time is added to `timings` as the serialization stage.
     """
-    query = input_data.get('query', '').lower()
-    viz_type = input_data.get('visualizationType', '')
-    
-    # Select model based on query and visualization type
-    if 'predict' in query or 'forecast' in query:
-        return 'prediction'
-    elif 'anomaly' in query or 'outlier' in query:
-        return 'anomaly'
-    elif 'correlation' in query or 'relationship' in query:
-        return 'correlation'
-    elif viz_type == 'HOTSPOT':
-        return 'hotspot'
-    elif viz_type == 'MULTIVARIATE':
-        return 'multivariate'
-    elif viz_type == 'NETWORK':
-        return 'network'
+    encode_start = time.perf_counter()
+    if wants_msgpack(request.headers.get('Accept')):
+        response = Response(pack(body), mimetype=MSGPACK_MIME)
     else:
-        return 'multivariate'  # Default model
+        response = jsonify(to_json_ready(body))
+    if timings is not None:
+        timings['serialization'] = time.perf_counter() - encode_start
+    return response
 
-def generate_cache_key(input_data: Dict[str, Any], model_type: str) -> str:
-    """Generate a unique cache key for the prediction request"""
-    # Create a string representation of the input and model type
-    key_data = {
-        "input": input_data,
-        "model_type": model_type
-    }
-    # Convert to JSON and hash
-    json_str = json.dumps(key_data, sort_keys=True)
-    return f"pred:{hashlib.md5(json_str.encode()).hexdigest()}"
+def record_prediction(model_type: str, cache: str, timings: Dict[str, float], count: int = 1):
+    """Count predictions by cache outcome and record their stage latencies"""
+    metrics.PREDICTIONS.inc(count, model_type=model_type, cache=cache)
+    metrics.observe_stages(timings, model_type, cache)
+
+def request_endpoint() -> str:
+    """Route pattern of the current request, used as the metrics label"""
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    g.metrics_endpoint = request_endpoint()
+    metrics.REQUESTS_IN_FLIGHT.inc(endpoint=g.metrics_endpoint)
+
+@app.after_request
+def record_request_metrics(response: Response) -> Response:
+    if 'metrics_start' in g:
+        metrics.REQUESTS.inc(endpoint=g.metrics_endpoint, status=str(response.status_code))
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.metrics_start, endpoint=g.metrics_endpoint)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc: Optional[BaseException]):
+    # Runs even when a handler raised, so the in-flight gauge never leaks
+    if 'metrics_start' in g:
+        metrics.REQUESTS_IN_FLIGHT.dec(endpoint=g.metrics_endpoint)
 
 @app.route('/api/predict', methods=['POST'])
 def predict():
@@ -197,80 +146,203 @@ def predict():
         
         # Determine which model to use
         model_type = get_model_for_query(input_data)
+        model = model_registry.get(model_type)
         
-        if model_type not in models:
+        if model is None:
             return jsonify({'error': f'Model {model_type} not available'}), 404
         
-        # Check cache if Redis is available
-        cache_hit = False
+        timings: Dict[str, float] = {}
+        
+        # Known areas are answered straight from the precomputed SHAP table
+        precomputed = shap_table_store.lookup(model, input_data.get('areaId'))
+        if precomputed:
+            response = format_prediction_response(model, *precomputed)
+            response['precomputed'] = True
+            response['processing_time'] = time.time() - start_time
+            result = prediction_response(response, timings)
+            record_prediction(model_type, 'precomputed', timings)
+            return result
+        
+        # Check the local tier, then Redis
         cached_response = None
         cache_key = None
         
-        if redis_client:
-            try:
-                cache_key = generate_cache_key(input_data, model_type)
-                cached_result = redis_client.get(cache_key)
-                if cached_result:
-                    cached_response = json.loads(cached_result)
-                    cache_hit = True
-                    logger.info(f"Cache hit for key: {cache_key}")
-            except Exception as e:
-                logger.warning(f"Error checking cache: {str(e)}")
+        if prediction_cache.enabled:
+            lookup_start = time.perf_counter()
+            cache_key = generate_cache_key(input_data, model_type, model.version)
+            cached_response = prediction_cache.get(cache_key)
+            timings['cache_lookup'] = time.perf_counter() - lookup_start
+            if cached_response:
+                logger.info(f"Cache hit for key: {cache_key}")
         
         # If we have a cache hit, return the cached response
-        if cache_hit and cached_response:
+        if cached_response:
             # Update the processing time to include cache retrieval
             cached_response['processing_time'] = time.time() - start_time
             cached_response['cached'] = True
-            return jsonify(cached_response)
+            result = prediction_response(cached_response, timings)
+            record_prediction(model_type, 'hit', timings)
+            return result
         
-        # No cache hit, perform the prediction
-        logger.info(f"Cache miss or no Redis. Computing prediction with model: {model_type}")
+        # No cache hit: perform the prediction, sharing it with identical concurrent requests
+        if cache_key:
+            response, coalesced = prediction_flights.do(
+                cache_key, lambda: compute_prediction(model, input_data, cache_key, timings)
+            )
+            response = dict(response)
+            if coalesced:
+                response['coalesced'] = True
+            outcome = 'coalesced' if coalesced else 'miss'
+        else:
+            response = compute_prediction(model, input_data, cache_key, timings)
+            outcome = 'disabled'
         
-        # Prepare feature vector
-        features_df = get_feature_vector(input_data, model_type)
-        features_dmatrix = xgb.DMatrix(features_df)
+        response['processing_time'] = time.time() - start_time
+        result = prediction_response(response, timings)
+        record_prediction(model_type, outcome, timings)
+        return result
+    
+    except Exception as e:
+        logger.error(f"Prediction error: {str(e)}")
+        logger.error(traceback.format_exc())  # Log the full traceback
+        return jsonify({
+            'error': str(e),
+            'error_type': type(e).__name__,
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    Endpoint to make predictions for many inputs in a single request.
+
+    Inputs are grouped by the model `get_model_for_query` selects, and each
+    group is scored with one DMatrix and one SHAP call. Cached entries are
+    shared with /api/predict and merged back in input order.
+    """
+    start_time = time.time()
+    
+    # API key validation in production
+    if API_KEY and request.headers.get('x-api-key') != API_KEY:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        payload = request.json
+        inputs = payload.get('inputs') if isinstance(payload, dict) else payload
+        if not inputs or not isinstance(inputs, list):
+            return jsonify({'error': 'Expected a non-empty "inputs" list'}), 400
+        if len(inputs) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'Batch size {len(inputs)} exceeds limit of {MAX_BATCH_SIZE}'}), 413
         
-        # Make prediction
-        prediction = models[model_type].predict(features_dmatrix)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(inputs)
         
-        # Generate SHAP explanations
-        explainer = shap_explainers.get(model_type)
-        shap_values = explainer.shap_values(features_df)
+        # Group inputs by model, remembering their position in the request
+        groups: Dict[str, List[int]] = {}
+        group_models: Dict[str, LoadedModel] = {}
+        model_types: List[Optional[str]] = [None] * len(inputs)
+        for idx, input_data in enumerate(inputs):
+            if not isinstance(input_data, dict) or not input_data:
+                results[idx] = {'error': 'No input data provided'}
+                continue
+            try:
+                model_type = get_model_for_query(input_data)
+            except ValueError as e:
+                results[idx] = {'error': str(e), 'error_type': type(e).__name__}
+                continue
+            if model_type not in group_models:
+                model = model_registry.get(model_type)
+                if model is None:
+                    results[idx] = {'error': f'Model {model_type} not available', 'model_type': model_type}
+                    continue
+                # Pin one model version for the whole group
+                group_models[model_type] = model
+            model_types[idx] = model_type
+            groups.setdefault(model_type, []).append(idx)
         
-        # Format response
-        response = {
-            'predictions': prediction.tolist(),
-            'explanations': {
-                'shap_values': shap_values.tolist() if not isinstance(shap_values, list) else shap_values[0].tolist(),
-                'feature_names': feature_maps.get(model_type, []),
-                'base_value': explainer.expected_value if not isinstance(explainer.expected_value, list) else explainer.expected_value[0]
-            },
-            'processing_time': time.time() - start_time,
-            'model_version': '0.1.0',
-            'model_type': model_type,
-            'cached': False
-        }
+        # Answer known areas from the precomputed SHAP tables
+        precomputed_hits = 0
+        for model_type, members in groups.items():
+            group_hits = 0
+            for idx in members:
+                precomputed = shap_table_store.lookup(group_models[model_type], inputs[idx].get('areaId'))
+                if precomputed:
+                    results[idx] = format_prediction_response(group_models[model_type], *precomputed)
+                    results[idx]['precomputed'] = True
+                    group_hits += 1
+            if group_hits:
+                record_prediction(model_type, 'precomputed', {}, group_hits)
+            precomputed_hits += group_hits
+        
+        # Look up every cache key, with at most one Redis round trip
+        cache_keys: Dict[int, str] = {}
+        cache_hits = 0
+        if prediction_cache.enabled and groups:
+            lookup_start = time.perf_counter()
+            pending = [idx for members in groups.values() for idx in members if results[idx] is None]
+            for idx in pending:
+                model_type = model_types[idx]
+                cache_keys[idx] = generate_cache_key(inputs[idx], model_type, group_models[model_type].version)
+            cached_values = prediction_cache.get_many([cache_keys[idx] for idx in pending])
+            hits_by_model: Dict[str, int] = {}
+            for idx, cached_response in zip(pending, cached_values):
+                if cached_response:
+                    cached_response['cached'] = True
+                    results[idx] = cached_response
+                    cache_hits += 1
+                    hits_by_model[model_types[idx]] = hits_by_model.get(model_types[idx], 0) + 1
+            metrics.observe_stages({'cache_lookup': time.perf_counter() - lookup_start}, 'batch', 'mixed')
+            for model_type, hits in hits_by_model.items():
+                record_prediction(model_type, 'hit', {}, hits)
         
-        # Cache the result if Redis is available
-        if redis_client and cache_key:
+        # Score the remaining inputs, one DMatrix and one SHAP call per model
+        to_cache: Dict[str, Dict[str, Any]] = {}
+        for model_type, members in groups.items():
+            misses = [idx for idx in members if results[idx] is None]
+            if not misses:
+                continue
+            
+            logger.info(f"Computing batch prediction for {len(misses)} inputs with model: {model_type}")
+            model = group_models[model_type]
             try:
-                # Don't cache the processing_time as it will vary
-                cache_response = response.copy()
-                redis_client.setex(
-                    cache_key, 
-                    REDIS_CACHE_TTL,
-                    json.dumps(cache_response)
-                )
-                logger.info(f"Cached result with key: {cache_key}, TTL: {REDIS_CACHE_TTL}s")
+                timings: Dict[str, float] = {}
+                responses = score_inputs(model, [inputs[idx] for idx in misses], timings)
+                for idx, response in zip(misses, responses):
+                    results[idx] = response
+                    if idx in cache_keys:
+                        to_cache[cache_keys[idx]] = response
+                # Stage timings here cover the whole group, not one input
+                record_prediction(model_type, 'miss' if prediction_cache.enabled else 'disabled',
+                                  timings, len(misses))
             except Exception as e:
-                logger.warning(f"Error caching result: {str(e)}")
+                logger.error(f"Batch prediction error for model {model_type}: {str(e)}")
+                logger.error(traceback.format_exc())
+                for idx in misses:
+                    results[idx] = {
+                        'error': str(e),
+                        'error_type': type(e).__name__,
+                        'model_type': model_type
+                    }
+        
+        # Write all new entries to both tiers, pipelining the Redis writes
+        if to_cache:
+            prediction_cache.set_many(to_cache)
+            logger.info(f"Cached {len(to_cache)} batch results, TTL: {REDIS_CACHE_TTL}s")
         
-        return jsonify(response)
+        timings = {}
+        response = prediction_response({
+            'results': results,
+            'count': len(results),
+            'cache_hits': cache_hits,
+            'precomputed_hits': precomputed_hits,
+            'errors': sum(1 for result in results if 'error' in result),
+            'processing_time': time.time() - start_time
+        }, timings)
+        metrics.observe_stages(timings, 'batch', 'mixed')
+        return response
     
     except Exception as e:
-        logger.error(f"Prediction error: {str(e)}")
-        logger.error(traceback.format_exc())  # Log the full traceback
+        logger.error(f"Batch prediction error: {str(e)}")
+        logger.error(traceback.format_exc())
         return jsonify({
             'error': str(e),
             'error_type': type(e).__name__,
@@ -296,11 +368,15 @@ def health_check():
     response = {
         'status': 'ok',
         'timestamp': datetime.now().isoformat(),
-        'models': list(models.keys()),
+        'models': model_registry.available_models(),
+        'model_registry': model_registry.stats(),
         'redis': {
             'status': redis_status,
             'cache_enabled': CACHE_ENABLED
         },
+        'cache': prediction_cache.stats(),
+        'shap_tables': shap_table_store.stats(),
+        'single_flight': prediction_flights.stats(),
         'environment': {
             'debug': DEBUG
         }
@@ -318,27 +394,47 @@ def ping():
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Prometheus metrics for this worker (no authentication, like /ping)
+    """
+    return Response(metrics.registry.render(), content_type=metrics.MetricsRegistry.CONTENT_TYPE)
+
 @app.route('/api/cache/clear', methods=['POST'])
 def clear_cache():
     """
-    Endpoint to clear the Redis cache (requires API key)
+    Endpoint to clear the prediction cache (requires API key)
+    
+    Drops this worker's local tier, then removes Redis keys (when Redis is
+    configured) incrementally with SCAN + UNLINK so a flush never blocks
+    Redis. An optional `model_type` in the body limits the flush to that model.
     """
     # API key validation
     if API_KEY and request.headers.get('x-api-key') != API_KEY:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    if not redis_client:
-        return jsonify({'error': 'Redis not configured'}), 400
+    options = request.get_json(silent=True) or {}
+    if not isinstance(options, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    model_type = options.get('model_type')
+    batch_size = options.get('batch_size', CACHE_CLEAR_BATCH_SIZE)
+    
+    if model_type is not None and (not isinstance(model_type, str) or not model_type.isidentifier()):
+        return jsonify({'error': f'Invalid model_type: {model_type}'}), 400
+    if not isinstance(batch_size, int) or batch_size <= 0:
+        return jsonify({'error': f'Invalid batch_size: {batch_size}'}), 400
     
     try:
-        # Get all keys with the prediction prefix
-        keys = redis_client.keys('pred:*')
-        if keys:
-            redis_client.delete(*keys)
+        # Drop this worker's local tier, then matching Redis keys page by page
+        prefix = f'pred:{model_type}:' if model_type else 'pred:'
+        result = prediction_cache.invalidate(prefix, batch_size=batch_size)
         
         return jsonify({
             'status': 'ok',
-            'message': f'Cleared {len(keys)} cache entries',
+            'message': f"Cleared {result['local_removed']} local and {result['redis_removed']} Redis cache entries",
+            'model_type': model_type,
+            'result': result,
             'timestamp': datetime.now().isoformat()
         })
     except Exception as e:
@@ -346,8 +442,9 @@ def clear_cache():
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
-    # Load models at startup
-    load_models()
+    # Models load lazily on first use unless preloading is requested
+    if MODEL_PRELOAD:
+        load_models()
     
     # Start server
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,554 @@
+"""
+ASGI serving mode for the ML microservice.
+
+Serves the same routes as app.py, but handles requests on an event loop:
+Redis is accessed through `redis.asyncio` and XGBoost/SHAP computation is
+dispatched to a bounded process pool, so slow predictions no longer hold a
+worker while other requests wait on I/O. When the pool queue is full,
+requests are rejected with 503 and a Retry-After header instead of piling up.
+
+Run with:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import os
+import math
+import time
+import asyncio
+import logging
+import traceback
+import multiprocessing
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import redis.asyncio as aioredis
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import metrics
+import predictor
+from predictor import get_model_for_query, generate_cache_key
+from prediction_cache import AsyncPredictionCache, AsyncSingleFlight
+from encoding import MSGPACK_MIME, wants_msgpack, pack, to_json_ready
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+API_KEY = os.environ.get('API_KEY')
+DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
+REDIS_URL = os.environ.get('REDIS_URL')
+REDIS_TIMEOUT = int(os.environ.get('REDIS_TIMEOUT', '5'))
+REDIS_CACHE_TTL = int(os.environ.get('REDIS_CACHE_TTL', '3600'))  # Default 1 hour TTL
+CACHE_ENABLED = os.environ.get('CACHE_ENABLED', 'True').lower() == 'true'
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '5000'))
+LOCAL_CACHE_MAX_BYTES = int(os.environ.get('LOCAL_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))  # Default 64MB
+LOCAL_CACHE_TTL = int(os.environ.get('LOCAL_CACHE_TTL', '60'))  # Default 1 minute TTL
+CACHE_CLEAR_BATCH_SIZE = int(os.environ.get('CACHE_CLEAR_BATCH_SIZE', '500'))
+POOL_WORKERS = int(os.environ.get('POOL_WORKERS', str(os.cpu_count() or 1)))
+POOL_MAX_PENDING = int(os.environ.get('POOL_MAX_PENDING', str(POOL_WORKERS * 4)))  # Queued + running jobs
+POOL_BATCH_CHUNK = int(os.environ.get('POOL_BATCH_CHUNK', '500'))  # Inputs per pool job in batch requests
+
+
+class PoolSaturated(Exception):
+    """Raised when the compute pool has no room for more jobs"""
+
+
+class ComputePool:
+    """Bounded process pool for XGBoost/SHAP work with back-pressure and queue metrics"""
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        # spawn: workers import only predictor, never this module or a forked event loop
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def has_capacity(self, jobs: int = 1) -> bool:
+        return self.pending + jobs <= self.max_pending
+
+    async def run(self, fn, *args, reserved: bool = False):
+        """Run fn(*args) in the pool; raises PoolSaturated unless capacity was checked by the caller"""
+        if not reserved and not self.has_capacity():
+            self.rejected += 1
+            raise PoolSaturated()
+        self.pending += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'queue_depth': self.pending,
+            'max_pending': self.max_pending,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected
+        }
+
+
+# Created in lifespan() so importing this module never spawns processes
+redis_client = None
+prediction_cache: Optional[AsyncPredictionCache] = None
+prediction_flights = AsyncSingleFlight()
+compute_pool: Optional[ComputePool] = None
+
+POOL_QUEUE_DEPTH = metrics.registry.register(metrics.Gauge(
+    'ml_pool_queue_depth', 'Jobs queued or running in the compute pool',
+    callback=lambda: compute_pool.pending if compute_pool else 0))
+
+
+class MetricsMiddleware:
+    """Counts requests by route and status and records their latency"""
+
+    def __init__(self, app, paths):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        endpoint = scope['path'] if scope['path'] in self.paths else 'unmatched'
+        status = {'code': 500}
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        with metrics.REQUESTS_IN_FLIGHT.track_inprogress(endpoint=endpoint):
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                metrics.REQUESTS.inc(endpoint=endpoint, status=str(status['code']))
+                metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+
+
+def unauthorized(request: Request) -> Optional[JSONResponse]:
+    if API_KEY and request.headers.get('x-api-key') != API_KEY:
+        return JSONResponse({'error': 'Unauthorized'}, status_code=401)
+    return None
+
+
+def saturated_response() -> JSONResponse:
+    return JSONResponse(
+        {'error': 'Server busy, retry shortly', 'queue_depth': compute_pool.pending},
+        status_code=503,
+        headers={'Retry-After': '1'}
+    )
+
+
+def error_response(e: Exception) -> JSONResponse:
+    return JSONResponse({
+        'error': str(e),
+        'error_type': type(e).__name__,
+        'timestamp': datetime.now().isoformat()
+    }, status_code=500)
+
+
+def prediction_response(request: Request, body: Dict[str, Any],
+                        timings: Optional[Dict[str, float]] = None) -> Response:
+    """Encode a prediction body as msgpack or JSON; see app.prediction_response"""
+    encode_start = time.perf_counter()
+    if wants_msgpack(request.headers.get('accept')):
+        response = Response(pack(body), media_type=MSGPACK_MIME)
+    else:
+        response = JSONResponse(to_json_ready(body))
+    if timings is not None:
+        timings['serialization'] = time.perf_counter() - encode_start
+    return response
+
+
+def record_prediction(model_type: str, cache: str, timings: Dict[str, float], count: int = 1):
+    """Count predictions by cache outcome and record their stage latencies"""
+    metrics.PREDICTIONS.inc(count, model_type=model_type, cache=cache)
+    metrics.observe_stages(timings, model_type, cache)
+
+
+async def read_json(request: Request) -> Any:
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def result_cache_key(input_data: Dict[str, Any], response: Dict[str, Any]) -> str:
+    # Key on the version that actually produced the result, which can lag
+    # current_version() briefly while a pool worker hot-reloads
+    return generate_cache_key(input_data, response['model_type'], response['model_version'])
+
+
+async def compute_prediction(model_type: str, input_data: Dict[str, Any],
+                             timings: Dict[str, float]) -> Dict[str, Any]:
+    """Score one input in the pool and store the result in the cache"""
+    logger.info(f"Cache miss or caching disabled. Computing prediction with model: {model_type}")
+    results, stage_timings = await compute_pool.run(predictor.run_predictions, model_type, [input_data])
+    timings.update(stage_timings)
+    response = results[0]
+    if not response.get('precomputed'):
+        await prediction_cache.set(result_cache_key(input_data, response), response)
+    return response
+
+
+async def predict(request: Request) -> Response:
+    """
+    Endpoint to make predictions using XGBoost models
+    """
+    start_time = time.time()
+
+    denied = unauthorized(request)
+    if denied:
+        return denied
+
+    try:
+        input_data = await read_json(request)
+        if not input_data:
+            return JSONResponse({'error': 'No input data provided'}, status_code=400)
+
+        model_type = get_model_for_query(input_data)
+        model_version = predictor.model_registry.current_version(model_type)
+        if model_version is None:
+            return JSONResponse({'error': f'Model {model_type} not available'}, status_code=404)
+
+        timings: Dict[str, float] = {}
+        cache_key = generate_cache_key(input_data, model_type, model_version)
+        if prediction_cache.enabled:
+            lookup_start = time.perf_counter()
+            cached_response = await prediction_cache.get(cache_key)
+            timings['cache_lookup'] = time.perf_counter() - lookup_start
+            if cached_response:
+                logger.info(f"Cache hit for key: {cache_key}")
+                cached_response['processing_time'] = time.time() - start_time
+                cached_response['cached'] = True
+                result = prediction_response(request, cached_response, timings)
+                record_prediction(model_type, 'hit', timings)
+                return result
+
+        response, coalesced = await prediction_flights.do(
+            cache_key, lambda: compute_prediction(model_type, input_data, timings)
+        )
+        response = dict(response)
+        if coalesced:
+            response['coalesced'] = True
+            outcome = 'coalesced'
+        elif response.get('precomputed'):
+            outcome = 'precomputed'
+        else:
+            outcome = 'miss' if prediction_cache.enabled else 'disabled'
+        response['processing_time'] = time.time() - start_time
+        result = prediction_response(request, response, timings)
+        record_prediction(model_type, outcome, timings)
+        return result
+
+    except PoolSaturated:
+        return saturated_response()
+    except Exception as e:
+        logger.error(f"Prediction error: {str(e)}")
+        logger.error(traceback.format_exc())
+        return error_response(e)
+
+
+async def predict_batch(request: Request) -> Response:
+    """
+    Endpoint to make predictions for many inputs in a single request.
+
+    Inputs are grouped by model and split into chunks of POOL_BATCH_CHUNK,
+    which are scored in parallel across the process pool.
+    """
+    start_time = time.time()
+
+    denied = unauthorized(request)
+    if denied:
+        return denied
+
+    try:
+        payload = await read_json(request)
+        inputs = payload.get('inputs') if isinstance(payload, dict) else payload
+        if not inputs or not isinstance(inputs, list):
+            return JSONResponse({'error': 'Expected a non-empty "inputs" list'}, status_code=400)
+        if len(inputs) > MAX_BATCH_SIZE:
+            return JSONResponse({'error': f'Batch size {len(inputs)} exceeds limit of {MAX_BATCH_SIZE}'},
+                                status_code=413)
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(inputs)
+
+        # Group inputs by model, pinning one version per group for cache keys
+        groups: Dict[str, List[int]] = {}
+        versions: Dict[str, Optional[str]] = {}
+        for idx, input_data in enumerate(inputs):
+            if not isinstance(input_data, dict) or not input_data:
+                results[idx] = {'error': 'No input data provided'}
+                continue
+            try:
+                model_type = get_model_for_query(input_data)
+            except ValueError as e:
+                results[idx] = {'error': str(e), 'error_type': type(e).__name__}
+                continue
+            if model_type not in versions:
+                versions[model_type] = predictor.model_registry.current_version(model_type)
+            if versions[model_type] is None:
+                results[idx] = {'error': f'Model {model_type} not available', 'model_type': model_type}
+                continue
+            groups.setdefault(model_type, []).append(idx)
+
+        # Look up every cache key, with at most one Redis round trip
+        cache_hits = 0
+        if prediction_cache.enabled and groups:
+            lookup_start = time.perf_counter()
+            pending = [(model_type, idx) for model_type, members in groups.items() for idx in members]
+            keys = [generate_cache_key(inputs[idx], model_type, versions[model_type]) for model_type, idx in pending]
+            hits_by_model: Dict[str, int] = {}
+            for (model_type, idx), cached_response in zip(pending, await prediction_cache.get_many(keys)):
+                if cached_response:
+                    cached_response['cached'] = True
+                    results[idx] = cached_response
+                    cache_hits += 1
+                    hits_by_model[model_type] = hits_by_model.get(model_type, 0) + 1
+            metrics.observe_stages({'cache_lookup': time.perf_counter() - lookup_start}, 'batch', 'mixed')
+            for model_type, hits in hits_by_model.items():
+                record_prediction(model_type, 'hit', {}, hits)
+
+        # Split the remaining inputs into pool jobs
+        jobs = []
+        for model_type, members in groups.items():
+            misses = [idx for idx in members if results[idx] is None]
+            for start in range(0, len(misses), POOL_BATCH_CHUNK):
+                jobs.append((model_type, misses[start:start + POOL_BATCH_CHUNK]))
+
+        if jobs and not compute_pool.has_capacity(len(jobs)):
+            compute_pool.rejected += 1
+            return saturated_response()
+
+        async def run_job(model_type: str, members: List[int]):
+            try:
+                return await compute_pool.run(
+                    predictor.run_predictions, model_type, [inputs[idx] for idx in members], reserved=True
+                )
+            except Exception as e:
+                logger.error(f"Batch prediction error for model {model_type}: {str(e)}")
+                return e
+
+        to_cache: Dict[str, Dict[str, Any]] = {}
+        precomputed_hits = 0
+        job_results = await asyncio.gather(*(run_job(model_type, members) for model_type, members in jobs))
+        for (model_type, members), job_result in zip(jobs, job_results):
+            if isinstance(job_result, Exception):
+                for idx in members:
+                    results[idx] = {
+                        'error': str(job_result),
+                        'error_type': type(job_result).__name__,
+                        'model_type': model_type
+                    }
+                continue
+            job_responses, timings = job_result
+            job_precomputed = 0
+            for idx, response in zip(members, job_responses):
+                results[idx] = response
+                if response.get('precomputed'):
+                    job_precomputed += 1
+                else:
+                    to_cache[result_cache_key(inputs[idx], response)] = response
+            if job_precomputed:
+                record_prediction(model_type, 'precomputed', {}, job_precomputed)
+            if len(members) > job_precomputed:
+                # Stage timings here cover the whole job, not one input
+                record_prediction(model_type, 'miss' if prediction_cache.enabled else 'disabled',
+                                  timings, len(members) - job_precomputed)
+            precomputed_hits += job_precomputed
+
+        if to_cache:
+            await prediction_cache.set_many(to_cache)
+            logger.info(f"Cached {len(to_cache)} batch results, TTL: {REDIS_CACHE_TTL}s")
+
+        timings = {}
+        response = prediction_response(request, {
+            'results': results,
+            'count': len(results),
+            'cache_hits': cache_hits,
+            'precomputed_hits': precomputed_hits,
+            'errors': sum(1 for result in results if 'error' in result),
+            'processing_time': time.time() - start_time
+        }, timings)
+        metrics.observe_stages(timings, 'batch', 'mixed')
+        return response
+
+    except Exception as e:
+        logger.error(f"Batch prediction error: {str(e)}")
+        logger.error(traceback.format_exc())
+        return error_response(e)
+
+
+async def health_check(request: Request) -> JSONResponse:
+    """
+    Health check endpoint
+    """
+    redis_status = "not_configured"
+    if REDIS_URL:
+        try:
+            if redis_client and await redis_client.ping():
+                redis_status = "ok"
+            else:
+                redis_status = "error"
+        except Exception:
+            redis_status = "error"
+
+    return JSONResponse({
+        'status': 'ok',
+        'timestamp': datetime.now().isoformat(),
+        'server': 'asgi',
+        'models': predictor.model_registry.available_models(),
+        'redis': {
+            'status': redis_status,
+            'cache_enabled': CACHE_ENABLED
+        },
+        'cache': prediction_cache.stats(),
+        'single_flight': prediction_flights.stats(),
+        'pool': compute_pool.stats(),
+        'environment': {
+            'debug': DEBUG
+        }
+    })
+
+
+async def ping(request: Request) -> JSONResponse:
+    """
+    Simple ping endpoint with no authentication
+    """
+    return JSONResponse({
+        'status': 'ok',
+        'timestamp': datetime.now().isoformat()
+    })
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """
+    Prometheus metrics for this process (no authentication, like /ping)
+    """
+    return Response(metrics.registry.render(), headers={'Content-Type': metrics.MetricsRegistry.CONTENT_TYPE})
+
+
+async def clear_cache(request: Request) -> JSONResponse:
+    """
+    Endpoint to clear the prediction cache (requires API key); see app.clear_cache
+    """
+    denied = unauthorized(request)
+    if denied:
+        return denied
+
+    options = await read_json(request) or {}
+    if not isinstance(options, dict):
+        return JSONResponse({'error': 'Request body must be a JSON object'}, status_code=400)
+    model_type = options.get('model_type')
+    batch_size = options.get('batch_size', CACHE_CLEAR_BATCH_SIZE)
+
+    if model_type is not None and (not isinstance(model_type, str) or not model_type.isidentifier()):
+        return JSONResponse({'error': f'Invalid model_type: {model_type}'}, status_code=400)
+    if not isinstance(batch_size, int) or batch_size <= 0:
+        return JSONResponse({'error': f'Invalid batch_size: {batch_size}'}, status_code=400)
+
+    try:
+        prefix = f'pred:{model_type}:' if model_type else 'pred:'
+        result = await prediction_cache.invalidate(prefix, batch_size=batch_size)
+
+        return JSONResponse({
+            'status': 'ok',
+            'message': f"Cleared {result['local_removed']} local and {result['redis_removed']} Redis cache entries",
+            'model_type': model_type,
+            'result': result,
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        logger.error(f"Cache clear error: {str(e)}")
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def connect_redis():
+    """Create the async Redis client, or None if unavailable"""
+    if not (REDIS_URL and CACHE_ENABLED):
+        logger.warning("Redis URL not configured or caching disabled. Continuing without Redis caching.")
+        return None
+    try:
+        logger.info("Initializing Redis connection...")
+        client = aioredis.from_url(
+            REDIS_URL,
+            socket_timeout=REDIS_TIMEOUT,
+            socket_connect_timeout=REDIS_TIMEOUT,
+            decode_responses=False  # Cache entries are binary msgpack
+        )
+        await client.ping()
+        logger.info("Redis connection successful")
+        return client
+    except Exception as e:
+        logger.error(f"Redis connection error: {str(e)}")
+        logger.error("Continuing without Redis caching")
+        return None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global redis_client, prediction_cache, compute_pool
+    redis_client = await connect_redis()
+    prediction_cache = AsyncPredictionCache(
+        redis_client,
+        redis_ttl=REDIS_CACHE_TTL,
+        local_max_bytes=LOCAL_CACHE_MAX_BYTES if CACHE_ENABLED else 0,
+        local_ttl=LOCAL_CACHE_TTL
+    )
+    # Split cores between pool workers so their XGBoost threads do not oversubscribe
+    os.environ.setdefault('OMP_NUM_THREADS', str(max(1, math.floor((os.cpu_count() or 1) / POOL_WORKERS))))
+    compute_pool = ComputePool(POOL_WORKERS, POOL_MAX_PENDING)
+    logger.info(f"Started compute pool with {POOL_WORKERS} workers (max pending {POOL_MAX_PENDING})")
+    try:
+        yield
+    finally:
+        compute_pool.shutdown()
+        if redis_client:
+            await redis_client.close()
+
+
+routes = [
+    Route('/api/predict', predict, methods=['POST']),
+    Route('/api/predict/batch', predict_batch, methods=['POST']),
+    Route('/api/health', health_check, methods=['GET']),
+    Route('/ping', ping, methods=['GET']),
+    Route('/metrics', metrics_endpoint, methods=['GET']),
+    Route('/api/cache/clear', clear_cache, methods=['POST']),
+]
+
+app = Starlette(
+    debug=DEBUG,
+    routes=routes,
+    middleware=[
+        Middleware(MetricsMiddleware, paths=[route.path for route in routes]),
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+    ],
+    lifespan=lifespan
+)
@@ -0,0 +1,94 @@
+"""
+Response encoding for the ML microservice.
+
+Prediction responses hold `predictions` and `shap_values` as float64 NumPy
+arrays internally. They are converted at the edge to JSON lists (the
+default, at full precision), or to a msgpack envelope in which each array is
+cast to float32 and sent as a map
+    {"dtype": "<f4", "shape": [rows, cols], "data": <raw bytes>}
+for clients that send `Accept: application/msgpack`. Cache entries use the
+same msgpack form but keep float64, so JSON responses served from the cache
+match fresh ones.
+"""
+
+import json
+from typing import Any, Optional
+
+import msgpack
+import numpy as np
+
+MSGPACK_MIME = 'application/msgpack'
+MSGPACK_MIMES = (MSGPACK_MIME, 'application/x-msgpack')
+ARRAY_DTYPE = '<f4'  # Float arrays in msgpack responses
+RESPONSE_DTYPE = '<f8'  # Float arrays in responses and cache entries
+_ARRAY_KEYS = frozenset(('dtype', 'shape', 'data'))
+
+
+def as_float64(values: Any) -> np.ndarray:
+    """Convert model output to the little-endian float64 arrays responses carry"""
+    return np.ascontiguousarray(values, dtype=RESPONSE_DTYPE)
+
+
+def wants_msgpack(accept_header: Optional[str]) -> bool:
+    """True if the Accept header asks for msgpack (JSON stays the default)"""
+    if not accept_header:
+        return False
+    return any(mime.split(';')[0].strip() in MSGPACK_MIMES for mime in accept_header.split(','))
+
+
+def _array_encoder(float_dtype: Optional[str]):
+    def encode(obj: Any) -> Any:
+        if isinstance(obj, np.ndarray):
+            dtype = float_dtype if float_dtype and obj.dtype.kind == 'f' else obj.dtype.newbyteorder('<')
+            array = np.ascontiguousarray(obj, dtype=dtype)
+            return {'dtype': array.dtype.str, 'shape': list(array.shape), 'data': array.tobytes()}
+        if isinstance(obj, np.generic):
+            return obj.item()
+        raise TypeError(f"Object of type {type(obj).__name__} is not msgpack serializable")
+    return encode
+
+
+_encode_response_array = _array_encoder(ARRAY_DTYPE)
+_encode_exact_array = _array_encoder(None)
+
+
+def _decode_array(obj: dict) -> Any:
+    if obj.keys() == _ARRAY_KEYS and isinstance(obj['data'], bytes):
+        # Zero-copy, read-only view over the received buffer
+        return np.frombuffer(obj['data'], dtype=np.dtype(obj['dtype'])).reshape(obj['shape'])
+    return obj
+
+
+def pack(response: Any, exact: bool = False) -> bytes:
+    """
+    Encode a response as msgpack with arrays as raw little-endian buffers.
+    Float arrays are cast to float32 unless `exact` is set (as for cache
+    entries), in which case every array keeps its dtype.
+    """
+    encoder = _encode_exact_array if exact else _encode_response_array
+    return msgpack.packb(response, default=encoder, use_bin_type=True)
+
+
+def unpack(data: bytes) -> Any:
+    """Decode a msgpack payload produced by pack(), restoring NumPy arrays"""
+    return msgpack.unpackb(data, object_hook=_decode_array, raw=False)
+
+
+def loads_cached(raw: Any) -> Any:
+    """Decode a cache entry, accepting msgpack and entries written as JSON before it"""
+    if isinstance(raw, str):
+        return json.loads(raw)
+    if raw[:1] == b'{':
+        return json.loads(raw)
+    return unpack(raw)
+
+
+def to_json_ready(obj: Any) -> Any:
+    """Replace NumPy arrays and scalars with plain lists and floats for JSON output"""
+    if isinstance(obj, dict):
+        return {key: to_json_ready(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [to_json_ready(value) for value in obj]
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    return obj
@@ -0,0 +1,416 @@
+"""
+Load generator and benchmark for the ML microservice.
+
+Drives /api/predict and /api/predict/batch at a fixed concurrency with a
+configurable request mix, then writes latency percentiles, throughput, error
+rates and memory growth as JSON. Thresholds can be given so the run exits
+non-zero on a regression, which lets a deploy pipeline gate on it.
+
+By default the Flask app is loaded in-process and driven through its test
+client, optionally with an in-process fake Redis (requires `fakeredis`).
+With --url an already running server is driven over HTTP instead, and its
+memory is read from /metrics.
+
+Usage:
+    python load_test.py --concurrency 16 --duration 30 --hit-ratio 0.8 --fake-redis
+    python load_test.py --url http://localhost:5000 --requests 5000 --batch-ratio 0.1 \\
+        --max-p99 0.5 --max-error-rate 0.01 --output perf.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Request fields that make get_model_for_query pick each model type
+MODEL_QUERIES = {
+    'prediction': {'query': 'predict demand next quarter'},
+    'anomaly': {'query': 'find outlier areas'},
+    'correlation': {'query': 'relationship between income and spending'},
+    'hotspot': {'query': 'show clusters', 'visualizationType': 'HOTSPOT'},
+    'multivariate': {'query': 'compare areas', 'visualizationType': 'MULTIVARIATE'},
+    'network': {'query': 'show connections', 'visualizationType': 'NETWORK'}
+}
+
+FEATURE_FIELDS = ('TOTPOP_CY', 'MEDHINC_CY', 'MEDAGE_CY', 'AVGHHSZ_CY', 'DIVINDX_CY')
+
+
+def parse_model_mix(spec: str) -> Dict[str, float]:
+    """Parse 'hotspot=3,prediction=1' into normalized weights"""
+    weights = {}
+    for part in spec.split(','):
+        model_type, _, weight = part.partition('=')
+        model_type = model_type.strip()
+        if model_type not in MODEL_QUERIES:
+            raise ValueError(f"Unknown model type '{model_type}'; expected one of {sorted(MODEL_QUERIES)}")
+        weights[model_type] = float(weight) if weight else 1.0
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError(f"Model mix '{spec}' has no positive weights")
+    return {model_type: weight / total for model_type, weight in weights.items()}
+
+
+@dataclass
+class RequestMix:
+    """What to send: cache-hit ratio, model mix and how often to send batches"""
+    model_weights: Dict[str, float]
+    hit_ratio: float = 0.5
+    hot_set_size: int = 50
+    batch_ratio: float = 0.0
+    batch_size: int = 100
+    seed: int = 0
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+        self._counter = 0
+        # Hot inputs repeat across requests, so after warmup they are cache hits
+        self.hot_inputs = [self._new_input(model_type) for model_type in self.model_weights
+                           for _ in range(max(1, self.hot_set_size // len(self.model_weights)))]
+
+    def _new_input(self, model_type: Optional[str] = None) -> Dict[str, Any]:
+        if model_type is None:
+            model_type = self._rng.choices(list(self.model_weights), list(self.model_weights.values()))[0]
+        self._counter += 1
+        input_data = dict(MODEL_QUERIES[model_type])
+        input_data['requestId'] = self._counter
+        for name in FEATURE_FIELDS:
+            input_data[name] = round(self._rng.uniform(0, 100000), 2)
+        return input_data
+
+    def _next_input(self) -> Dict[str, Any]:
+        if self._rng.random() < self.hit_ratio:
+            return self._rng.choice(self.hot_inputs)
+        return self._new_input()
+
+    def next_request(self) -> Tuple[str, str, Any]:
+        """Return (kind, path, body) for the next request"""
+        with self._lock:
+            if self._rng.random() < self.batch_ratio:
+                return 'batch', '/api/predict/batch', {
+                    'inputs': [self._next_input() for _ in range(self.batch_size)]
+                }
+            return 'single', '/api/predict', self._next_input()
+
+
+class InProcessTarget:
+    """Drives app.py through Flask's test client, one client per thread"""
+
+    def __init__(self, fake_redis: bool = False):
+        import app as service
+        import metrics
+
+        self.service = service
+        self.metrics = metrics
+        self._local = threading.local()
+        if fake_redis:
+            try:
+                import fakeredis
+            except ImportError:
+                raise SystemExit("--fake-redis requires the fakeredis package (pip install fakeredis)")
+            client = fakeredis.FakeRedis()
+            service.redis_client = client
+            service.prediction_cache.redis_client = client
+        self.redis = 'fake' if fake_redis else ('redis' if service.redis_client else 'none')
+
+    def post(self, path: str, body: Any) -> Tuple[int, int]:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.service.app.test_client()
+        headers = {'x-api-key': self.service.API_KEY} if self.service.API_KEY else {}
+        response = client.post(path, json=body, headers=headers)
+        return response.status_code, len(response.get_data())
+
+    def memory_bytes(self) -> Optional[float]:
+        return self.metrics.get_process_rss_bytes()
+
+    def describe(self) -> Dict[str, Any]:
+        return {'mode': 'in_process', 'redis': self.redis}
+
+
+class HttpTarget:
+    """Drives a running server over HTTP, one session per thread"""
+
+    def __init__(self, url: str, api_key: Optional[str] = None, timeout: float = 60):
+        import requests
+
+        self.requests = requests
+        self.url = url.rstrip('/')
+        self.api_key = api_key
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self.requests.Session()
+            if self.api_key:
+                session.headers['x-api-key'] = self.api_key
+        return session
+
+    def post(self, path: str, body: Any) -> Tuple[int, int]:
+        response = self._session().post(f"{self.url}{path}", json=body, timeout=self.timeout)
+        return response.status_code, len(response.content)
+
+    def memory_bytes(self) -> Optional[float]:
+        """Server RSS from /metrics (one worker's view when several are running)"""
+        try:
+            response = self._session().get(f"{self.url}/metrics", timeout=self.timeout)
+            for line in response.text.splitlines():
+                if line.startswith('ml_process_resident_memory_bytes '):
+                    return float(line.split()[1])
+        except Exception as e:
+            logger.warning(f"Could not read server memory from /metrics: {str(e)}")
+        return None
+
+    def describe(self) -> Dict[str, Any]:
+        return {'mode': 'http', 'url': self.url}
+
+
+@dataclass
+class Sample:
+    kind: str
+    latency: float
+    status: int
+    error: Optional[str] = None
+
+
+@dataclass
+class MemorySampler:
+    """Polls the target's memory in the background, keeping the start, end and peak"""
+    target: Any
+    interval: float = 1.0
+    samples: List[float] = field(default_factory=list)
+
+    def __post_init__(self):
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='load-test-memory', daemon=True)
+
+    def _sample(self):
+        value = self.target.memory_bytes()
+        if value is not None:
+            self.samples.append(value)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._sample()
+        self._thread.start()
+
+    def stop(self) -> Dict[str, Optional[float]]:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        if not self.samples:
+            return {'start_bytes': None, 'end_bytes': None, 'peak_bytes': None, 'growth_bytes': None}
+        return {
+            'start_bytes': self.samples[0],
+            'end_bytes': self.samples[-1],
+            'peak_bytes': max(self.samples),
+            'growth_bytes': self.samples[-1] - self.samples[0]
+        }
+
+
+def run_load(target: Any, mix: RequestMix, concurrency: int,
+             duration: Optional[float] = None, total_requests: Optional[int] = None) -> Tuple[List[Sample], float]:
+    """
+    Send requests from `concurrency` threads until `duration` seconds pass or
+    `total_requests` have been sent, whichever comes first.
+
+    Returns:
+        Tuple of (one Sample per request, wall-clock seconds)
+    """
+    samples: List[Sample] = []
+    samples_lock = threading.Lock()
+    sent = [0]
+    start = time.perf_counter()
+    deadline = start + duration if duration else None
+
+    def claim() -> bool:
+        with samples_lock:
+            if total_requests is not None and sent[0] >= total_requests:
+                return False
+            sent[0] += 1
+            return True
+
+    def worker():
+        local_samples = []
+        while (deadline is None or time.perf_counter() < deadline) and claim():
+            kind, path, body = mix.next_request()
+            request_start = time.perf_counter()
+            try:
+                status, _ = target.post(path, body)
+                error = f'HTTP {status}' if status >= 400 else None
+            except Exception as e:
+                status, error = 0, type(e).__name__
+            local_samples.append(Sample(kind, time.perf_counter() - request_start, status, error))
+        with samples_lock:
+            samples.extend(local_samples)
+
+    threads = [threading.Thread(target=worker, name=f'load-test-{i}') for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict[str, Any]:
+    """Latency percentiles, throughput and error rate for a set of samples"""
+    if not samples:
+        return {'requests': 0, 'errors': 0, 'error_rate': 0.0, 'rps': 0.0, 'latency_seconds': None}
+    latencies = np.array([sample.latency for sample in samples])
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    errors = sum(1 for sample in samples if sample.error)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': errors / len(samples),
+        'rps': len(samples) / elapsed if elapsed > 0 else 0.0,
+        'latency_seconds': {
+            'p50': float(p50),
+            'p95': float(p95),
+            'p99': float(p99),
+            'mean': float(latencies.mean()),
+            'max': float(latencies.max())
+        }
+    }
+
+
+def build_report(samples: List[Sample], elapsed: float, memory: Dict[str, Optional[float]],
+                 config: Dict[str, Any]) -> Dict[str, Any]:
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'config': config,
+        'duration_seconds': elapsed,
+        **summarize(samples, elapsed),
+        'by_kind': {
+            kind: summarize([sample for sample in samples if sample.kind == kind], elapsed)
+            for kind in sorted({sample.kind for sample in samples})
+        },
+        'status_codes': {},
+        'error_types': {},
+        'memory': memory
+    }
+    for sample in samples:
+        report['status_codes'][str(sample.status)] = report['status_codes'].get(str(sample.status), 0) + 1
+        if sample.error:
+            report['error_types'][sample.error] = report['error_types'].get(sample.error, 0) + 1
+    return report
+
+
+def check_thresholds(report: Dict[str, Any], max_p99: Optional[float] = None,
+                     max_error_rate: Optional[float] = None, min_rps: Optional[float] = None,
+                     max_memory_growth_mb: Optional[float] = None) -> List[str]:
+    """Return a message for every threshold the run failed"""
+    failures = []
+    latency = report['latency_seconds'] or {}
+    if max_p99 is not None and latency.get('p99', float('inf')) > max_p99:
+        failures.append(f"p99 latency {latency.get('p99')} s exceeds {max_p99} s")
+    if max_error_rate is not None and report['error_rate'] > max_error_rate:
+        failures.append(f"error rate {report['error_rate']:.4f} exceeds {max_error_rate}")
+    if min_rps is not None and report['rps'] < min_rps:
+        failures.append(f"throughput {report['rps']:.1f} req/s is below {min_rps}")
+    growth = report['memory'].get('growth_bytes')
+    if max_memory_growth_mb is not None and growth is not None and growth > max_memory_growth_mb * 1024 * 1024:
+        failures.append(f"memory grew {growth / 1024 / 1024:.1f} MB, more than {max_memory_growth_mb} MB")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the ML microservice and report performance as JSON')
+    parser.add_argument('--url', help='Base URL of a running server (default: load app.py in-process)')
+    parser.add_argument('--api-key', default=os.environ.get('API_KEY'), help='API key for --url')
+    parser.add_argument('--fake-redis', action='store_true', help='In-process only: back the cache with fakeredis')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent client threads')
+    parser.add_argument('--duration', type=float, help='Seconds to run (default: 30 unless --requests is set)')
+    parser.add_argument('--requests', type=int, help='Total requests to send')
+    parser.add_argument('--warmup', type=int, default=None,
+                        help='Requests sent before measuring (default: one per hot input)')
+    parser.add_argument('--hit-ratio', type=float, default=0.5, help='Fraction of inputs drawn from the hot set')
+    parser.add_argument('--hot-set-size', type=int, default=50, help='Distinct inputs in the hot set')
+    parser.add_argument('--model-mix', default='multivariate', help="Model weights, e.g. 'hotspot=3,prediction=1'")
+    parser.add_argument('--batch-ratio', type=float, default=0.0, help='Fraction of requests sent as batches')
+    parser.add_argument('--batch-size', type=int, default=100, help='Inputs per batch request')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the request mix')
+    parser.add_argument('--timeout', type=float, default=60, help='Per-request timeout for --url, in seconds')
+    parser.add_argument('--output', help='Write the JSON report to this file (default: stdout)')
+    parser.add_argument('--max-p99', type=float, help='Fail if overall p99 latency exceeds this many seconds')
+    parser.add_argument('--max-error-rate', type=float, help='Fail if the error rate exceeds this fraction')
+    parser.add_argument('--min-rps', type=float, help='Fail if throughput is below this many requests/s')
+    parser.add_argument('--max-memory-growth-mb', type=float, help='Fail if memory grows by more than this')
+    parser.add_argument('--log-level', default='WARNING', help='Log level while the test runs')
+    args = parser.parse_args()
+
+    if args.duration is None and args.requests is None:
+        args.duration = 30.0
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.url:
+        target = HttpTarget(args.url, args.api_key, args.timeout)
+    else:
+        target = InProcessTarget(fake_redis=args.fake_redis)
+    # Per-request INFO logging from the app would dominate in-process timings
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    mix = RequestMix(
+        model_weights=parse_model_mix(args.model_mix),
+        hit_ratio=args.hit_ratio,
+        hot_set_size=args.hot_set_size,
+        batch_ratio=args.batch_ratio,
+        batch_size=args.batch_size,
+        seed=args.seed
+    )
+
+    # Prime the hot set so hot inputs are cache hits during the measured run
+    warmup = len(mix.hot_inputs) if args.warmup is None else args.warmup
+    for input_data in (mix.hot_inputs * (warmup // len(mix.hot_inputs) + 1))[:warmup]:
+        target.post('/api/predict', input_data)
+
+    sampler = MemorySampler(target)
+    sampler.start()
+    samples, elapsed = run_load(target, mix, args.concurrency, args.duration, args.requests)
+    memory = sampler.stop()
+
+    config = {
+        'target': target.describe(),
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'requests': args.requests,
+        'warmup': warmup,
+        'mix': asdict(mix)
+    }
+    report = build_report(samples, elapsed, memory, config)
+    failures = check_thresholds(report, args.max_p99, args.max_error_rate, args.min_rps,
+                                args.max_memory_growth_mb)
+    report['passed'] = not failures
+    report['failures'] = failures
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        logger.warning(f"Wrote load test report to {args.output}")
+    else:
+        print(output)
+
+    for failure in failures:
+        logger.error(f"Threshold failed: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
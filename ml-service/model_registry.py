@@ -0,0 +1,300 @@
+"""
+Disk-backed model registry for the ML microservice.
+Loads serialized XGBoost models lazily on first use, shares one SHAP explainer
+per model across requests and hot-swaps models when their artifacts change.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import traceback
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import xgboost as xgb
+import shap
+
+logger = logging.getLogger(__name__)
+
+# Raw booster files accepted alongside AutomatedModelTrainer's <type>_model/ directories
+BOOSTER_EXTENSIONS = ('.json', '.ubj', '.model')
+MODEL_DIR_SUFFIX = '_model'
+SYNTHETIC_VERSION = '0.1.0'
+
+
+@dataclass
+class LoadedModel:
+    """A booster with its explainer and feature list, swapped as one unit"""
+    model_type: str
+    booster: xgb.Booster
+    explainer: Any
+    feature_names: List[str]
+    version: str
+    source: str
+    loaded_at: float = field(default_factory=time.time)
+
+
+class ModelRegistry:
+    """
+    Lazily loaded, hot-reloadable registry of XGBoost models.
+
+    Models are looked up in `model_dir` either as directories written by
+    AutomatedModelTrainer._save_model_artifacts (`<type>_model/model.joblib`
+    plus `features.json`) or as raw booster files (`<type>.json`, `.ubj`,
+    `.model`). Model types with no artifact on disk fall back to
+    `fallback_builder`, if one is given.
+
+    Each model is loaded on first `get()`. A background thread polls the
+    artifact fingerprints every `reload_interval` seconds and replaces changed
+    models atomically; in-flight requests keep the LoadedModel they started with.
+    A model's version is a hash of its artifact contents, so it is stable
+    across copies and rebuilds that only touch modification times.
+    """
+
+    def __init__(self, model_dir: Optional[str] = None,
+                 fallback_builder: Optional[Callable[[str], Tuple[xgb.Booster, List[str]]]] = None,
+                 fallback_types: Optional[List[str]] = None,
+                 reload_interval: float = 30):
+        self.model_dir = model_dir
+        self.fallback_builder = fallback_builder
+        self.fallback_types = list(fallback_types or [])
+        self.reload_interval = reload_interval
+        self._models: Dict[str, LoadedModel] = {}
+        self._fingerprints: Dict[str, Tuple] = {}
+        self._versions: Dict[str, Tuple[Tuple, str]] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self.loads = 0
+        self.reloads = 0
+        self.load_errors = 0
+
+    def available_models(self) -> List[str]:
+        """Model types that can be served, whether or not they are loaded yet"""
+        types = set(self.fallback_types) | set(self._models)
+        types.update(self._discover())
+        return sorted(types)
+
+    def loaded_models(self) -> Dict[str, str]:
+        """Currently loaded model types mapped to their versions"""
+        with self._lock:
+            return {model_type: entry.version for model_type, entry in self._models.items()}
+
+    def current_version(self, model_type: str) -> Optional[str]:
+        """
+        Version of the model that would be served now, without loading it.
+        Lets a process that delegates scoring (e.g. to a process pool) build
+        cache keys; None if the model type is unavailable.
+        """
+        artifact = self._find_artifact(model_type)
+        if artifact:
+            fingerprint = self._fingerprint(artifact)
+            return self._version_for(artifact, fingerprint) if fingerprint else None
+        if self.fallback_builder and model_type in self.fallback_types:
+            return SYNTHETIC_VERSION
+        return None
+
+    def get(self, model_type: str) -> Optional[LoadedModel]:
+        """Return the loaded model, loading it on first use; None if unavailable"""
+        entry = self._models.get(model_type)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(model_type, threading.Lock())
+        with load_lock:
+            # Another request may have finished loading while we waited
+            entry = self._models.get(model_type)
+            if entry is not None:
+                return entry
+            entry = self._load(model_type)
+            if entry is not None:
+                with self._lock:
+                    self._models[model_type] = entry
+                self._ensure_watcher()
+            return entry
+
+    def reload_changed(self) -> List[str]:
+        """Reload every loaded model whose artifacts changed on disk"""
+        reloaded = []
+        for model_type in list(self._models):
+            artifact = self._find_artifact(model_type)
+            fingerprint = self._fingerprint(artifact) if artifact else None
+            if fingerprint is None or fingerprint == self._fingerprints.get(model_type):
+                continue
+            # A copy or checkout changes mtimes without changing the model
+            if self._version_for(artifact, fingerprint) == self._models[model_type].version:
+                self._fingerprints[model_type] = fingerprint
+                continue
+
+            logger.info(f"Artifacts for {model_type} model changed, reloading")
+            with self._load_locks[model_type]:
+                entry = self._load(model_type)
+                if entry is None:
+                    logger.warning(f"Keeping previous {model_type} model after failed reload")
+                    continue
+                with self._lock:
+                    self._models[model_type] = entry
+            self.reloads += 1
+            reloaded.append(model_type)
+        return reloaded
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'model_dir': self.model_dir,
+            'loaded': self.loaded_models(),
+            'loads': self.loads,
+            'reloads': self.reloads,
+            'load_errors': self.load_errors,
+            'watching': self._watcher is not None and self._watcher.is_alive()
+        }
+
+    def _load(self, model_type: str) -> Optional[LoadedModel]:
+        start_time = time.time()
+        artifact = self._find_artifact(model_type)
+        try:
+            if artifact:
+                fingerprint = self._fingerprint(artifact)
+                booster, feature_names = self._read_artifact(artifact)
+                version = self._version_for(artifact, fingerprint)
+                source = artifact
+            elif self.fallback_builder and model_type in self.fallback_types:
+                fingerprint = None
+                booster, feature_names = self.fallback_builder(model_type)
+                version = SYNTHETIC_VERSION
+                source = 'synthetic'
+            else:
+                return None
+
+            entry = LoadedModel(
+                model_type=model_type,
+                booster=booster,
+                explainer=shap.TreeExplainer(booster),
+                feature_names=feature_names,
+                version=version,
+                source=source
+            )
+            self._fingerprints[model_type] = fingerprint
+            self.loads += 1
+            logger.info(f"Successfully loaded {model_type} model from {source} "
+                        f"(version {version}, {time.time() - start_time:.2f}s)")
+            return entry
+        except Exception as e:
+            self.load_errors += 1
+            logger.error(f"Failed to load {model_type} model: {str(e)}")
+            logger.error(traceback.format_exc())
+            return None
+
+    def _discover(self) -> List[str]:
+        if not self.model_dir or not os.path.isdir(self.model_dir):
+            return []
+        found = []
+        for name in os.listdir(self.model_dir):
+            path = os.path.join(self.model_dir, name)
+            if name.endswith(MODEL_DIR_SUFFIX) and os.path.isfile(os.path.join(path, 'model.joblib')):
+                found.append(name[:-len(MODEL_DIR_SUFFIX)])
+            elif name.endswith(BOOSTER_EXTENSIONS) and os.path.isfile(path):
+                found.append(os.path.splitext(name)[0])
+        return found
+
+    def _find_artifact(self, model_type: str) -> Optional[str]:
+        if not self.model_dir:
+            return None
+        model_path = os.path.join(self.model_dir, f"{model_type}{MODEL_DIR_SUFFIX}")
+        if os.path.isfile(os.path.join(model_path, 'model.joblib')):
+            return model_path
+        for extension in BOOSTER_EXTENSIONS:
+            booster_path = os.path.join(self.model_dir, f"{model_type}{extension}")
+            if os.path.isfile(booster_path):
+                return booster_path
+        return None
+
+    def _version_for(self, artifact: str, fingerprint: Tuple) -> str:
+        """
+        Content hash of the artifact, so the version (and the SHAP tables and
+        cache entries keyed on it) survives copies, checkouts and image
+        rebuilds. Only rehashed when the artifact's fingerprint changes.
+        """
+        cached = self._versions.get(artifact)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        version = self._content_hash(artifact)
+        self._versions[artifact] = (fingerprint, version)
+        return version
+
+    @staticmethod
+    def _content_hash(artifact: str) -> str:
+        digest = hashlib.sha256()
+        if os.path.isdir(artifact):
+            paths = sorted(os.path.join(artifact, name) for name in os.listdir(artifact))
+        else:
+            paths = [artifact]
+        for path in paths:
+            if not os.path.isfile(path):
+                continue
+            digest.update(os.path.basename(path).encode() + b'\0')
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            digest.update(b'\0')
+        return digest.hexdigest()[:12]
+
+    @staticmethod
+    def _fingerprint(artifact: str) -> Optional[Tuple]:
+        """(name, size, mtime) of every file in the artifact, a cheap trigger for rehashing and reloads"""
+        try:
+            if os.path.isdir(artifact):
+                paths = sorted(os.path.join(artifact, name) for name in os.listdir(artifact))
+            else:
+                paths = [artifact]
+            return tuple(
+                (os.path.basename(path), stat.st_size, stat.st_mtime_ns)
+                for path in paths
+                for stat in [os.stat(path)]
+            )
+        except OSError:
+            return None
+
+    @staticmethod
+    def _read_artifact(artifact: str) -> Tuple[xgb.Booster, List[str]]:
+        if os.path.isdir(artifact):
+            import joblib
+            model = joblib.load(os.path.join(artifact, 'model.joblib'))
+            if isinstance(model, xgb.XGBModel):
+                booster = model.get_booster()
+            elif isinstance(model, xgb.Booster):
+                booster = model
+            else:
+                raise TypeError(f"Unsupported model class {type(model).__name__}; expected an XGBoost model")
+            features_file = os.path.join(artifact, 'features.json')
+            if os.path.isfile(features_file):
+                with open(features_file) as f:
+                    feature_names = json.load(f)
+            else:
+                feature_names = list(booster.feature_names or [])
+        else:
+            booster = xgb.Booster()
+            booster.load_model(artifact)
+            feature_names = list(booster.feature_names or [])
+        return booster, feature_names
+
+    def _ensure_watcher(self):
+        if self.reload_interval <= 0 or not self.model_dir:
+            return
+        with self._lock:
+            if self._watcher is not None and self._watcher.is_alive():
+                return
+            # Started lazily so each gunicorn worker runs its own watcher after fork
+            self._watcher = threading.Thread(target=self._watch, name='model-registry-watcher', daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.reload_interval)
+            try:
+                self.reload_changed()
+            except Exception as e:
+                logger.error(f"Model reload check failed: {str(e)}")
@@ -0,0 +1,472 @@
+"""
+Two-tier prediction cache for the ML microservice.
+An in-process LRU (bounded by bytes, with TTL eviction) sits in front of Redis
+so repeated queries are answered without a network hop.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from encoding import pack, loads_cached
+from metrics import REDIS_ERRORS
+
+logger = logging.getLogger(__name__)
+
+
+class LocalLRUCache:
+    """Thread-safe LRU cache bounded by the serialized size of its entries"""
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.ttl > 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a shallow copy of the cached value, or None on miss/expiry"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(value)
+
+    def set(self, key: str, value: Dict[str, Any], size: int):
+        """Store a value, evicting least recently used entries to stay under max_bytes"""
+        if not self.enabled or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (dict(value), size, time.monotonic() + self.ttl)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def clear(self, prefix: Optional[str] = None) -> int:
+        """Drop all entries (or those whose key starts with prefix) and return how many were removed"""
+        with self._lock:
+            if prefix is None:
+                count = len(self._entries)
+                self._entries.clear()
+                self.current_bytes = 0
+                return count
+            matching = [key for key in self._entries if key.startswith(prefix)]
+            for key in matching:
+                self._remove(key)
+            return len(matching)
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+class PredictionCache:
+    """
+    Prediction cache with an in-process LRU tier in front of Redis.
+
+    Reads check the local tier first and fill it from Redis on a miss.
+    Writes go to both tiers. Redis errors are logged and counted but never
+    raised, so a Redis outage degrades to local-only caching.
+    """
+
+    def __init__(self, redis_client=None, redis_ttl: int = 3600,
+                 local_max_bytes: int = 64 * 1024 * 1024, local_ttl: float = 60):
+        self.redis_client = redis_client
+        self.redis_ttl = redis_ttl
+        self.local = LocalLRUCache(local_max_bytes, min(local_ttl, redis_ttl))
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self.redis_errors = 0
+        self._stats_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.local.enabled or self.redis_client is not None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a single key in the local tier, then Redis"""
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Look up many keys, using one MGET for everything the local tier misses"""
+        results: List[Optional[Dict[str, Any]]] = [self.local.get(key) for key in keys]
+        missing = [i for i, value in enumerate(results) if value is None]
+        if not missing or not self.redis_client:
+            return results
+
+        try:
+            raw_values = self.redis_client.mget([keys[i] for i in missing])
+        except Exception as e:
+            logger.warning(f"Error checking cache: {str(e)}")
+            self._count(errors=1)
+            REDIS_ERRORS.inc(operation='get')
+            return results
+
+        self._merge_redis_values(keys, missing, raw_values, results)
+        return results
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """Write a single value to both tiers"""
+        self.set_many({key: value})
+
+    def set_many(self, items: Dict[str, Dict[str, Any]]):
+        """Write many values to both tiers, pipelining the Redis writes"""
+        if not items:
+            return
+        serialized = self._store_local(items)
+        if not self.redis_client:
+            return
+        try:
+            if len(serialized) == 1:
+                key, raw = next(iter(serialized.items()))
+                self.redis_client.setex(key, self.redis_ttl, raw)
+            else:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for key, raw in serialized.items():
+                    pipe.setex(key, self.redis_ttl, raw)
+                pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error caching result: {str(e)}")
+            self._count(errors=1)
+            REDIS_ERRORS.inc(operation='set')
+
+    def invalidate(self, prefix: str, batch_size: int = 500,
+                   progress_callback=None) -> Dict[str, Any]:
+        """
+        Remove every entry whose key starts with prefix from both tiers.
+
+        Redis keys are found with cursor-based SCAN and removed with UNLINK one
+        page at a time, so the server is never blocked by a single large
+        KEYS/DEL and memory is reclaimed in the background.
+
+        Args:
+            prefix: Key prefix to invalidate (e.g. 'pred:' or 'pred:hotspot:')
+            batch_size: SCAN COUNT hint, which bounds the keys removed per UNLINK
+            progress_callback: Optional callback receiving the running result dict
+
+        Returns:
+            Dict with local/Redis removal counts, keys scanned and batches run
+        """
+        start_time = time.time()
+        result = {
+            'local_removed': self.local.clear(prefix),
+            'redis_removed': 0,
+            'scanned': 0,
+            'batches': 0
+        }
+
+        if self.redis_client:
+            use_unlink = True
+            cursor = 0
+            while True:
+                cursor, keys = self.redis_client.scan(cursor=cursor, match=f"{prefix}*", count=batch_size)
+                result['scanned'] += len(keys)
+                if keys:
+                    if use_unlink:
+                        try:
+                            result['redis_removed'] += self.redis_client.unlink(*keys)
+                        except Exception as e:
+                            # UNLINK needs Redis 4+; fall back to DEL of the same small batch
+                            logger.warning(f"UNLINK unavailable, falling back to DEL: {str(e)}")
+                            use_unlink = False
+                    if not use_unlink:
+                        result['redis_removed'] += self.redis_client.delete(*keys)
+                    result['batches'] += 1
+                    if progress_callback:
+                        progress_callback(dict(result))
+                if cursor == 0:
+                    break
+
+        result['duration'] = time.time() - start_time
+        logger.info(f"Invalidated '{prefix}*': {result['redis_removed']} Redis keys in "
+                    f"{result['batches']} batches, {result['local_removed']} local entries "
+                    f"({result['duration']:.2f}s)")
+        return result
+
+    def _merge_redis_values(self, keys: List[str], missing: List[int], raw_values: List[Any],
+                            results: List[Optional[Dict[str, Any]]]):
+        """Decode Redis values into results and fill the local tier with them"""
+        hits = 0
+        for i, raw in zip(missing, raw_values):
+            if not raw:
+                continue
+            try:
+                value = loads_cached(raw)
+            except ValueError:
+                logger.warning(f"Discarding unreadable cache entry: {keys[i]}")
+                continue
+            self.local.set(keys[i], value, len(raw))
+            results[i] = value
+            hits += 1
+        self._count(hits=hits, misses=len(missing) - hits)
+
+    def _store_local(self, items: Dict[str, Dict[str, Any]]) -> Dict[str, bytes]:
+        """Write values to the local tier and return their msgpack form for Redis"""
+        serialized = {key: pack(value, exact=True) for key, value in items.items()}
+        for key, value in items.items():
+            self.local.set(key, value, len(serialized[key]))
+        return serialized
+
+    def _count(self, hits: int = 0, misses: int = 0, errors: int = 0):
+        with self._stats_lock:
+            self.redis_hits += hits
+            self.redis_misses += misses
+            self.redis_errors += errors
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-tier hit/miss/eviction counters for the health endpoint"""
+        with self._stats_lock:
+            redis_stats = {
+                'enabled': self.redis_client is not None,
+                'ttl': self.redis_ttl,
+                'hits': self.redis_hits,
+                'misses': self.redis_misses,
+                'errors': self.redis_errors
+            }
+        return {
+            'local': self.local.stats(),
+            'redis': redis_stats
+        }
+
+
+class AsyncPredictionCache(PredictionCache):
+    """
+    PredictionCache for the ASGI server, backed by a `redis.asyncio` client.
+    The local tier is shared with the synchronous implementation; only Redis
+    access is awaited.
+    """
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return (await self.get_many([key]))[0]
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        results: List[Optional[Dict[str, Any]]] = [self.local.get(key) for key in keys]
+        missing = [i for i, value in enumerate(results) if value is None]
+        if not missing or not self.redis_client:
+            return results
+
+        try:
+            raw_values = await self.redis_client.mget([keys[i] for i in missing])
+        except Exception as e:
+            logger.warning(f"Error checking cache: {str(e)}")
+            self._count(errors=1)
+            REDIS_ERRORS.inc(operation='get')
+            return results
+
+        self._merge_redis_values(keys, missing, raw_values, results)
+        return results
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        await self.set_many({key: value})
+
+    async def set_many(self, items: Dict[str, Dict[str, Any]]):
+        if not items:
+            return
+        serialized = self._store_local(items)
+        if not self.redis_client:
+            return
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, raw in serialized.items():
+                pipe.setex(key, self.redis_ttl, raw)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error caching result: {str(e)}")
+            self._count(errors=1)
+            REDIS_ERRORS.inc(operation='set')
+
+    async def invalidate(self, prefix: str, batch_size: int = 500,
+                         progress_callback=None) -> Dict[str, Any]:
+        """Async SCAN + UNLINK invalidation; see PredictionCache.invalidate"""
+        start_time = time.time()
+        result = {
+            'local_removed': self.local.clear(prefix),
+            'redis_removed': 0,
+            'scanned': 0,
+            'batches': 0
+        }
+
+        if self.redis_client:
+            use_unlink = True
+            cursor = 0
+            while True:
+                cursor, keys = await self.redis_client.scan(cursor=cursor, match=f"{prefix}*", count=batch_size)
+                result['scanned'] += len(keys)
+                if keys:
+                    if use_unlink:
+                        try:
+                            result['redis_removed'] += await self.redis_client.unlink(*keys)
+                        except Exception as e:
+                            logger.warning(f"UNLINK unavailable, falling back to DEL: {str(e)}")
+                            use_unlink = False
+                    if not use_unlink:
+                        result['redis_removed'] += await self.redis_client.delete(*keys)
+                    result['batches'] += 1
+                    if progress_callback:
+                        progress_callback(dict(result))
+                if cursor == 0:
+                    break
+
+        result['duration'] = time.time() - start_time
+        logger.info(f"Invalidated '{prefix}*': {result['redis_removed']} Redis keys in "
+                    f"{result['batches']} batches, {result['local_removed']} local entries "
+                    f"({result['duration']:.2f}s)")
+        return result
+
+
+class _Flight:
+    """One in-progress computation that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one computation.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight block until it finishes and receive a copy of its result (or its
+    exception). Coalescing is per process, so each worker computes a given key
+    at most once at a time.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def do(self, key: str, fn: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+        """
+        Run fn once per key across concurrent callers
+
+        Returns:
+            Tuple of (result, coalesced) where coalesced is True for callers
+            that waited on another caller's computation
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.leaders += 1
+                leader = True
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            if not flight.done.wait(self.timeout):
+                # The leader is stuck; compute independently rather than hang
+                with self._lock:
+                    self.timeouts += 1
+                return fn(), False
+            if flight.error is not None:
+                raise flight.error
+            return dict(flight.result), True
+
+        try:
+            flight.result = fn()
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'waiting': sum(flight.waiters for flight in self._flights.values()),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'timeouts': self.timeouts
+            }
+
+
+class AsyncSingleFlight:
+    """
+    asyncio counterpart of SingleFlight: concurrent awaits for the same key
+    share one task. Waiters receive a copy of the result.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, "asyncio.Future"] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Dict[str, Any]]]) -> Tuple[Dict[str, Any], bool]:
+        """Await fn once per key across concurrent callers; returns (result, coalesced)"""
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            # shield() so a cancelled waiter does not cancel the shared computation
+            return dict(await asyncio.shield(flight)), True
+
+        self.leaders += 1
+        flight = asyncio.ensure_future(fn())
+        self._flights[key] = flight
+        try:
+            return await asyncio.shield(flight), False
+        finally:
+            if flight.done():
+                del self._flights[key]
+            else:
+                flight.add_done_callback(lambda _: self._flights.pop(key, None))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'in_flight': len(self._flights),
+            'leaders': self.leaders,
+            'coalesced': self.coalesced
+        }
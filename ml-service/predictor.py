@@ -0,0 +1,236 @@
+"""
+Model-side prediction logic shared by the WSGI (app.py) and ASGI (asgi.py) servers.
+Kept free of web framework and Redis imports so process-pool workers can import it cheaply.
+"""
+
+import os
+import time
+import json
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from model_registry import ModelRegistry, LoadedModel
+from encoding import as_float64
+from shap_tables import ShapTableStore
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.environ.get('MODEL_DIR', 'models')
+MODEL_RELOAD_INTERVAL = int(os.environ.get('MODEL_RELOAD_INTERVAL', '30'))  # Seconds, 0 disables hot reload
+SHAP_TABLE_DIR = os.environ.get('SHAP_TABLE_DIR', 'shap_tables')
+
+# Models served when no artifact for that type exists in MODEL_DIR
+MODEL_TYPES = [
+    'hotspot',
+    'multivariate',
+    'prediction',
+    'anomaly',
+    'network',
+    'correlation'
+]
+
+def build_synthetic_model(model_type: str):
+    """Train a small placeholder model for a type with no artifact on disk"""
+    if model_type == 'prediction':
+        # Create a simple regressor
+        X = np.random.rand(100, 10)
+        y = np.random.rand(100) * 10
+        params = {
+            'max_depth': 3,
+            'eta': 0.1,
+            'objective': 'reg:squarederror',
+            'eval_metric': 'rmse'
+        }
+    else:
+        # Create a simple classifier
+        X = np.random.rand(100, 10)
+        y = np.random.randint(0, 2, 100)
+        params = {
+            'max_depth': 3,
+            'eta': 0.1,
+            'objective': 'binary:logistic',
+            'eval_metric': 'logloss'
+        }
+    dtrain = xgb.DMatrix(X, label=y)
+    booster = xgb.train(params, dtrain, num_boost_round=10)
+    return booster, [f'feature_{i}' for i in range(X.shape[1])]
+
+# Model registry: loads artifacts from MODEL_DIR on first use and hot-swaps them on change
+model_registry = ModelRegistry(
+    MODEL_DIR,
+    fallback_builder=build_synthetic_model,
+    fallback_types=MODEL_TYPES,
+    reload_interval=MODEL_RELOAD_INTERVAL
+)
+
+# Precomputed per-area predictions and SHAP values (built offline by shap_tables.py)
+shap_table_store = ShapTableStore(SHAP_TABLE_DIR)
+
+def load_models():
+    """Eagerly load every available model (models are otherwise loaded on first use)"""
+    for model_type in model_registry.available_models():
+        logger.info(f"Loading {model_type} model...")
+        model_registry.get(model_type)
+
+def get_feature_vector(input_data: Dict[str, Any], model_type: str) -> pd.DataFrame:
+    """
+    Convert input data to feature vector for model prediction
+    """
+    # In a real implementation, this would transform the geospatial data
+    # into features the model expects
+    
+    # For this skeleton, we'll create dummy features
+    features = {}
+    model = model_registry.get(model_type)
+    feature_list = model.feature_names if model else []
+    
+    # Create random features for demonstration
+    for feature in feature_list:
+        features[feature] = np.random.rand()
+    
+    # Add some basic features from the input
+    if 'query' in input_data:
+        query = input_data['query'].lower()
+        features['query_length'] = len(query)
+        features['has_predict'] = 'predict' in query
+        features['has_correlation'] = 'correlation' in query
+    
+    if 'visualizationType' in input_data:
+        viz_type = input_data['visualizationType']
+        features['is_complex_viz'] = viz_type in ['HOTSPOT', 'MULTIVARIATE', 'BIVARIATE', 'NETWORK']
+    
+    # Align columns with the features the model was trained on
+    if feature_list:
+        return pd.DataFrame([features]).reindex(columns=feature_list)
+    return pd.DataFrame([features])
+
+def get_model_for_query(input_data: Dict[str, Any]) -> str:
+    """
+    Determine which model to use based on the query and visualization type
+    
+    Raises:
+        ValueError: If `query` or `visualizationType` is present but not a string
+    """
+    query = input_data.get('query', '')
+    viz_type = input_data.get('visualizationType', '')
+    for name, value in (('query', query), ('visualizationType', viz_type)):
+        if not isinstance(value, str):
+            raise ValueError(f'"{name}" must be a string, got {type(value).__name__}')
+    query = query.lower()
+    
+    # Select model based on query and visualization type
+    if 'predict' in query or 'forecast' in query:
+        return 'prediction'
+    elif 'anomaly' in query or 'outlier' in query:
+        return 'anomaly'
+    elif 'correlation' in query or 'relationship' in query:
+        return 'correlation'
+    elif viz_type == 'HOTSPOT':
+        return 'hotspot'
+    elif viz_type == 'MULTIVARIATE':
+        return 'multivariate'
+    elif viz_type == 'NETWORK':
+        return 'network'
+    else:
+        return 'multivariate'  # Default model
+
+def generate_cache_key(input_data: Dict[str, Any], model_type: str, model_version: Optional[str] = None) -> str:
+    """Generate a unique cache key for the prediction request"""
+    # Create a string representation of the input and model type
+    key_data = {
+        "input": input_data,
+        "model_type": model_type
+    }
+    # Include the model version so a hot-swapped model never serves stale entries
+    if model_version:
+        key_data["model_version"] = model_version
+    # Convert to JSON and hash
+    json_str = json.dumps(key_data, sort_keys=True)
+    # Prefix with the model type so a single model's entries can be invalidated
+    return f"pred:{model_type}:{hashlib.md5(json_str.encode()).hexdigest()}"
+
+def format_prediction_response(model: LoadedModel, prediction: np.ndarray, shap_values: Any) -> Dict[str, Any]:
+    """Build the prediction response body shared by the single and batch endpoints"""
+    explainer = model.explainer
+    return {
+        'predictions': as_float64(prediction),
+        'explanations': {
+            'shap_values': as_float64(shap_values if not isinstance(shap_values, list) else shap_values[0]),
+            'feature_names': model.feature_names,
+            'base_value': float(np.ravel(explainer.expected_value)[0])
+        },
+        'model_version': model.version,
+        'model_type': model.model_type,
+        'cached': False
+    }
+
+def score_inputs(model: LoadedModel, inputs: List[Dict[str, Any]],
+                 timings: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """
+    Score many inputs with one DMatrix, one predict and one SHAP call
+    
+    If `timings` is given, the seconds spent in each stage (feature_vector,
+    dmatrix, predict, shap) are added to it.
+    """
+    timings = timings if timings is not None else {}
+    stage_start = time.perf_counter()
+    
+    def lap(stage: str):
+        nonlocal stage_start
+        now = time.perf_counter()
+        timings[stage] = timings.get(stage, 0.0) + now - stage_start
+        stage_start = now
+    
+    features_df = pd.concat(
+        [get_feature_vector(input_data, model.model_type) for input_data in inputs],
+        ignore_index=True
+    )
+    lap('feature_vector')
+    features_dmatrix = xgb.DMatrix(features_df)
+    lap('dmatrix')
+    
+    # Make predictions
+    predictions = model.booster.predict(features_dmatrix)
+    lap('predict')
+    
+    # Generate SHAP explanations
+    shap_values = model.explainer.shap_values(features_df)
+    if isinstance(shap_values, list):
+        shap_values = shap_values[0]
+    lap('shap')
+    
+    return [
+        format_prediction_response(model, predictions[row:row + 1], shap_values[row:row + 1])
+        for row in range(len(inputs))
+    ]
+
+def run_predictions(model_type: str, inputs: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """
+    Answer inputs for one model, from the SHAP table where possible and by
+    scoring the rest. Used as the process-pool entry point by the ASGI server.
+    
+    Returns:
+        Tuple of (responses in input order, seconds per scoring stage)
+    """
+    model = model_registry.get(model_type)
+    if model is None:
+        raise LookupError(f'Model {model_type} not available')
+    
+    results: List[Optional[Dict[str, Any]]] = [None] * len(inputs)
+    for idx, input_data in enumerate(inputs):
+        precomputed = shap_table_store.lookup(model, input_data.get('areaId'))
+        if precomputed:
+            results[idx] = format_prediction_response(model, *precomputed)
+            results[idx]['precomputed'] = True
+    
+    timings: Dict[str, float] = {}
+    misses = [idx for idx, result in enumerate(results) if result is None]
+    if misses:
+        for idx, response in zip(misses, score_inputs(model, [inputs[idx] for idx in misses], timings)):
+            results[idx] = response
+    return results, timings
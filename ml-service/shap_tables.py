@@ -0,0 +1,237 @@
+"""
+Precomputed SHAP lookup tables for the ML microservice.
+
+For fixed geography sets the model inputs repeat across users, so predictions
+and SHAP values can be computed once per area offline and served from
+memory-mapped float32 arrays. Live SHAP is only needed for novel inputs.
+
+Table layout (one directory per model type):
+    <table_dir>/<model_type>/meta.json         model version, feature names, base value
+    <table_dir>/<model_type>/area_ids.json     area IDs in row order
+    <table_dir>/<model_type>/predictions.npy   float32 [n_areas]
+    <table_dir>/<model_type>/shap_values.npy   float32 [n_areas, n_features]
+
+Usage:
+    MODEL_DIR=models python shap_tables.py areas.csv --id-column ID --output shap_tables
+"""
+
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from model_registry import ModelRegistry, LoadedModel
+
+logger = logging.getLogger(__name__)
+
+TABLE_FORMAT_VERSION = 1
+
+
+class ShapTable:
+    """Read-only view of one model's precomputed table, backed by memory-mapped arrays"""
+
+    def __init__(self, table_path: str):
+        with open(os.path.join(table_path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        with open(os.path.join(table_path, 'area_ids.json')) as f:
+            area_ids = json.load(f)
+        self.path = table_path
+        self.model_type = self.meta['model_type']
+        self.model_version = self.meta['model_version']
+        self.feature_names = self.meta['feature_names']
+        self.index = {str(area_id): row for row, area_id in enumerate(area_ids)}
+        self.predictions = np.load(os.path.join(table_path, 'predictions.npy'), mmap_mode='r')
+        self.shap_values = np.load(os.path.join(table_path, 'shap_values.npy'), mmap_mode='r')
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def lookup(self, area_id: Any) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Return (prediction[1], shap_values[1, n_features]) for an area, or None if unknown"""
+        row = self.index.get(str(area_id))
+        if row is None:
+            return None
+        return (np.asarray(self.predictions[row:row + 1], dtype=np.float32),
+                np.asarray(self.shap_values[row:row + 1], dtype=np.float32))
+
+
+class ShapTableStore:
+    """
+    Opens tables lazily per model type and only serves a table built for the
+    exact model version currently loaded, so a hot-swapped model never
+    answers from a stale table.
+    """
+
+    def __init__(self, table_dir: Optional[str], retry_interval: float = 30):
+        self.table_dir = table_dir
+        self.retry_interval = retry_interval
+        self._tables: Dict[str, ShapTable] = {}
+        self._last_attempt: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.table_dir) and os.path.isdir(self.table_dir)
+
+    def get(self, model: LoadedModel) -> Optional[ShapTable]:
+        """Return the table matching this model's type and version, if one exists"""
+        if not self.enabled:
+            return None
+        table = self._tables.get(model.model_type)
+        if table is not None and table.model_version == model.version:
+            return table
+
+        # Re-check the disk at most once per retry_interval per model type
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_attempt.get(model.model_type, -self.retry_interval) < self.retry_interval:
+                return None
+            self._last_attempt[model.model_type] = now
+
+        table_path = os.path.join(self.table_dir, model.model_type)
+        if not os.path.isfile(os.path.join(table_path, 'meta.json')):
+            return None
+        try:
+            table = ShapTable(table_path)
+        except Exception as e:
+            logger.warning(f"Could not open SHAP table {table_path}: {str(e)}")
+            return None
+        if table.model_version != model.version:
+            logger.info(f"SHAP table for {model.model_type} was built for version "
+                        f"{table.model_version}, model is {model.version}; ignoring")
+            return None
+
+        self._tables[model.model_type] = table
+        logger.info(f"Opened SHAP table for {model.model_type}: {len(table)} areas")
+        return table
+
+    def lookup(self, model: LoadedModel, area_id: Any) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Look up one area for a model, counting hits and misses"""
+        if area_id is None:
+            return None
+        table = self.get(model)
+        result = table.lookup(area_id) if table is not None else None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'table_dir': self.table_dir,
+            'enabled': self.enabled,
+            'tables': {
+                model_type: {'version': table.model_version, 'areas': len(table)}
+                for model_type, table in self._tables.items()
+            },
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+def build_shap_table(model: LoadedModel, area_ids: List[Any], features_df: pd.DataFrame,
+                     output_dir: str, chunk_size: int = 5000) -> str:
+    """
+    Evaluate predictions and SHAP values for every area and write the table.
+
+    Results are written chunk by chunk into preallocated memory-mapped files,
+    and the finished table replaces any previous one with a directory rename.
+
+    Returns:
+        Path of the written table directory
+    """
+    start_time = time.time()
+    features_df = features_df.reindex(columns=model.feature_names)
+    n_areas, n_features = len(features_df), len(model.feature_names)
+
+    table_path = os.path.join(output_dir, model.model_type)
+    staging_path = f"{table_path}.tmp-{os.getpid()}"
+    shutil.rmtree(staging_path, ignore_errors=True)
+    os.makedirs(staging_path)
+
+    predictions = np.lib.format.open_memmap(
+        os.path.join(staging_path, 'predictions.npy'), mode='w+', dtype='<f4', shape=(n_areas,))
+    shap_values = np.lib.format.open_memmap(
+        os.path.join(staging_path, 'shap_values.npy'), mode='w+', dtype='<f4', shape=(n_areas, n_features))
+
+    for start in range(0, n_areas, chunk_size):
+        chunk = features_df.iloc[start:start + chunk_size]
+        predictions[start:start + len(chunk)] = model.booster.predict(xgb.DMatrix(chunk))
+        chunk_shap = model.explainer.shap_values(chunk)
+        if isinstance(chunk_shap, list):
+            chunk_shap = chunk_shap[0]
+        shap_values[start:start + len(chunk)] = chunk_shap
+        logger.info(f"{model.model_type}: {min(start + chunk_size, n_areas)}/{n_areas} areas")
+
+    predictions.flush()
+    shap_values.flush()
+    del predictions, shap_values
+
+    with open(os.path.join(staging_path, 'area_ids.json'), 'w') as f:
+        json.dump([str(area_id) for area_id in area_ids], f)
+    with open(os.path.join(staging_path, 'meta.json'), 'w') as f:
+        json.dump({
+            'format_version': TABLE_FORMAT_VERSION,
+            'model_type': model.model_type,
+            'model_version': model.version,
+            'feature_names': model.feature_names,
+            'base_value': float(np.ravel(model.explainer.expected_value)[0]),
+            'areas': n_areas,
+            'created_at': time.time()
+        }, f, indent=2)
+
+    shutil.rmtree(table_path, ignore_errors=True)
+    os.rename(staging_path, table_path)
+    logger.info(f"Wrote SHAP table for {model.model_type} ({n_areas} areas x {n_features} features) "
+                f"to {table_path} in {time.time() - start_time:.1f}s")
+    return table_path
+
+
+def main():
+    """Precompute SHAP tables for every disk-backed model"""
+    parser = argparse.ArgumentParser(description='Precompute SHAP lookup tables for known areas')
+    parser.add_argument('features_file', help='CSV or Parquet file with one row of model features per area')
+    parser.add_argument('--id-column', default='ID', help='Column holding the area ID')
+    parser.add_argument('--output', default=os.environ.get('SHAP_TABLE_DIR', 'shap_tables'),
+                        help='Output directory for the tables')
+    parser.add_argument('--model-dir', default=os.environ.get('MODEL_DIR', 'models'),
+                        help='Directory with serialized models')
+    parser.add_argument('--models', help='Comma-separated model types (default: all on disk)')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='Areas evaluated per SHAP call')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.features_file.endswith('.parquet'):
+        areas_df = pd.read_parquet(args.features_file)
+    else:
+        areas_df = pd.read_csv(args.features_file)
+    area_ids = areas_df[args.id_column].tolist()
+
+    # Synthetic fallback models differ per process, so only disk-backed models get tables
+    registry = ModelRegistry(args.model_dir, reload_interval=0)
+    model_types = args.models.split(',') if args.models else registry.available_models()
+
+    os.makedirs(args.output, exist_ok=True)
+    for model_type in model_types:
+        model = registry.get(model_type)
+        if model is None:
+            logger.warning(f"No model artifact for {model_type}, skipping")
+            continue
+        build_shap_table(model, area_ids, areas_df, args.output, chunk_size=args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
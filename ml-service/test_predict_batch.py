@@ -0,0 +1,41 @@
+"""
+Batch prediction tests for the Flask and ASGI servers.
+Run from ml-service/ with `python -m pytest test_predict_batch.py`.
+"""
+
+import pytest
+
+BATCH = {'inputs': [
+    {'query': 'predict growth', 'areaId': 'A1'},
+    {'query': None},
+    {'query': 'find outliers', 'visualizationType': 5},
+    {'query': 'correlation with income'},
+]}
+
+
+def assert_mixed_batch(body):
+    results = body['results']
+    assert len(results) == 4
+    assert body['errors'] == 2
+    for idx in (1, 2):
+        assert results[idx]['error_type'] == 'ValueError'
+    for idx in (0, 3):
+        assert 'error' not in results[idx]
+        assert len(results[idx]['predictions']) == 1
+
+
+def test_flask_batch_isolates_malformed_items():
+    from app import app
+    response = app.test_client().post('/api/predict/batch', json=BATCH)
+    assert response.status_code == 200
+    assert_mixed_batch(response.get_json())
+
+
+def test_asgi_batch_isolates_malformed_items():
+    pytest.importorskip('httpx')
+    from starlette.testclient import TestClient
+    from asgi import app
+    with TestClient(app) as client:
+        response = client.post('/api/predict/batch', json=BATCH)
+    assert response.status_code == 200
+    assert_mixed_batch(response.json())
@@ -12,7 +12,10 @@ from datetime import datetime
 import logging
 from pathlib import Path
 import math
+import os
+import time
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
 # Import configurable algorithm engine
 try:
@@ -21,22 +24,54 @@ try:
 except ImportError:
     CONFIGURABLE_ENGINE_AVAILABLE = False
 
+from scoring_manifest import ScoringManifest, file_sha256, source_fingerprint
+from endpoint_io import EndpointFormatError, write_endpoint
+from endpoint_store import COLUMNAR_SUFFIX, endpoint_name_of, is_columnar, read_endpoint, save_endpoint
+
+# Import vectorized scoring engine
+try:
+    from columnar_scoring import ColumnarScoringEngine
+    COLUMNAR_ENGINE_AVAILABLE = True
+except ImportError:
+    COLUMNAR_ENGINE_AVAILABLE = False
+
+SCORING_VERSION = '1.0'
+
+# Endpoints scored by ConfigurableScoreCalculator when the configurable engine is enabled
+CONFIGURABLE_ALGORITHMS = {
+    'competitive-analysis': 'calculate_competitive_scores_configurable',
+    'demographic-insights': 'calculate_demographic_scores_configurable',
+    'risk-analysis': 'calculate_risk_scores_configurable'
+}
+
 class AutomatedScoreCalculator:
     """
     Automated score calculator that applies all existing scoring algorithms
     to generated endpoint JSON files
     """
     
-    def __init__(self, endpoints_dir: str = "generated_endpoints", project_path: str = None):
+    # Helpers shared by the per-record algorithms, part of every algorithm fingerprint
+    SHARED_HELPERS = ('_safe_float', '_calculate_shap_stats', '_normalize_shap_value',
+                      '_calculate_pearson_correlation', '_calculate_volatility', '_save_scored_endpoint')
+    
+    def __init__(self, endpoints_dir: str = "generated_endpoints", project_path: str = None,
+                 vectorized: bool = True, workers: int = 1, incremental: bool = True):
         """
         Initialize score calculator
         
         Args:
             endpoints_dir: Directory containing endpoint JSON files
             project_path: Path to project directory for configurable algorithms
+            vectorized: Score with the columnar engine where an algorithm has a vectorized version
+            workers: Worker processes for scoring endpoint files (1 = serial, 0 = one per CPU)
+            incremental: Skip endpoint files the scoring manifest shows are already scored
+                by the current algorithms and config (the manifest is updated either way)
         """
         self.endpoints_dir = Path(endpoints_dir)
         self.project_path = project_path
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.incremental = incremental
+        self._fingerprints = {}
         
         # Setup logging
         logging.basicConfig(level=logging.INFO)
@@ -105,10 +140,18 @@ class AutomatedScoreCalculator:
             'consensus-analysis': self.calculate_consensus_analysis_scores
         }
         
+        # Columnar engine produces the same results as the per-record methods above
+        self.columnar_engine = ColumnarScoringEngine(self) if COLUMNAR_ENGINE_AVAILABLE and vectorized else None
+        
     def apply_all_scoring_algorithms(self) -> Dict[str, Any]:
         """
         Apply scoring algorithms to all endpoint files
         
+        Endpoint files are independent, so with workers > 1 they are scored
+        across a process pool; the summary has the same structure either way.
+        In incremental mode, files recorded in the scoring manifest as already
+        scored by the current algorithm and config are left untouched.
+        
         Returns:
             Summary of scoring results
         """
@@ -122,60 +165,198 @@ class AutomatedScoreCalculator:
             'endpoints_processed': [],
             'scoring_results': {},
             'statistics': {},
-            'errors': []
+            'errors': [],
+            'endpoints_unchanged': []
         }
         
-        # Process each endpoint file
-        for endpoint_file in self.endpoints_dir.glob("*.json"):
-            if endpoint_file.name in ['all_endpoints.json', 'blob-urls.json']:
-                continue
-                
-            endpoint_name = endpoint_file.stem
-            self.logger.info(f"📊 Processing {endpoint_name}...")
-            
-            try:
-                # Load endpoint data
-                with open(endpoint_file, 'r', encoding='utf-8') as f:
-                    endpoint_data = json.load(f)
-                
-                if not isinstance(endpoint_data, dict) or 'results' not in endpoint_data:
-                    self.logger.warning(f"   ⚠️ Invalid format for {endpoint_name}")
-                    continue
-                
-                # Apply appropriate scoring algorithm
-                if endpoint_name in self.scoring_algorithms:
-                    scored_data = self.scoring_algorithms[endpoint_name](endpoint_data)
-                    
-                    # Save scored endpoint
-                    self._save_scored_endpoint(endpoint_file, scored_data)
-                    
-                    results['endpoints_processed'].append(endpoint_name)
-                    results['scoring_results'][endpoint_name] = {
-                        'records_processed': len(scored_data['results']),
-                        'scores_added': self._count_added_scores(endpoint_data['results'], scored_data['results']),
-                        'status': 'success'
-                    }
-                    
-                    self.logger.info(f"   ✅ {endpoint_name}: {len(scored_data['results'])} records scored")
-                else:
-                    self.logger.info(f"   ⚠️ No scoring algorithm for {endpoint_name}")
-                    
-            except Exception as e:
-                error_msg = f"Error processing {endpoint_name}: {str(e)}"
-                self.logger.error(f"   ❌ {error_msg}")
-                results['errors'].append({
-                    'endpoint': endpoint_name,
-                    'error': error_msg,
-                    'timestamp': datetime.now().isoformat()
-                })
+        manifest = ScoringManifest(self.endpoints_dir)
+        endpoint_files = self._find_endpoint_files()
+        
+        start_time = time.perf_counter()
+        workers = min(self.workers, len(endpoint_files))
+        if workers > 1:
+            self.logger.info(f"⚡ Scoring {len(endpoint_files)} endpoint files with {workers} worker processes")
+            outcomes = self._score_files_parallel(endpoint_files, workers, manifest)
+        else:
+            outcomes = [
+                self._score_endpoint_file(endpoint_file, manifest.get(endpoint_name_of(endpoint_file)))
+                for endpoint_file in endpoint_files
+            ]
+        
+        # Merge per-endpoint outcomes in file order
+        for outcome in outcomes:
+            endpoint_name = outcome['endpoint']
+            if outcome['status'] == 'success':
+                results['endpoints_processed'].append(endpoint_name)
+                results['scoring_results'][endpoint_name] = outcome['result']
+                manifest.record(endpoint_name, outcome['manifest_entry'])
+            elif outcome['status'] == 'unchanged':
+                results['endpoints_unchanged'].append(endpoint_name)
+            elif outcome['status'] == 'error':
+                results['errors'].append(outcome['error'])
+                manifest.forget(endpoint_name)
+        
+        manifest.save()
         
         # Generate statistics
         results['statistics'] = self._generate_scoring_statistics(results)
+        results['statistics']['endpoints_unchanged'] = len(results['endpoints_unchanged'])
+        results['statistics']['workers'] = max(1, workers)
+        results['statistics']['wall_time_seconds'] = round(time.perf_counter() - start_time, 3)
         
-        self.logger.info(f"🎉 Scoring completed: {len(results['endpoints_processed'])} endpoints processed")
+        self.logger.info(f"🎉 Scoring completed: {len(results['endpoints_processed'])} endpoints processed, "
+                         f"{len(results['endpoints_unchanged'])} unchanged")
         
         return results
     
+    def _find_endpoint_files(self) -> List[Path]:
+        """Endpoint files to score; an endpoint stored in both formats is scored in its columnar file"""
+        columnar_files = sorted(self.endpoints_dir.glob("*" + COLUMNAR_SUFFIX))
+        columnar_names = {endpoint_name_of(endpoint_file) for endpoint_file in columnar_files}
+        json_files = [
+            endpoint_file for endpoint_file in self.endpoints_dir.glob("*.json")
+            if endpoint_file.name not in ['all_endpoints.json', 'blob-urls.json']
+            and endpoint_file.stem not in columnar_names
+        ]
+        return json_files + columnar_files
+    
+    def _score_endpoint_file(self, endpoint_file: Path, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Load, score and save one endpoint file
+        
+        Args:
+            endpoint_file: Endpoint JSON or columnar file
+            previous: Manifest entry from the last successful scoring of this endpoint
+        
+        Returns:
+            Outcome with 'endpoint', 'status' (success, unchanged, skipped or error) and
+            either 'result' (a scoring_results entry) or 'error' (an errors entry).
+            Successful outcomes also carry 'manifest_entry'.
+        """
+        endpoint_name = endpoint_name_of(endpoint_file)
+        start_time = time.perf_counter()
+        
+        try:
+            fingerprint = self.scoring_fingerprint(endpoint_name)
+            if (self.incremental and previous and fingerprint is not None
+                    and previous.get('fingerprint') == fingerprint
+                    and previous.get('file_hash') == file_sha256(endpoint_file)):
+                self.logger.info(f"⏭️  {endpoint_name}: unchanged since last scoring")
+                return {'endpoint': endpoint_name, 'status': 'unchanged'}
+            
+            self.logger.info(f"📊 Processing {endpoint_name}...")
+            
+            # Load endpoint data (JSON is parsed incrementally, without reading the whole file text)
+            try:
+                endpoint_data = read_endpoint(endpoint_file)
+            except EndpointFormatError:
+                endpoint_data = None
+            
+            if endpoint_data is None or 'results' not in endpoint_data:
+                self.logger.warning(f"   ⚠️ Invalid format for {endpoint_name}")
+                return {'endpoint': endpoint_name, 'status': 'skipped'}
+            
+            # Apply appropriate scoring algorithm
+            if endpoint_name not in self.scoring_algorithms:
+                self.logger.info(f"   ⚠️ No scoring algorithm for {endpoint_name}")
+                return {'endpoint': endpoint_name, 'status': 'skipped'}
+            
+            scored_data = self.score_endpoint(endpoint_name, endpoint_data)
+            
+            # Save scored endpoint
+            self._save_scored_endpoint(endpoint_file, scored_data)
+            
+            wall_time = time.perf_counter() - start_time
+            self.logger.info(f"   ✅ {endpoint_name}: {len(scored_data['results'])} records scored in {wall_time:.2f}s")
+            
+            outcome = {
+                'endpoint': endpoint_name,
+                'status': 'success',
+                'result': {
+                    'records_processed': len(scored_data['results']),
+                    'scores_added': self._count_added_scores(endpoint_data['results'], scored_data['results']),
+                    'status': 'success',
+                    'wall_time_seconds': round(wall_time, 3)
+                }
+            }
+            outcome['manifest_entry'] = {
+                'file_hash': file_sha256(endpoint_file),
+                'fingerprint': fingerprint,
+                'scored_timestamp': scored_data['scoring_metadata']['scored_timestamp'],
+                'records_processed': len(scored_data['results'])
+            }
+            return outcome
+            
+        except Exception as e:
+            return self._error_outcome(endpoint_name, e, time.perf_counter() - start_time)
+    
+    def _score_files_parallel(self, endpoint_files: List[Path], workers: int,
+                              manifest: ScoringManifest) -> List[Dict[str, Any]]:
+        """Score endpoint files across a process pool, returning outcomes in file order"""
+        outcomes = []
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_scoring_worker,
+            initargs=(str(self.endpoints_dir), self.project_path, self.columnar_engine is not None, self.incremental)
+        ) as executor:
+            futures = [
+                (endpoint_file, executor.submit(_score_file_in_worker, endpoint_file,
+                                                manifest.get(endpoint_name_of(endpoint_file))))
+                for endpoint_file in endpoint_files
+            ]
+            for endpoint_file, future in futures:
+                try:
+                    outcomes.append(future.result())
+                except Exception as e:
+                    # The worker itself failed (e.g. killed), not the scoring code
+                    outcomes.append(self._error_outcome(endpoint_name_of(endpoint_file), e, None))
+        return outcomes
+    
+    def _error_outcome(self, endpoint_name: str, error: Exception, wall_time: Optional[float]) -> Dict[str, Any]:
+        error_msg = f"Error processing {endpoint_name}: {str(error)}"
+        self.logger.error(f"   ❌ {error_msg}")
+        return {
+            'endpoint': endpoint_name,
+            'status': 'error',
+            'error': {
+                'endpoint': endpoint_name,
+                'error': error_msg,
+                'timestamp': datetime.now().isoformat(),
+                'wall_time_seconds': round(wall_time, 3) if wall_time is not None else None
+            }
+        }
+    
+    def scoring_fingerprint(self, endpoint_name: str) -> Optional[str]:
+        """
+        Fingerprint of the code (and configurable-engine config) that scores an endpoint
+        
+        Only the algorithm that actually runs for the endpoint contributes, so
+        editing one algorithm or the semantic/project config only invalidates
+        the endpoints that depend on it.
+        """
+        if endpoint_name not in self.scoring_algorithms:
+            return None
+        if endpoint_name in self._fingerprints:
+            return self._fingerprints[endpoint_name]
+        
+        parts = [SCORING_VERSION] + [getattr(self, helper) for helper in self.SHARED_HELPERS]
+        if self.columnar_engine is not None and self.columnar_engine.supports(endpoint_name):
+            parts.extend(self.columnar_engine.fingerprint_sources(endpoint_name))
+        elif self.use_configurable_algorithms and endpoint_name in CONFIGURABLE_ALGORITHMS:
+            parts.append(getattr(self.configurable_calculator, CONFIGURABLE_ALGORITHMS[endpoint_name]))
+            parts.extend(self.configurable_calculator.engine.fingerprint_sources())
+        else:
+            parts.append(self.scoring_algorithms[endpoint_name])
+        
+        fingerprint = self._fingerprints[endpoint_name] = source_fingerprint(*parts)
+        return fingerprint
+    
+    def score_endpoint(self, endpoint_name: str, endpoint_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Score one endpoint, using the columnar engine when it supports the algorithm"""
+        if self.columnar_engine is not None and self.columnar_engine.supports(endpoint_name):
+            return self.columnar_engine.score(endpoint_name, endpoint_data)
+        return self.scoring_algorithms[endpoint_name](endpoint_data)
+    
     def calculate_strategic_value_scores(self, endpoint_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Calculate strategic value scores using the documented formula
@@ -1301,13 +1482,18 @@ class AutomatedScoreCalculator:
         # Add scoring metadata
         scored_data['scoring_metadata'] = {
             'scored_timestamp': datetime.now().isoformat(),
-            'scoring_version': '1.0',
+            'scoring_version': SCORING_VERSION,
             'original_record_count': len(scored_data['results'])
         }
         
-        # Write back to file
-        with open(original_file, 'w', encoding='utf-8') as f:
-            json.dump(scored_data, f, indent=2, default=str)
+        # Write back in the file's own format (JSON records are streamed with compact separators)
+        save_endpoint(original_file, scored_data)
+        
+        # Keep a JSON copy published next to a columnar endpoint in step with it
+        if is_columnar(original_file):
+            published_file = original_file.with_name(f"{endpoint_name_of(original_file)}.json")
+            if published_file.exists():
+                write_endpoint(published_file, scored_data)
     
     def _count_added_scores(self, original_results: List[Dict], scored_results: List[Dict]) -> int:
         """Count how many new score fields were added"""
@@ -1564,12 +1750,37 @@ class AutomatedScoreCalculator:
         endpoint_data_copy['results'] = results
         return endpoint_data_copy
 
+# Calculator owned by each scoring worker process (see _score_files_parallel)
+_worker_calculator = None
+
+
+def _init_scoring_worker(endpoints_dir: str, project_path: Optional[str], vectorized: bool, incremental: bool) -> None:
+    global _worker_calculator
+    _worker_calculator = AutomatedScoreCalculator(endpoints_dir, project_path, vectorized=vectorized,
+                                                  incremental=incremental)
+
+
+def _score_file_in_worker(endpoint_file: Path, previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return _worker_calculator._score_endpoint_file(endpoint_file, previous)
+
+
 def main():
     """Main function for command-line usage"""
-    import sys
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Apply scoring algorithms to generated endpoint files")
+    parser.add_argument("endpoints_dir", nargs="?", default="generated_endpoints",
+                        help="Directory containing endpoint JSON files")
+    parser.add_argument("output_file", nargs="?", default="scoring_results.json",
+                        help="Where to write the scoring summary")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes for scoring endpoint files (0 = one per CPU)")
+    parser.add_argument("--full", action="store_true",
+                        help="Rescore every endpoint, ignoring the scoring manifest")
+    args = parser.parse_args()
     
-    endpoints_dir = sys.argv[1] if len(sys.argv) > 1 else "generated_endpoints"
-    output_file = sys.argv[2] if len(sys.argv) > 2 else "scoring_results.json"
+    endpoints_dir = args.endpoints_dir
+    output_file = args.output_file
     
     print(f"🧮 Starting automated score calculation...")
     print(f"📂 Endpoints directory: {endpoints_dir}")
@@ -1577,7 +1788,7 @@ def main():
     print("=" * 60)
     
     # Create calculator and run
-    calculator = AutomatedScoreCalculator(endpoints_dir)
+    calculator = AutomatedScoreCalculator(endpoints_dir, workers=args.workers, incremental=not args.full)
     results = calculator.apply_all_scoring_algorithms()
     
     # Save results
@@ -1587,11 +1798,12 @@ def main():
     # Print summary
     stats = results['statistics']
     print(f"\n✅ Scoring completed!")
-    print(f"📊 {stats['total_endpoints_processed']} endpoints processed")
+    print(f"📊 {stats['total_endpoints_processed']} endpoints processed, {stats['endpoints_unchanged']} unchanged")
     print(f"📈 {stats['total_records_scored']:,} records scored")
     print(f"🎯 {stats['total_score_fields_added']} score fields added")
     print(f"⚡ {stats['average_scores_per_endpoint']:.1f} avg scores per endpoint")
     print(f"✅ {stats['success_rate']:.1%} success rate")
+    print(f"⏱️ {stats['wall_time_seconds']:.1f}s with {stats['workers']} worker(s)")
     
     if results['errors']:
         print(f"\n⚠️ {len(results['errors'])} errors occurred:")
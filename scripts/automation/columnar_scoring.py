@@ -0,0 +1,805 @@
+#!/usr/bin/env python3
+"""
+Columnar Scoring Engine - Vectorized versions of the AutomatedScoreCalculator algorithms
+Part of the ArcGIS to Microservice Automation Pipeline
+
+Each endpoint's records are loaded into float64 columns once, every algorithm is
+evaluated as array formulas, and the score fields are written back in one pass.
+Results are identical to the per-record methods in automated_score_calculator.py,
+including their `_safe_float` conversion, `round()` behaviour and the places where
+Python's min()/max() hand back the integer bound instead of a float.
+"""
+
+from typing import Dict, List, Any, Tuple, Optional
+
+import numpy as np
+
+# Endpoints whose per-record method is replaced by the configurable engine when enabled
+CONFIGURABLE_OVERRIDES = {'competitive-analysis', 'demographic-insights', 'risk-analysis'}
+
+COMPETITOR_BRANDS = [
+    'MP30029A_B_P', 'MP30032A_B_P', 'MP30031A_B_P', 'MP30035A_B_P',
+    'MP30033A_B_P', 'MP30030A_B_P', 'MP30037A_B_P', 'MP30036A_B_P'
+]
+
+# (stats key, SHAP field, weight) for the competitive demographic advantage
+COMPETITIVE_SHAP_FIELDS = [
+    ('asian', 'shap_ASIAN_CY_P', 0.30),
+    ('millennial', 'shap_MILLENN_CY', 0.25),
+    ('genZ', 'shap_GENZ_CY', 0.20),
+    ('household', 'shap_HHPOP_CY', 0.15),
+    ('nike', 'shap_MP30034A_B_P', 0.10),
+]
+
+# (field, lower case fallback, weight) for the analyze endpoint
+ANALYZE_COMPONENTS = [
+    ('MP10104A_B_P', 'mp10104a_b_p', 0.242),
+    ('GENALPHACY_P', 'genalphacy_p', 0.203),
+    ('MP10116A_B_P', 'mp10116a_b_p', 0.191),
+    ('MP10120A_B_P', 'mp10120a_b_p', 0.183),
+    ('X14058_X_A', 'x14058_x_a', 0.181),
+]
+
+CLUSTER_LABELS = ['Low Performance', 'Below Average', 'Average', 'Above Average', 'High Performance']
+CLUSTER_SCORES = [20, 40, 60, 80, 100]
+
+NUMERIC_TYPES = {int, float, bool, type(None)}
+
+
+def safe_float(value: Any) -> float:
+    """Same conversion as AutomatedScoreCalculator._safe_float"""
+    try:
+        if value is None:
+            return 0.0
+        return float(value)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def py_min(a, b):
+    """Element-wise Python min(a, b): keeps `a` unless `b < a` (so NaN handling matches)"""
+    return np.where(b < a, b, a)
+
+
+def py_max(a, b):
+    """Element-wise Python max(a, b): keeps `a` unless `b > a`"""
+    return np.where(b > a, b, a)
+
+
+class RecordColumns:
+    """Typed column views over a list of endpoint records, converted once and cached"""
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        self.records = records
+        self.size = len(records)
+        self._floats = {}
+        self._prefix_stats = {}
+
+    def raw(self, key: str, default: Any = 0, fallback: Optional[str] = None) -> List[Any]:
+        """Raw values as record.get(key, default), or record.get(key, record.get(fallback, default))"""
+        if fallback is None:
+            return [record.get(key, default) for record in self.records]
+        return [record.get(key, record.get(fallback, default)) for record in self.records]
+
+    def floats(self, key: str, default: Any = 0, fallback: Optional[str] = None) -> np.ndarray:
+        """Column converted with _safe_float semantics"""
+        cache_key = (key, default, fallback)
+        column = self._floats.get(cache_key)
+        if column is None:
+            column = self._floats[cache_key] = self._to_float_array(self.raw(key, default, fallback))
+        return column
+
+    def positive_raw(self, key: str) -> np.ndarray:
+        """Mask of record.get(key, 0) > 0 on the raw values (raises like the original filters)"""
+        return np.fromiter((value > 0 for value in self.raw(key)), dtype=bool, count=self.size)
+
+    def prefix_abs_stats(self, prefix: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-record sum and count of abs() over numeric fields whose name starts with prefix"""
+        stats = self._prefix_stats.get(prefix)
+        if stats is None:
+            sums = np.empty(self.size)
+            counts = np.empty(self.size, dtype=np.int64)
+            for i, record in enumerate(self.records):
+                values = [abs(float(value)) for key, value in record.items()
+                          if key.startswith(prefix) and isinstance(value, (int, float))]
+                sums[i] = sum(values)
+                counts[i] = len(values)
+            stats = self._prefix_stats[prefix] = (sums, counts)
+        return stats
+
+    def _to_float_array(self, values: List[Any]) -> np.ndarray:
+        if set(map(type, values)) <= NUMERIC_TYPES:
+            column = np.array(values, dtype=np.float64)
+            # None became NaN; genuine NaN inputs stay NaN
+            for i in np.flatnonzero(np.isnan(column)):
+                column[i] = safe_float(values[i])
+            return column
+        return np.fromiter((safe_float(value) for value in values), dtype=np.float64, count=len(values))
+
+
+def rounded(values, size: int, int_mask=None, ndigits: int = 2, numpy_round: bool = False) -> List[Any]:
+    """
+    Round a score column the way the per-record code does.
+
+    Positions in int_mask are where the original expression evaluates to an int
+    (e.g. min(x, 100) returning the bound), which round() leaves as an int.
+    numpy_round matches round() on NumPy float64 scalars.
+    """
+    values = np.broadcast_to(np.asarray(values, dtype=np.float64), (size,))
+    if numpy_round:
+        column = np.round(values, ndigits).tolist()
+    else:
+        column = [round(value, ndigits) for value in values.tolist()]
+    if int_mask is not None:
+        for i in np.flatnonzero(np.broadcast_to(int_mask, (size,))):
+            column[i] = int(values[i])
+    return column
+
+
+def merge_columns(records: List[Dict[str, Any]], columns: Dict[str, List[Any]],
+                  details: Optional[Dict[str, List[Any]]] = None, detail_mask=None) -> List[Dict[str, Any]]:
+    """Copy each record and add the score columns, plus detail columns where detail_mask is set"""
+    names = list(columns)
+    results = []
+    for record, row in zip(records, zip(*(columns[name] for name in names))):
+        record_copy = record.copy()
+        record_copy.update(zip(names, row))
+        results.append(record_copy)
+
+    if details:
+        detail_names = list(details)
+        for i in np.flatnonzero(detail_mask):
+            results[i].update((name, details[name][i]) for name in detail_names)
+    return results
+
+
+class ColumnarScoringEngine:
+    """
+    Vectorized scoring for AutomatedScoreCalculator.
+
+    Endpoints without a columnar implementation (algorithm-comparison and
+    consensus-analysis, which scan arbitrary prediction fields per record)
+    and endpoints delegated to the configurable engine keep using the
+    calculator's per-record methods.
+    """
+
+    def __init__(self, calculator):
+        self.calculator = calculator
+        self.algorithms = {
+            'analyze': self._analyze,
+            'strategic-analysis': self._strategic_value,
+            'competitive-analysis': self._competitive,
+            'demographic-insights': self._demographic,
+            'comparative-analysis': self._comparative,
+            'correlation-analysis': self._correlation,
+            'spatial-clusters': self._cluster,
+            'anomaly-detection': self._anomaly,
+            'outlier-detection': self._outlier,
+            'predictive-modeling': self._predictive,
+            'trend-analysis': self._trend,
+            'feature-interactions': self._feature_interaction,
+            'feature-importance-ranking': self._feature_importance,
+            'scenario-analysis': self._scenario,
+            'segment-profiling': self._segment,
+            'brand-difference': self._brand_difference,
+            'risk-analysis': self._risk,
+            'market-sizing': self._market_sizing,
+            'housing-correlation': self._housing_correlation,
+            'ensemble-analysis': self._ensemble_analysis,
+            'cluster-analysis': self._cluster_analysis,
+            'anomaly-insights': self._anomaly_insights,
+            'model-selection': self._model_selection,
+            'dimensionality-insights': self._dimensionality_insights,
+        }
+
+    def supports(self, endpoint_name: str) -> bool:
+        if endpoint_name not in self.algorithms:
+            return False
+        return not (endpoint_name in CONFIGURABLE_OVERRIDES and self.calculator.use_configurable_algorithms)
+
+    def score(self, endpoint_name: str, endpoint_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Score one endpoint; returns a copy of endpoint_data with scored results"""
+        records = endpoint_data['results']
+        endpoint_data_copy = endpoint_data.copy()
+        if not records:
+            endpoint_data_copy['results'] = []
+            return endpoint_data_copy
+
+        cols = RecordColumns(records)
+        with np.errstate(all='ignore'):
+            columns, details, detail_mask = self.algorithms[endpoint_name](cols)
+        endpoint_data_copy['results'] = merge_columns(records, columns, details, detail_mask)
+        return endpoint_data_copy
+
+    def fingerprint_sources(self, endpoint_name: str) -> List[Any]:
+        """Code and constants that determine one endpoint's scores (see AutomatedScoreCalculator.scoring_fingerprint)"""
+        return [
+            self.algorithms[endpoint_name], ColumnarScoringEngine.score, RecordColumns,
+            safe_float, py_min, py_max, rounded, merge_columns,
+            COMPETITOR_BRANDS, COMPETITIVE_SHAP_FIELDS, ANALYZE_COMPONENTS, CLUSTER_LABELS, CLUSTER_SCORES
+        ]
+
+    # Standard endpoints
+
+    def _strategic_value(self, cols: RecordColumns):
+        n = cols.size
+        competitive_score = cols.floats('competitive_advantage_score')
+        demographic_score = cols.floats('demographic_opportunity_score')
+        correlation_score = cols.floats('correlation_strength_score')
+        cluster_score = cols.floats('cluster_performance_score')
+        target_value = cols.floats('target_value')
+        median_income = cols.floats('median_income')
+        total_population = cols.floats('total_population')
+        nike_share = cols.floats('mp30034a_b_p')
+
+        market_gap = py_max(0, 100 - nike_share)
+        market_opportunity = (0.60 * demographic_score) + (0.40 * market_gap)
+
+        brand_positioning = py_min((nike_share / 50) * 100, 100)
+        competitive_position = (0.67 * competitive_score) + (0.33 * brand_positioning)
+
+        cluster_consistency = np.where(
+            cluster_score > 0, cluster_score,
+            np.where(target_value > 0, py_min((target_value / 50) * 100, 100), 50))
+        data_reliability = (0.75 * correlation_score) + (0.25 * cluster_consistency)
+
+        population_scale = py_min((total_population / 10000) * 100, 100)
+        economic_scale = py_min((median_income / 100000) * 100, 100)
+        market_scale = (0.60 * population_scale) + (0.40 * economic_scale)
+
+        strategic_value_score = (
+            0.35 * market_opportunity +
+            0.30 * competitive_position +
+            0.20 * data_reliability +
+            0.15 * market_scale
+        )
+
+        return {
+            'strategic_value_score': rounded(strategic_value_score, n),
+            'market_opportunity': rounded(market_opportunity, n),
+            'competitive_position': rounded(competitive_position, n),
+            'data_reliability': rounded(data_reliability, n),
+            'market_scale': rounded(market_scale, n)
+        }, None, None
+
+    def _competitive(self, cols: RecordColumns):
+        n = cols.size
+        nike_share = cols.floats('value_MP30034A_B_P')
+
+        total_competitor_share = np.zeros(n)
+        for brand in COMPETITOR_BRANDS:
+            total_competitor_share = total_competitor_share + cols.floats(f'value_{brand}')
+
+        has_competitors = total_competitor_share > 0
+        dominance_ratio = (nike_share / total_competitor_share) * 50
+        market_dominance = np.where(has_competitors, py_min(dominance_ratio, 100), nike_share * 2)
+        market_dominance_int = has_competitors & (100 < dominance_ratio)
+
+        # Min-max normalization, as in _calculate_shap_stats/_normalize_shap_value
+        normalized = {}
+        for stats_key, field, _ in COMPETITIVE_SHAP_FIELDS:
+            values = cols.floats(field)
+            value_list = values.tolist()
+            value_min = min(value_list)
+            value_range = max(value_list) - value_min
+            if value_range == 0:
+                normalized[stats_key] = np.full(n, 50.0)
+            else:
+                scaled = ((values - value_min) / value_range) * 100
+                normalized[stats_key] = py_max(0, py_min(100, scaled))
+
+        demographic_advantage = (
+            0.30 * normalized['asian'] +
+            0.25 * normalized['millennial'] +
+            0.20 * normalized['genZ'] +
+            0.15 * normalized['household'] +
+            0.10 * normalized['nike']
+        )
+
+        median_income = cols.floats('median_income')
+        wealth_index = cols.floats('value_WLTHINDXCY', 100)
+        economic_raw = (median_income / 100000) * 50 + (wealth_index / 200) * 50
+        economic_advantage = py_min(economic_raw, 100)
+
+        total_population = cols.floats('total_population')
+        population_raw = (total_population / 20000) * 100
+        population_advantage = py_min(population_raw, 100)
+
+        competitive_advantage_score = (
+            0.35 * market_dominance +
+            0.35 * demographic_advantage +
+            0.20 * economic_advantage +
+            0.10 * population_advantage
+        )
+
+        return {
+            'competitive_advantage_score': rounded(competitive_advantage_score, n),
+            'market_dominance': rounded(market_dominance, n, market_dominance_int),
+            'demographic_advantage': rounded(demographic_advantage, n),
+            'economic_advantage': rounded(economic_advantage, n, 100 < economic_raw),
+            'population_advantage': rounded(population_advantage, n, 100 < population_raw)
+        }, None, None
+
+    def _demographic(self, cols: RecordColumns):
+        n = cols.size
+        total_population = cols.floats('total_population')
+        asian_population = cols.floats('asian_population')
+        black_population = cols.floats('black_population')
+        median_income = cols.floats('median_income')
+        median_age = cols.floats('median_age')
+        household_size = cols.floats('household_size')
+
+        diversity_score = np.where(total_population > 0, (
+            (asian_population / total_population) * 30 +
+            (black_population / total_population) * 20 +
+            py_min(median_income / 75000, 1) * 25 +
+            py_max(0, 1 - np.abs(median_age - 35) / 20) * 15 +
+            py_min(household_size / 3, 1) * 10
+        ) * 100, 0)
+
+        population_bonus = py_min(total_population / 10000, 1) * 20
+        combined = diversity_score + population_bonus
+
+        return {
+            'demographic_opportunity_score': rounded(py_min(combined, 100), n, 100 < combined)
+        }, None, None
+
+    def _comparative(self, cols: RecordColumns):
+        n = cols.size
+        target_value = cols.floats('target_value')
+        valid = target_value > 0
+        values_sorted = np.sort(target_value[valid])
+
+        if not values_sorted.size:
+            return {'comparative_score': [50.0] * n}, None, None
+
+        ranks = np.searchsorted(values_sorted, target_value, side='right')
+        percentile = np.where(valid, (ranks / values_sorted.size) * 100, 0)
+        return {'comparative_score': rounded(percentile, n, ~valid)}, None, None
+
+    def _correlation(self, cols: RecordColumns):
+        n = cols.size
+        target_value = cols.floats('target_value')
+        valid = target_value > 0
+
+        if np.count_nonzero(valid) < 3:
+            scaled = target_value / 2
+            score = np.where(valid, py_min(scaled, 100), 0.0)
+            return {'correlation_strength_score': rounded(score, n, valid & (100 < scaled))}, None, None
+
+        target_values = target_value[valid].tolist()
+        income_correlation = self.calculator._calculate_pearson_correlation(
+            target_values, cols.floats('median_income')[valid].tolist())
+        population_correlation = self.calculator._calculate_pearson_correlation(
+            target_values, cols.floats('total_population')[valid].tolist())
+
+        income_factor = min(abs(income_correlation) * 40, 40) if income_correlation is not None else 0
+        pop_factor = min(abs(population_correlation) * 30, 30) if population_correlation is not None else 0
+
+        shap_sums, shap_counts = cols.prefix_abs_stats('shap_')
+        has_shap = shap_counts > 0
+        shap_raw = (shap_sums / shap_counts) * 30
+        shap_factor = np.where(has_shap, py_min(shap_raw, 30), 0)
+        shap_int = ~has_shap | (30 < shap_raw)
+
+        score = np.where(target_value <= 0, 0.0, income_factor + pop_factor + shap_factor)
+        factors_int = isinstance(income_factor, int) and isinstance(pop_factor, int)
+        score_int = ~(target_value <= 0) & shap_int & factors_int
+        return {'correlation_strength_score': rounded(score, n, score_int)}, None, None
+
+    def _cluster(self, cols: RecordColumns):
+        n = cols.size
+        target_value = cols.floats('target_value')
+        valid = target_value[target_value > 0]
+
+        if not valid.size:
+            n_clusters = min(5, n)
+            cluster_ids = [i % n_clusters for i in range(n)]
+            return {
+                'cluster_id': cluster_ids,
+                'cluster_performance_score': [50.0] * n,
+                'cluster_label': [f'Cluster {cluster_id + 1}' for cluster_id in cluster_ids]
+            }, None, None
+
+        percentiles = np.percentile(valid, [20, 40, 60, 80])
+        cluster_ids = np.select(
+            [target_value <= percentiles[0], target_value <= percentiles[1],
+             target_value <= percentiles[2], target_value <= percentiles[3]],
+            [0, 1, 2, 3], 4).tolist()
+        return {
+            'cluster_id': cluster_ids,
+            'cluster_performance_score': [CLUSTER_SCORES[cluster_id] for cluster_id in cluster_ids],
+            'cluster_label': [CLUSTER_LABELS[cluster_id] for cluster_id in cluster_ids]
+        }, None, None
+
+    def _anomaly(self, cols: RecordColumns):
+        n = cols.size
+        target_value = cols.floats('target_value')
+        valid_values = target_value[target_value > 0]
+
+        if valid_values.size <= 1:
+            return {'anomaly_detection_score': [0.0] * n}, None, None
+
+        mean_val = np.mean(valid_values)
+        std_val = np.std(valid_values)
+        scored = (target_value > 0) & (std_val > 0)
+        scaled = np.abs((target_value - mean_val) / std_val) * 33.33
+        score = np.where(scored, py_min(scaled, 100), 0)
+        score_int = ~scored | (100 < scaled)
+        return {'anomaly_detection_score': rounded(score, n, score_int, numpy_round=True)}, None, None
+
+    def _outlier(self, cols: RecordColumns):
+        n = cols.size
+        target_value = cols.floats('target_value')
+        valid_values = target_value[target_value > 0]
+
+        if valid_values.size < 4:
+            return {'outlier_detection_score': [0.0] * n}, None, None
+
+        q1, q3 = np.percentile(valid_values, [25, 75])
+        iqr = q3 - q1
+        lower_bound = q1 - 1.5 * iqr
+        upper_bound = q3 + 1.5 * iqr
+
+        outside = (target_value > 0) & ((target_value < lower_bound) | (target_value > upper_bound))
+        distance = py_min(np.abs(target_value - lower_bound), np.abs(target_value - upper_bound))
+        scaled = (distance / iqr) * 50
+        score = np.where(outside, py_min(scaled, 100), 0)
+        score_int = ~outside | (100 < scaled)
+        return {'outlier_detection_score': rounded(score, n, score_int, numpy_round=True)}, None, None
+
+    def _predictive(self, cols: RecordColumns):
+        n = cols.size
+        target_value = cols.floats('target_value')
+        demographic_score = cols.floats('demographic_opportunity_score')
+        competitive_score = cols.floats('competitive_advantage_score')
+
+        weighted = (demographic_score > 0) | (competitive_score > 0)
+        capped_target = py_min(target_value, 100)
+        score = np.where(weighted, (
+            0.40 * demographic_score +
+            0.35 * competitive_score +
+            0.25 * capped_target
+        ), capped_target)
+        return {'predictive_modeling_score': rounded(score, n, ~weighted & (100 < target_value))}, None, None
+
+    def _trend(self, cols: RecordColumns):
+        n = cols.size
+        positive = cols.positive_raw('target_value')
+        target_value = cols.floats('target_value')
+
+        if not positive.any():
+            return {'trend_strength_score': [50.0] * n}, None, None
+
+        target_values = target_value[positive].tolist()
+        mean_value = sum(target_values) / len(target_values)
+        sorted_values = sorted(target_values)
+        median_value = sorted_values[len(sorted_values) // 2]
+        q1_value = sorted_values[len(sorted_values) // 4]
+        q3_value = sorted_values[3 * len(sorted_values) // 4]
+
+        if median_value > 0:
+            median_raw = (target_value / median_value) * 40
+            median_factor, median_int = py_min(median_raw, 40), 40 < median_raw
+        else:
+            median_factor, median_int = 20, True
+
+        quartile_factor = np.select(
+            [target_value >= q3_value, target_value >= median_value, target_value >= q1_value],
+            [35, 25, 15], 5)
+
+        if mean_value > 0:
+            mean_raw = (target_value / mean_value) * 25
+            mean_factor, mean_int = py_min(mean_raw, 25), 25 < mean_raw
+        else:
+            mean_factor, mean_int = 12.5, False
+
+        combined = median_factor + quartile_factor + mean_factor
+        not_scored = target_value <= 0
+        score = np.where(not_scored, 0.0, py_min(combined, 100))
+        score_int = ~not_scored & ((100 < combined) | (median_int & mean_int))
+        return {'trend_strength_score': rounded(score, n, score_int)}, None, None
+
+    def _feature_interaction(self, cols: RecordColumns):
+        n = cols.size
+        total_population = cols.floats('total_population')
+        median_income = cols.floats('median_income')
+
+        scored = (total_population > 0) & (median_income > 0)
+        raw = (total_population / 10000) * (median_income / 75000) * 100
+        score = np.where(scored, py_min(raw, 100), 0)
+        return {'feature_interaction_score': rounded(score, n, ~scored | (100 < raw))}, None, None
+
+    def _feature_importance(self, cols: RecordColumns):
+        n = cols.size
+        shap_sums, shap_counts = cols.prefix_abs_stats('shap_')
+        has_shap = shap_counts > 0
+        raw = (shap_sums / shap_counts) * 10
+        score = np.where(has_shap, py_min(raw, 100), 50)
+        return {'feature_importance_score': rounded(score, n, ~has_shap | (100 < raw))}, None, None
+
+    def _scenario(self, cols: RecordColumns):
+        n = cols.size
+        positive = cols.positive_raw('target_value')
+        target_value = cols.floats('target_value')
+
+        if not positive.any():
+            return {'scenario_analysis_score': [50.0] * n}, None, None
+
+        target_values = target_value[positive].tolist()
+        volatility = self.calculator._calculate_volatility(target_values) if len(target_values) > 1 else 0
+
+        median_income = cols.floats('median_income')
+        total_population = cols.floats('total_population')
+
+        base_performance = py_min(target_value, 100)
+        base_int = 100 < target_value
+
+        economic_stability = np.where(median_income > 0, 1.0 * py_min(median_income / 75000, 1.5), 1.0)
+        market_size_factor = np.where(total_population > 0, py_min(total_population / 50000, 1.2), 1.0)
+        stability_factor = max(0.5, 1 - (volatility / 100))
+
+        optimistic_multiplier = 1.0 + (0.3 * economic_stability * stability_factor)
+        pessimistic_multiplier = py_max(0.3, 1.0 - (0.4 * volatility / 100) - (0.2 / market_size_factor))
+
+        optimistic_raw = base_performance * optimistic_multiplier
+        optimistic_score = py_min(optimistic_raw, 100)
+        realistic_score = base_performance
+        pessimistic_score = base_performance * pessimistic_multiplier
+
+        if volatility < 20:
+            scenario_weights = (0.20, 0.60, 0.20)
+        elif volatility < 50:
+            scenario_weights = (0.25, 0.50, 0.25)
+        else:
+            scenario_weights = (0.30, 0.40, 0.30)
+
+        score = np.where(target_value <= 0, 0.0, (
+            scenario_weights[0] * optimistic_score +
+            scenario_weights[1] * realistic_score +
+            scenario_weights[2] * pessimistic_score
+        ))
+
+        details = {
+            'scenario_optimistic': rounded(optimistic_score, n, 100 < optimistic_raw),
+            'scenario_realistic': rounded(realistic_score, n, base_int),
+            'scenario_pessimistic': rounded(pessimistic_score, n),
+            'market_volatility': [round(volatility, 2)] * n,
+            'economic_stability': rounded(economic_stability, n)
+        }
+        return {'scenario_analysis_score': rounded(score, n)}, details, target_value > 0
+
+    def _segment(self, cols: RecordColumns):
+        n = cols.size
+        total_population = cols.floats('total_population')
+        median_income = cols.floats('median_income')
+        median_age = cols.floats('median_age')
+
+        age_score = np.where(median_age > 0, py_max(0, 100 - np.abs(median_age - 35) * 2), 50)
+        income_score = np.where(median_income > 0, py_min(median_income / 100000 * 100, 100), 50)
+        pop_score = np.where(total_population > 0, py_min(total_population / 20000 * 100, 100), 50)
+
+        score = (age_score + income_score + pop_score) / 3
+        return {'segment_profiling_score': rounded(score, n)}, None, None
+
+    def _brand_difference(self, cols: RecordColumns):
+        n = cols.size
+        nike_share = cols.floats('value_MP30034A_B_P')
+        adidas_share = cols.floats('value_MP30029A_B_P')
+
+        scored = nike_share + adidas_share > 0
+        score = np.where(scored, ((nike_share - adidas_share) / (nike_share + adidas_share)) * 100, 0)
+        return {'brand_difference_score': rounded(score, n, ~scored)}, None, None
+
+    def _risk(self, cols: RecordColumns):
+        n = cols.size
+        positive = cols.positive_raw('target_value')
+        target_value = cols.floats('target_value')
+
+        if not positive.any():
+            return {'risk_adjusted_score': [50.0] * n}, None, None
+
+        target_values = target_value[positive].tolist()
+        market_volatility = self.calculator._calculate_volatility(target_values)
+        mean_target = sum(target_values) / len(target_values)
+
+        median_income = cols.floats('median_income')
+        total_population = cols.floats('total_population')
+
+        base_value = py_min(target_value, 100)
+        base_int = 100 < target_value
+
+        volatility_penalty = min(market_volatility * 0.2, 20)
+
+        if mean_target > 0:
+            deviation_raw = (np.abs(target_value - mean_target) / mean_target) * 15
+            uncertainty_penalty, uncertainty_int = py_min(deviation_raw, 15), 15 < deviation_raw
+        else:
+            uncertainty_penalty, uncertainty_int = np.zeros(n), np.ones(n, dtype=bool)
+
+        # Bonuses that apply are added in order; the total stays an int only if each one is
+        has_economic = median_income > 75000
+        economic_raw = (median_income - 75000) / 25000 * 10
+        has_size = total_population > 50000
+        size_raw = (total_population - 50000) / 50000 * 5
+        shap_sums, shap_counts = cols.prefix_abs_stats('shap_')
+        has_shap = shap_counts > 0
+        shap_raw = (shap_sums / shap_counts) * 5
+
+        stability_bonus = np.zeros(n)
+        stability_bonus = stability_bonus + np.where(has_economic, py_min(economic_raw, 10), 0.0)
+        stability_bonus = stability_bonus + np.where(has_size, py_min(size_raw, 5), 0.0)
+        stability_bonus = stability_bonus + np.where(has_shap, py_min(shap_raw, 5), 0.0)
+        bonus_int = ((~has_economic | (10 < economic_raw)) &
+                     (~has_size | (5 < size_raw)) &
+                     (~has_shap | (5 < shap_raw)))
+
+        raw_score = base_value - volatility_penalty - uncertainty_penalty + stability_bonus
+        raw_int = base_int & isinstance(volatility_penalty, int) & uncertainty_int & bonus_int
+        capped = py_min(100, raw_score)
+        clamped = py_max(0, capped)
+        clamped_int = ~(raw_score < 100) | ~(capped > 0) | raw_int
+
+        not_scored = target_value <= 0
+        score = np.where(not_scored, 0.0, clamped)
+
+        details = {
+            'market_volatility': [round(market_volatility, 2)] * n,
+            'volatility_penalty': [round(volatility_penalty, 2)] * n,
+            'uncertainty_penalty': rounded(uncertainty_penalty, n, uncertainty_int),
+            'stability_bonus': rounded(stability_bonus, n, bonus_int)
+        }
+        return {'risk_adjusted_score': rounded(score, n, ~not_scored & clamped_int)}, details, target_value > 0
+
+    def _market_sizing(self, cols: RecordColumns):
+        n = cols.size
+        total_population = cols.floats('total_population')
+        median_income = cols.floats('median_income')
+        target_value = cols.floats('target_value')
+
+        sized = ~((total_population <= 0) | (median_income <= 0))
+
+        # Python's float ** 0.5 can differ from np.power/np.sqrt in the last bit
+        revenue_raw = np.fromiter(
+            ((population / 50000) ** 0.5 * (income / 80000) ** 0.5 * 100 if is_sized else 0.0
+             for population, income, is_sized in zip(total_population.tolist(), median_income.tolist(),
+                                                     sized.tolist())),
+            dtype=np.float64, count=n)
+        revenue_potential = py_min(revenue_raw, 100)
+
+        category_conditions = [
+            (total_population >= 150000) & (median_income >= 80000),
+            (total_population >= 100000) & (median_income >= 60000),
+            (total_population >= 75000) | (median_income >= 100000),
+            (total_population >= 25000) & (median_income >= 40000),
+        ]
+        category_index = np.select(category_conditions, [0, 1, 2, 3], 4)
+        categories = ['Mega Market', 'Large Market', 'Medium Market', 'Small Market', 'Emerging Market']
+        category_bonus = np.array([25, 20, 15, 10, 5])[category_index]
+
+        performance_ratio = py_min(target_value / 50, 2.0)
+        opportunity_factor = np.where(
+            target_value > 0,
+            np.select([performance_ratio > 1.5, performance_ratio < 0.5], [0.8, 1.3], 1.0),
+            1.0)
+
+        base_score = revenue_potential * 0.6 + category_bonus * 0.4
+        sizing_raw = base_score * opportunity_factor
+        score = np.where(sized, py_min(sizing_raw, 100), 0.0)
+
+        has_population = total_population > 0
+        households = np.where(has_population, total_population / 2.5, 0)
+
+        market_category = [categories[i] if is_sized else 'Insufficient Data'
+                           for i, is_sized in zip(category_index.tolist(), sized.tolist())]
+        return {
+            'market_sizing_score': rounded(score, n, sized & (100 < sizing_raw)),
+            'market_category': market_category,
+            'revenue_potential': rounded(np.where(sized, revenue_potential, 0.0), n, sized & (100 < revenue_raw)),
+            'estimated_households': rounded(households, n, ~has_population, ndigits=0)
+        }, None, None
+
+    def _housing_correlation(self, cols: RecordColumns):
+        n = cols.size
+        target_value = cols.floats('target_value')
+        median_income = cols.floats('median_income')
+        valid = target_value > 0
+
+        if np.count_nonzero(valid) < 3:
+            scored = valid & (median_income > 0)
+            raw = (target_value / 100) * (median_income / 75000) * 50
+            score = np.where(scored, py_min(raw, 100), 0.0)
+            return {'housing_correlation_score': rounded(score, n, scored & (100 < raw))}, None, None
+
+        median_age = cols.floats('median_age')
+        total_population = cols.floats('total_population')
+        target_values = target_value[valid].tolist()
+        correlate = self.calculator._calculate_pearson_correlation
+        income_housing_correlation = correlate(target_values, median_income[valid].tolist())
+        density_correlation = correlate(target_values, total_population[valid].tolist())
+        age_correlation = correlate(target_values, median_age[valid].tolist())
+
+        income_factor = abs(income_housing_correlation) * 35 if income_housing_correlation is not None else 0
+        density_factor = abs(density_correlation) * 25 if density_correlation is not None else 0
+        age_factor = abs(age_correlation) * 20 if age_correlation is not None else 0
+
+        has_income = median_income > 0
+        income_housing_score = np.select(
+            [(60000 <= median_income) & (median_income <= 120000),
+             (40000 <= median_income) & (median_income <= 150000)],
+            [20, 15], 10)
+        has_age = median_age > 0
+        age_housing_score = np.select(
+            [(25 <= median_age) & (median_age <= 45),
+             (20 <= median_age) & (median_age <= 55)],
+            [20, 15], 10)
+        economic_housing_score = (np.where(has_income, income_housing_score * 0.6, 0.0) +
+                                  np.where(has_age, age_housing_score * 0.4, 0.0))
+
+        combined = income_factor + density_factor + age_factor + economic_housing_score
+        not_scored = target_value <= 0
+        score = np.where(not_scored, 0.0, py_min(combined, 100))
+        factors_int = all(isinstance(factor, int) for factor in (income_factor, density_factor, age_factor))
+        score_int = ~not_scored & ((100 < combined) | (factors_int & ~has_income & ~has_age))
+
+        def correlation_column(correlation):
+            return [round(correlation, 3) if correlation is not None else None] * n
+
+        return {
+            'housing_correlation_score': rounded(score, n, score_int),
+            'income_housing_correlation': correlation_column(income_housing_correlation),
+            'density_correlation': correlation_column(density_correlation),
+            'age_correlation': correlation_column(age_correlation)
+        }, None, None
+
+    # Comprehensive endpoints
+
+    def _ensemble_analysis(self, cols: RecordColumns):
+        n = cols.size
+        ensemble_pred = cols.floats('ensemble_prediction', fallback='prediction')
+        confidence = cols.floats('confidence', 0.5)
+        raw = (np.abs(ensemble_pred) * confidence * 100)
+        return {'ensemble_strength_score': rounded(py_min(100, raw), n, ~(raw < 100))}, None, None
+
+    def _cluster_analysis(self, cols: RecordColumns):
+        distance_to_center = cols.floats('distance_to_center', 1)
+        if np.any(1 + distance_to_center == 0):
+            raise ZeroDivisionError('float division by zero')
+        score = 100 * (1 / (1 + distance_to_center))
+        return {'cluster_quality_score': rounded(score, cols.size)}, None, None
+
+    def _anomaly_insights(self, cols: RecordColumns):
+        combined_anomaly = (cols.floats('anomaly_score') + cols.floats('isolation_score')) / 2
+        raw = combined_anomaly * 100
+        return {'anomaly_insight_score': rounded(py_min(100, raw), cols.size, ~(raw < 100))}, None, None
+
+    def _model_selection(self, cols: RecordColumns):
+        raw = cols.floats('best_model_score') * 100
+        return {'model_selection_score': rounded(py_min(100, raw), cols.size, ~(raw < 100))}, None, None
+
+    def _dimensionality_insights(self, cols: RecordColumns):
+        pc1 = cols.floats('pc1', fallback='component_1')
+        pc2 = cols.floats('pc2', fallback='component_2')
+        explained_variance = cols.floats('explained_variance')
+        raw = (np.abs(pc1) + np.abs(pc2)) * 50 + explained_variance * 100
+        return {'dimensionality_score': rounded(py_min(100, raw), cols.size, ~(raw < 100))}, None, None
+
+    def _analyze(self, cols: RecordColumns):
+        n = cols.size
+        total_score = np.zeros(n)
+        component_count = np.zeros(n, dtype=np.int64)
+
+        for field, fallback, weight in ANALYZE_COMPONENTS:
+            raw = cols.floats(field, fallback=fallback)
+            present = raw > 0
+            normalized = py_min((raw / 100) * 100, 100)
+            total_score = np.where(present, total_score + weight * normalized, total_score)
+            component_count += present
+
+        capped = py_min(100, total_score)
+        analysis_score = py_max(0, capped)
+        score_int = ~(total_score < 100) | ~(capped > 0)
+        return {
+            'analysis_score': rounded(analysis_score, n, score_int),
+            'analysis_components_used': component_count.tolist()
+        }, None, None
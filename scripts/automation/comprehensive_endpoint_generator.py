@@ -16,6 +16,8 @@ from pathlib import Path
 from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
 import warnings
+
+from endpoint_store import COLUMNAR_SUFFIX, STORAGE_FORMATS, export_endpoints, write_columnar_endpoint
 warnings.filterwarnings('ignore')
 
 class ComprehensiveEndpointGenerator:
@@ -24,16 +26,21 @@ class ComprehensiveEndpointGenerator:
     with support for 17-model architecture and enhanced analytics
     """
     
-    def __init__(self, models_dir: str, output_dir: str = "../../public/data/endpoints"):
+    def __init__(self, models_dir: str, output_dir: str = "../../public/data/endpoints",
+                 storage_format: str = 'json'):
         """
         Initialize comprehensive endpoint generator
         
         Args:
             models_dir: Directory containing trained models (17 models)
             output_dir: Directory to save generated endpoint files
+            storage_format: 'json' or 'columnar' (a JSON copy of each endpoint is still published in output_dir)
         """
+        if storage_format not in STORAGE_FORMATS:
+            raise ValueError(f"Unknown storage format {storage_format!r}; expected one of {', '.join(STORAGE_FORMATS)}")
         self.models_dir = Path(models_dir)
         self.output_dir = Path(output_dir)
+        self.storage_format = storage_format
         
         # Clear and recreate output directory to ensure clean state
         import shutil
@@ -645,9 +652,13 @@ class ComprehensiveEndpointGenerator:
         endpoint_data['record_count'] = len(results)
         
         # Save endpoint file
-        output_file = self.output_dir / f"{endpoint_name}.json"
-        with open(output_file, 'w') as f:
-            json.dump(endpoint_data, f, indent=2)
+        if self.storage_format == 'columnar':
+            output_file = self.output_dir / f"{endpoint_name}{COLUMNAR_SUFFIX}"
+            write_columnar_endpoint(output_file, endpoint_data)
+        else:
+            output_file = self.output_dir / f"{endpoint_name}.json"
+            with open(output_file, 'w') as f:
+                json.dump(endpoint_data, f, indent=2)
         
         return {
             'success': True,
@@ -871,6 +882,11 @@ class ComprehensiveEndpointGenerator:
         deployment_dir = self.output_dir / 'deployment_ready'
         deployment_dir.mkdir(exist_ok=True)
         
+        # Columnar endpoints are also published as the JSON the client loads, where JSON mode writes it
+        if self.storage_format == 'columnar':
+            exported = export_endpoints(self.output_dir, self.output_dir)
+            self.logger.info(f"   📁 {len(exported)} endpoint files exported to JSON in {self.output_dir}")
+        
         # Create deployment manifest
         manifest = {
             'deployment_version': '2.0-comprehensive',
@@ -910,6 +926,9 @@ def main():
     parser.add_argument('data_file', help='Path to the combined CSV data file')
     parser.add_argument('--models', default='../comprehensive_models', help='Path to models directory')
     parser.add_argument('--output', default='../../public/data/endpoints', help='Output directory')
+    parser.add_argument('--format', choices=STORAGE_FORMATS, default='json',
+                        help='Endpoint storage format; with columnar, <name>.json copies are still written '
+                             'next to the .columnar files in the output directory')
     
     args = parser.parse_args()
     
@@ -918,7 +937,7 @@ def main():
     print(f"   🤖 Models directory: {args.models}")
     print(f"   📁 Output directory: {args.output}")
     
-    generator = ComprehensiveEndpointGenerator(args.models, args.output)
+    generator = ComprehensiveEndpointGenerator(args.models, args.output, args.format)
     results = generator.generate_all_comprehensive_endpoints(args.data_file)
     
     successful = len([r for r in results.values() if r.get('success', False)])
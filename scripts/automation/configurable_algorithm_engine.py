@@ -5,13 +5,19 @@ Part of the Phase 3 implementation for unlimited project type scalability
 """
 
 import json
+import hashlib
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Tuple, Union
 import logging
 from datetime import datetime
 import pandas as pd
 import numpy as np
 
+from formula_compiler import CompiledFormula, FormulaError, _column_pow, _ColumnPow, compile_formula
+from columnar_scoring import RecordColumns, merge_columns, py_max, py_min, rounded
+
+PRIORITY_LEVELS = ['primary', 'fallback', 'last_resort']
+
 class ConfigurableAlgorithmEngine:
     """
     Enhanced scoring algorithm engine that uses semantic field resolution
@@ -30,6 +36,37 @@ class ConfigurableAlgorithmEngine:
             self.semantic_config = {}
             self.project_config = {}
             self.logger.warning("No project path provided - using fallback field names")
+        
+        # Field plans and compiled formulas, valid for one semantic config version
+        self.semantic_config_version = self._config_version(self.semantic_config)
+        self._field_plans = {}
+        self._compiled_formulas = {}
+        self._compiled_config = self.semantic_config
+    
+    @staticmethod
+    def _config_version(config: Dict) -> str:
+        """Content hash identifying a semantic config"""
+        return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+    
+    def _sync_config_version(self) -> None:
+        """Drop cached plans and formulas when a different semantic config has been assigned"""
+        if self.semantic_config is not self._compiled_config:
+            self._compiled_config = self.semantic_config
+            version = self._config_version(self.semantic_config)
+            if version != self.semantic_config_version:
+                self.semantic_config_version = version
+                self._field_plans.clear()
+                self._compiled_formulas.clear()
+    
+    def fingerprint_sources(self) -> List[Any]:
+        """Code and config behind every configurable score (see AutomatedScoreCalculator.scoring_fingerprint)"""
+        return [
+            ConfigurableAlgorithmEngine, RecordColumns, merge_columns, rounded, py_min, py_max,
+            CompiledFormula, compile_formula, _ColumnPow, _column_pow,
+            self.semantic_config,
+            # project_metadata only describes the config (and carries a creation timestamp)
+            {key: value for key, value in self.project_config.items() if key != 'project_metadata'}
+        ]
     
     def _load_semantic_config(self) -> Dict:
         """Load semantic field configuration"""
@@ -120,6 +157,44 @@ class ConfigurableAlgorithmEngine:
         # Fallback to provided fallback or original semantic name
         return fallback or semantic_name
     
+    def resolve_field_plan(self, semantic_name: str, fallback: str = None) -> Tuple:
+        """
+        Resolve a semantic field once into an extraction plan
+        
+        Plans are cached per semantic config version and shared by
+        extract_field_value (one record) and extract_field_column (all records):
+            ('field', field_name)
+            ('priority', [field_name, ...])       first non-empty, non-zero value wins
+            ('composite', [field_name, ...], method)
+            ('calculation', field_mapping)
+        """
+        self._sync_config_version()
+        key = (semantic_name, fallback)
+        plan = self._field_plans.get(key)
+        if plan is None:
+            plan = self._field_plans[key] = self._build_field_plan(semantic_name, fallback)
+        return plan
+    
+    def _build_field_plan(self, semantic_name: str, fallback: str = None) -> Tuple:
+        mapping = self.semantic_config.get(semantic_name)
+        default_field = fallback or semantic_name
+        
+        if isinstance(mapping, str):
+            return ('field', mapping)
+        elif isinstance(mapping, dict):
+            mapping_type = mapping.get('type')
+            
+            if mapping_type == 'priority':
+                return ('priority', [mapping[level] for level in PRIORITY_LEVELS if level in mapping])
+            elif mapping_type == 'composite':
+                return ('composite', list(mapping.get('fields', [])), mapping.get('combination_method', 'sum'))
+            elif mapping_type == 'calculation':
+                return ('calculation', mapping)
+            elif mapping_type == 'custom':
+                return ('field', mapping.get('field', default_field))
+        
+        return ('field', default_field)
+    
     def extract_field_value(self, record: Dict, semantic_name: str, fallback: str = None) -> float:
         """
         Extract field value using semantic resolution with support for all mapping types
@@ -133,91 +208,147 @@ class ConfigurableAlgorithmEngine:
             Extracted numeric value
         """
         
-        field_mapping = self.get_field(semantic_name, fallback)
+        plan = self.resolve_field_plan(semantic_name, fallback)
+        plan_type = plan[0]
         
-        # Handle different mapping types
-        if isinstance(field_mapping, str):
+        if plan_type == 'field':
             # Simple field mapping
-            return self._safe_float(record.get(field_mapping, 0))
+            return self._safe_float(record.get(plan[1], 0))
             
-        elif isinstance(field_mapping, dict):
-            mapping_type = field_mapping.get('type')
+        elif plan_type == 'priority':
+            # Try fields in priority order
+            for field_name in plan[1]:
+                value = record.get(field_name)
+                if value is not None and value != 0:
+                    return self._safe_float(value)
+            return 0.0
             
-            if mapping_type == 'priority':
-                # Try fields in priority order
-                for priority_level in ['primary', 'fallback', 'last_resort']:
-                    if priority_level in field_mapping:
-                        field_name = field_mapping[priority_level]
-                        value = record.get(field_name)
-                        if value is not None and value != 0:
-                            return self._safe_float(value)
+        elif plan_type == 'composite':
+            # Combine multiple fields
+            fields, method = plan[1], plan[2]
+            
+            values = [self._safe_float(record.get(field, 0)) for field in fields]
+            valid_values = [v for v in values if v > 0]  # Only positive values
+            
+            if not valid_values:
                 return 0.0
-                
-            elif mapping_type == 'composite':
-                # Combine multiple fields
-                fields = field_mapping.get('fields', [])
-                method = field_mapping.get('combination_method', 'sum')
-                
-                values = [self._safe_float(record.get(field, 0)) for field in fields]
-                valid_values = [v for v in values if v > 0]  # Only positive values
-                
-                if not valid_values:
-                    return 0.0
-                
-                if method == 'sum':
-                    return sum(valid_values)
-                elif method == 'average':
-                    return sum(valid_values) / len(valid_values)
-                elif method == 'maximum':
-                    return max(valid_values)
-                elif method == 'minimum':
-                    return min(valid_values)
-                else:
-                    return sum(valid_values)  # Default to sum
-                    
-            elif mapping_type == 'calculation':
-                # Calculate field using formula
-                return self._calculate_formula(record, field_mapping)
-                
-            elif mapping_type == 'custom':
-                field_name = field_mapping.get('field', semantic_name)
-                return self._safe_float(record.get(field_name, 0))
+            
+            if method == 'average':
+                return sum(valid_values) / len(valid_values)
+            elif method == 'maximum':
+                return max(valid_values)
+            elif method == 'minimum':
+                return min(valid_values)
+            else:
+                return sum(valid_values)  # Sum is the default
         
-        # Fallback
-        return self._safe_float(record.get(fallback or semantic_name, 0))
+        # Calculate field using formula
+        return self._calculate_formula(record, plan[1])
     
-    def _calculate_formula(self, record: Dict, field_mapping: Dict) -> float:
-        """Calculate value using formula-based field mapping"""
+    def extract_field_column(self, records: Union[List[Dict], RecordColumns], semantic_name: str,
+                             fallback: str = None) -> np.ndarray:
+        """
+        Extract a semantic field for all records at once
         
-        try:
-            formula = field_mapping.get('formula', '')
-            required_fields = field_mapping.get('fields', [])
+        Same values as calling extract_field_value per record: priority fallbacks
+        become a chain of np.where, composites a masked reduction over their fields.
+        
+        Args:
+            records: Data records, or RecordColumns to share converted columns between fields
+            semantic_name: Semantic field name
+            fallback: Fallback field name
             
-            # Create a context with field values
-            context = {}
-            for field in required_fields:
-                context[field] = self._safe_float(record.get(field, 0))
+        Returns:
+            float64 array with one value per record
+        """
+        cols = records if isinstance(records, RecordColumns) else RecordColumns(records)
+        plan = self.resolve_field_plan(semantic_name, fallback)
+        plan_type = plan[0]
+        
+        if plan_type == 'field':
+            return cols.floats(plan[1])
+        
+        elif plan_type == 'priority':
+            # Apply from lowest priority up, so higher priorities overwrite
+            column = np.zeros(cols.size)
+            for field_name in reversed(plan[1]):
+                present = np.fromiter((value is not None and value != 0 for value in cols.raw(field_name, None)),
+                                      dtype=bool, count=cols.size)
+                column = np.where(present, cols.floats(field_name), column)
+            return column
+        
+        elif plan_type == 'composite':
+            fields, method = plan[1], plan[2]
+            total = np.zeros(cols.size)
+            count = np.zeros(cols.size, dtype=np.int64)
+            maximum = np.full(cols.size, -np.inf)
+            minimum = np.full(cols.size, np.inf)
+            for field in fields:
+                values = cols.floats(field)
+                valid = values > 0  # Only positive values
+                # Adding 0.0 for skipped fields keeps the same left-to-right sum
+                total = total + np.where(valid, values, 0.0)
+                count += valid
+                maximum = np.where(valid, np.maximum(maximum, values), maximum)
+                minimum = np.where(valid, np.minimum(minimum, values), minimum)
             
-            # Simple formula evaluation (secure subset)
-            # For security, only allow specific operations
-            allowed_ops = ['+', '-', '*', '/', '(', ')', '.', ' ']
-            if all(c.isalnum() or c == '_' or c in allowed_ops for c in formula):
-                # Replace field names with values
-                eval_formula = formula
-                for field, value in context.items():
-                    eval_formula = eval_formula.replace(field, str(value))
-                
-                # Safe evaluation of mathematical expressions
-                result = eval(eval_formula, {"__builtins__": {}}, {})
-                return float(result)
+            if method == 'average':
+                with np.errstate(all='ignore'):
+                    column = total / count
+            elif method == 'maximum':
+                column = maximum
+            elif method == 'minimum':
+                column = minimum
             else:
-                self.logger.warning(f"Unsafe formula rejected: {formula}")
+                column = total  # Sum is the default
+            return np.where(count > 0, column, 0.0)
+        
+        return self.calculate_formula_column(cols, plan[1])
+    
+    def compile_formula(self, field_mapping: Dict) -> Optional[CompiledFormula]:
+        """
+        Compiled formula for a calculation mapping, or None if it was rejected
+        
+        Formulas are compiled once per semantic config version (assigning a new
+        semantic_config starts a new version); rejected formulas (syntax errors,
+        unknown names, non-arithmetic expressions) are logged once.
+        """
+        formula = field_mapping.get('formula', '')
+        fields = field_mapping.get('fields', [])
+        
+        self._sync_config_version()
+        
+        key = (formula, tuple(field for field in fields if isinstance(field, str)))
+        if key not in self._compiled_formulas:
+            try:
+                self._compiled_formulas[key] = compile_formula(formula, fields)
+            except FormulaError as e:
+                self.logger.warning(f"Formula rejected: {e}")
+                self._compiled_formulas[key] = None
+        return self._compiled_formulas[key]
+    
+    def _calculate_formula(self, record: Dict, field_mapping: Dict) -> float:
+        """Calculate value using formula-based field mapping"""
+        
+        try:
+            compiled = self.compile_formula(field_mapping)
+            if compiled is None:
                 return 0.0
+            return compiled.evaluate_record(record, self._safe_float)
                 
         except Exception as e:
             self.logger.error(f"Formula calculation error: {e}")
             return 0.0
     
+    def calculate_formula_column(self, records: Union[List[Dict], RecordColumns], field_mapping: Dict) -> np.ndarray:
+        """Evaluate a calculation mapping over all records at once"""
+        cols = records if isinstance(records, RecordColumns) else RecordColumns(records)
+        compiled = self.compile_formula(field_mapping)
+        if compiled is None:
+            return np.zeros(cols.size)
+        columns = {field: cols.floats(field) for field in compiled.used_fields}
+        return compiled.evaluate_columns(columns, cols.size)
+    
     def get_business_parameter(self, parameter_name: str, default_value: Any = None) -> Any:
         """Get business logic parameter from project configuration"""
         
@@ -254,109 +385,115 @@ class ConfigurableScoreCalculator:
     def calculate_demographic_scores_configurable(self, endpoint_data: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate demographic scores using semantic field resolution"""
         
-        results = []
+        records = endpoint_data['results']
+        cols = RecordColumns(records)
+        n = cols.size
         
         # Get business parameters
         income_target = self.engine.get_business_parameter('demographic_income_target', 75000)
         age_target = self.engine.get_business_parameter('demographic_age_target', 35)
         household_size_target = self.engine.get_business_parameter('demographic_household_size_target', 3)
         
-        for record in endpoint_data['results']:
-            # Extract values using semantic field resolution
-            total_population = self.engine.extract_field_value(record, 'market_size', 'total_population')
-            median_income = self.engine.extract_field_value(record, 'consumer_income', 'median_income')
-            median_age = self.engine.extract_field_value(record, 'age_demographics', 'median_age')
-            household_size = self.engine.extract_field_value(record, 'household_composition', 'household_size')
-            
-            # Get demographic composition (try semantic fields first)
-            asian_population = self.engine.extract_field_value(record, 'asian_demographics', 'asian_population')
-            black_population = self.engine.extract_field_value(record, 'black_demographics', 'black_population')
-            
-            # Calculate diversity score using configurable parameters
-            if total_population > 0:
-                diversity_score = (
-                    (asian_population / total_population) * 30 +
-                    (black_population / total_population) * 20 +
-                    min(median_income / income_target, 1) * 25 +
-                    max(0, 1 - abs(median_age - age_target) / 20) * 15 +
-                    min(household_size / household_size_target, 1) * 10
-                ) * 100
-            else:
-                diversity_score = 0
-            
-            # Population scale bonus
-            population_bonus = min(total_population / 10000, 1) * 20
-            demographic_opportunity_score = min(diversity_score + population_bonus, 100)
-            
-            record_copy = record.copy()
-            record_copy['demographic_opportunity_score'] = round(demographic_opportunity_score, 2)
-            
-            # Add debug information about field resolution
-            if self.logger.level <= logging.DEBUG:
-                record_copy['_debug_field_resolution'] = {
-                    'market_size_field': self.engine.get_field('market_size', 'total_population'),
-                    'consumer_income_field': self.engine.get_field('consumer_income', 'median_income'),
-                    'age_demographics_field': self.engine.get_field('age_demographics', 'median_age')
-                }
-            
-            results.append(record_copy)
+        # Extract columns using semantic field resolution
+        total_population = self.engine.extract_field_column(cols, 'market_size', 'total_population')
+        median_income = self.engine.extract_field_column(cols, 'consumer_income', 'median_income')
+        median_age = self.engine.extract_field_column(cols, 'age_demographics', 'median_age')
+        household_size = self.engine.extract_field_column(cols, 'household_composition', 'household_size')
+        
+        # Get demographic composition (try semantic fields first)
+        asian_population = self.engine.extract_field_column(cols, 'asian_demographics', 'asian_population')
+        black_population = self.engine.extract_field_column(cols, 'black_demographics', 'black_population')
+        
+        # Calculate diversity score using configurable parameters
+        with np.errstate(all='ignore'):
+            diversity_score = np.where(total_population > 0, (
+                (asian_population / total_population) * 30 +
+                (black_population / total_population) * 20 +
+                py_min(median_income / income_target, 1) * 25 +
+                py_max(0, 1 - np.abs(median_age - age_target) / 20) * 15 +
+                py_min(household_size / household_size_target, 1) * 10
+            ) * 100, 0)
+        
+        # Population scale bonus
+        population_bonus = py_min(total_population / 10000, 1) * 20
+        combined = diversity_score + population_bonus
+        
+        columns = {
+            'demographic_opportunity_score': rounded(py_min(combined, 100), n, 100 < combined)
+        }
+        
+        # Add debug information about field resolution
+        if self.logger.level <= logging.DEBUG:
+            field_resolution = {
+                'market_size_field': self.engine.get_field('market_size', 'total_population'),
+                'consumer_income_field': self.engine.get_field('consumer_income', 'median_income'),
+                'age_demographics_field': self.engine.get_field('age_demographics', 'median_age')
+            }
+            columns['_debug_field_resolution'] = [field_resolution.copy() for _ in range(n)]
         
         endpoint_data_copy = endpoint_data.copy()
-        endpoint_data_copy['results'] = results
+        endpoint_data_copy['results'] = merge_columns(records, columns)
         
         return endpoint_data_copy
     
     def calculate_competitive_scores_configurable(self, endpoint_data: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate competitive scores using semantic field resolution"""
         
-        results = []
         records = endpoint_data['results']
+        cols = RecordColumns(records)
+        n = cols.size
         
         # Get business parameters
         competitive_weight = self.engine.get_business_parameter('competitive_analysis_weight', 0.35)
         
-        for record in records:
-            # Extract values using semantic field resolution
-            target_value = self.engine.extract_field_value(record, 'target_performance', 'target_value')
-            median_income = self.engine.extract_field_value(record, 'consumer_income', 'median_income')
-            total_population = self.engine.extract_field_value(record, 'market_size', 'total_population')
-            wealth_index = self.engine.extract_field_value(record, 'wealth_indicator', 'wealth_index')
-            
-            if target_value <= 0:
-                competitive_advantage_score = 0.0
-            else:
-                # Market dominance (35% weight) - using configurable target field
-                market_dominance = min(target_value * 2, 100)  # Scale target value
-                
-                # Economic advantage (35% weight) - using semantic fields
-                economic_advantage = min((median_income / 100000) * 50 + (wealth_index / 200) * 50, 100)
-                
-                # Population advantage (30% weight) - using semantic field
-                population_advantage = min((total_population / 20000) * 100, 100)
-                
-                # Calculate weighted competitive advantage
-                competitive_advantage_score = (
-                    competitive_weight * market_dominance +
-                    competitive_weight * economic_advantage +
-                    (1 - 2 * competitive_weight) * population_advantage  # Remaining weight
-                )
-                
-                competitive_advantage_score = min(competitive_advantage_score, 100)
-            
-            record_copy = record.copy()
-            record_copy['competitive_advantage_score'] = round(competitive_advantage_score, 2)
-            results.append(record_copy)
+        # Extract columns using semantic field resolution
+        target_value = self.engine.extract_field_column(cols, 'target_performance', 'target_value')
+        median_income = self.engine.extract_field_column(cols, 'consumer_income', 'median_income')
+        total_population = self.engine.extract_field_column(cols, 'market_size', 'total_population')
+        wealth_index = self.engine.extract_field_column(cols, 'wealth_indicator', 'wealth_index')
+        
+        # Market dominance (35% weight) - using configurable target field
+        dominance_raw = target_value * 2  # Scale target value
+        market_dominance = py_min(dominance_raw, 100)
+        
+        # Economic advantage (35% weight) - using semantic fields
+        economic_raw = (median_income / 100000) * 50 + (wealth_index / 200) * 50
+        economic_advantage = py_min(economic_raw, 100)
+        
+        # Population advantage (30% weight) - using semantic field
+        population_raw = (total_population / 20000) * 100
+        population_advantage = py_min(population_raw, 100)
+        
+        # Calculate weighted competitive advantage
+        weighted_score = (
+            competitive_weight * market_dominance +
+            competitive_weight * economic_advantage +
+            (1 - 2 * competitive_weight) * population_advantage  # Remaining weight
+        )
+        
+        # An int weight keeps the score an int where every capped component is
+        if isinstance(competitive_weight, int) and not isinstance(competitive_weight, bool):
+            weighted_int = (100 < dominance_raw) & (100 < economic_raw) & (100 < population_raw)
+        else:
+            weighted_int = np.zeros(n, dtype=bool)
+        
+        not_scored = target_value <= 0
+        competitive_advantage_score = np.where(not_scored, 0.0, py_min(weighted_score, 100))
+        score_int = ~not_scored & ((100 < weighted_score) | weighted_int)
         
         endpoint_data_copy = endpoint_data.copy()
-        endpoint_data_copy['results'] = results
+        endpoint_data_copy['results'] = merge_columns(records, {
+            'competitive_advantage_score': rounded(competitive_advantage_score, n, score_int)
+        })
         
         return endpoint_data_copy
     
     def calculate_risk_scores_configurable(self, endpoint_data: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate risk scores using semantic field resolution and configurable parameters"""
         
-        results = []
         records = endpoint_data['results']
+        cols = RecordColumns(records)
+        n = cols.size
         
         # Get configurable parameters
         volatility_factor = self.engine.get_business_parameter('volatility_penalty_factor', 0.2)
@@ -366,78 +503,72 @@ class ConfigurableScoreCalculator:
         market_size_threshold = self.engine.get_business_parameter('market_size_threshold', 50000)
         
         # Calculate dataset risk factors
-        target_values = []
-        for r in records:
-            target_val = self.engine.extract_field_value(r, 'target_performance', 'target_value')
-            if target_val > 0:
-                target_values.append(target_val)
+        target_value = self.engine.extract_field_column(cols, 'target_performance', 'target_value')
+        scored = target_value > 0
+        target_values = target_value[scored].tolist()
+        
+        endpoint_data_copy = endpoint_data.copy()
         
         if not target_values:
             # No valid data - assign neutral risk scores
-            for record in records:
-                record_copy = record.copy()
-                record_copy['risk_adjusted_score'] = 50.0
-                results.append(record_copy)
+            endpoint_data_copy['results'] = merge_columns(records, {'risk_adjusted_score': [50.0] * n})
+            return endpoint_data_copy
+        
+        # Calculate market risk indicators
+        market_volatility = self._calculate_volatility(target_values)
+        mean_target = sum(target_values) / len(target_values)
+        
+        # Extract values using semantic field resolution
+        median_income = self.engine.extract_field_column(cols, 'consumer_income', 'median_income')
+        total_population = self.engine.extract_field_column(cols, 'market_size', 'total_population')
+        
+        # Base opportunity score
+        base_value = py_min(target_value, 100)
+        base_int = 100 < target_value
+        
+        # Risk factors (penalties) - using configurable parameters
+        volatility_penalty = min(market_volatility * volatility_factor, 20)
+        
+        # Uncertainty penalty based on deviation from market mean
+        if mean_target > 0:
+            deviation_raw = (np.abs(target_value - mean_target) / mean_target) * uncertainty_factor
+            uncertainty_penalty, uncertainty_int = py_min(deviation_raw, 15), 15 < deviation_raw
         else:
-            # Calculate market risk indicators
-            market_volatility = self._calculate_volatility(target_values)
-            mean_target = sum(target_values) / len(target_values)
-            
-            for record in records:
-                # Extract values using semantic field resolution
-                target_value = self.engine.extract_field_value(record, 'target_performance', 'target_value')
-                median_income = self.engine.extract_field_value(record, 'consumer_income', 'median_income')
-                total_population = self.engine.extract_field_value(record, 'market_size', 'total_population')
-                
-                if target_value <= 0:
-                    risk_adjusted_score = 0.0
-                else:
-                    # Base opportunity score
-                    base_value = min(target_value, 100)
-                    
-                    # Risk factors (penalties) - using configurable parameters
-                    volatility_penalty = min(market_volatility * volatility_factor, 20)
-                    
-                    # Uncertainty penalty based on deviation from market mean
-                    if mean_target > 0:
-                        deviation_ratio = abs(target_value - mean_target) / mean_target
-                        uncertainty_penalty = min(deviation_ratio * uncertainty_factor, 15)
-                    else:
-                        uncertainty_penalty = 0
-                    
-                    # Stability bonuses (positive factors) - using configurable thresholds
-                    stability_bonus = 0
-                    
-                    # Economic stability bonus
-                    if median_income > income_threshold:
-                        economic_stability = min((median_income - income_threshold) / 25000 * stability_bonus_factor, 10)
-                        stability_bonus += economic_stability
-                    
-                    # Market size stability bonus  
-                    if total_population > market_size_threshold:
-                        size_stability = min((total_population - market_size_threshold) / 50000 * 5, 5)
-                        stability_bonus += size_stability
-                    
-                    # Calculate final risk-adjusted score
-                    risk_adjusted_score = base_value - volatility_penalty - uncertainty_penalty + stability_bonus
-                    risk_adjusted_score = max(0, min(100, risk_adjusted_score))
-                
-                record_copy = record.copy()
-                record_copy['risk_adjusted_score'] = round(risk_adjusted_score, 2)
-                
-                # Add risk breakdown for transparency
-                if target_value > 0:
-                    record_copy.update({
-                        'market_volatility': round(market_volatility, 2),
-                        'volatility_penalty': round(volatility_penalty, 2),
-                        'uncertainty_penalty': round(uncertainty_penalty, 2),
-                        'stability_bonus': round(stability_bonus, 2)
-                    })
-                
-                results.append(record_copy)
+            uncertainty_penalty, uncertainty_int = np.zeros(n), np.ones(n, dtype=bool)
+        
+        # Stability bonuses (positive factors) - using configurable thresholds;
+        # the total stays an int only if each bonus that applies is capped
+        has_economic = median_income > income_threshold
+        economic_raw = (median_income - income_threshold) / 25000 * stability_bonus_factor
+        has_size = total_population > market_size_threshold
+        size_raw = (total_population - market_size_threshold) / 50000 * 5
+        
+        stability_bonus = np.zeros(n)
+        stability_bonus = stability_bonus + np.where(has_economic, py_min(economic_raw, 10), 0.0)
+        stability_bonus = stability_bonus + np.where(has_size, py_min(size_raw, 5), 0.0)
+        bonus_int = (~has_economic | (10 < economic_raw)) & (~has_size | (5 < size_raw))
+        
+        # Calculate final risk-adjusted score
+        raw_score = base_value - volatility_penalty - uncertainty_penalty + stability_bonus
+        raw_int = base_int & isinstance(volatility_penalty, int) & uncertainty_int & bonus_int
+        capped = py_min(100, raw_score)
+        clamped = py_max(0, capped)
+        clamped_int = ~(raw_score < 100) | ~(capped > 0) | raw_int
+        
+        not_scored = target_value <= 0
+        risk_adjusted_score = np.where(not_scored, 0.0, clamped)
+        
+        # Add risk breakdown for transparency
+        details = {
+            'market_volatility': [round(market_volatility, 2)] * n,
+            'volatility_penalty': [round(volatility_penalty, 2)] * n,
+            'uncertainty_penalty': rounded(uncertainty_penalty, n, uncertainty_int),
+            'stability_bonus': rounded(stability_bonus, n, bonus_int)
+        }
         
-        endpoint_data_copy = endpoint_data.copy()
-        endpoint_data_copy['results'] = results
+        endpoint_data_copy['results'] = merge_columns(
+            records, {'risk_adjusted_score': rounded(risk_adjusted_score, n, ~not_scored & clamped_int)},
+            details, scored)
         
         return endpoint_data_copy
     
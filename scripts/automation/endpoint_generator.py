@@ -15,6 +15,9 @@ from pathlib import Path
 from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
 import warnings
+
+from endpoint_store import (COLUMNAR_SUFFIX, STORAGE_FORMATS, ColumnarEndpoint, is_columnar, read_endpoint,
+                            write_columnar_endpoint)
 warnings.filterwarnings('ignore')
 
 class EndpointGenerator:
@@ -23,16 +26,21 @@ class EndpointGenerator:
     with proper formatting, feature importance, and metadata
     """
     
-    def __init__(self, models_dir: str, output_dir: str = "../../public/data/endpoints"):
+    def __init__(self, models_dir: str, output_dir: str = "../../public/data/endpoints",
+                 storage_format: str = 'json'):
         """
         Initialize endpoint generator
         
         Args:
             models_dir: Directory containing trained models
             output_dir: Directory to save generated endpoint files
+            storage_format: 'json' or 'columnar' (JSON is then written only for deployment)
         """
+        if storage_format not in STORAGE_FORMATS:
+            raise ValueError(f"Unknown storage format {storage_format!r}; expected one of {', '.join(STORAGE_FORMATS)}")
         self.models_dir = Path(models_dir)
         self.output_dir = Path(output_dir)
+        self.storage_format = storage_format
         
         # Clear and recreate output directory to ensure clean state
         import shutil
@@ -369,11 +377,11 @@ class EndpointGenerator:
         # Generate feature importance
         feature_importance = self._generate_feature_importance(config, model_info, endpoint_data)
         
-        # Create the endpoint structure
+        # Create the endpoint structure (the columnar writer takes the frame as-is)
         endpoint_content = {
             'success': True,
             'total_records': len(endpoint_data),
-            'results': endpoint_data.to_dict('records'),
+            'results': endpoint_data if self.storage_format == 'columnar' else endpoint_data.to_dict('records'),
             'summary': config['description'],
             'feature_importance': feature_importance,
             'model_info': self._create_model_info(config, model_info),
@@ -388,9 +396,13 @@ class EndpointGenerator:
         }
         
         # Save endpoint file
-        endpoint_file = self.output_dir / f"{endpoint_name}.json"
-        with open(endpoint_file, 'w') as f:
-            json.dump(endpoint_content, f, indent=2, default=str)
+        if self.storage_format == 'columnar':
+            endpoint_file = self.output_dir / f"{endpoint_name}{COLUMNAR_SUFFIX}"
+            write_columnar_endpoint(endpoint_file, endpoint_content)
+        else:
+            endpoint_file = self.output_dir / f"{endpoint_name}.json"
+            with open(endpoint_file, 'w') as f:
+                json.dump(endpoint_content, f, indent=2, default=str)
         
         return {
             'success': True,
@@ -869,8 +881,7 @@ class EndpointGenerator:
         for endpoint_name, result in results.items():
             if result.get('success') and 'file_path' in result:
                 try:
-                    with open(result['file_path'], 'r') as f:
-                        endpoint_content = json.load(f)
+                    endpoint_content = read_endpoint(result['file_path'])
                     combined_data[endpoint_name] = endpoint_content
                 except Exception as e:
                     self.logger.warning(f"Could not include {endpoint_name} in combined file: {str(e)}")
@@ -928,16 +939,18 @@ class EndpointGenerator:
         endpoints_dir = deployment_dir / "endpoints"
         endpoints_dir.mkdir(exist_ok=True)
         
-        # Copy all endpoint files
+        # Copy all endpoint files, exporting columnar ones to the JSON the client loads
         successful_endpoints = []
         for endpoint_name, result in results.items():
             if result.get('success') and 'file_path' in result:
                 source_file = Path(result['file_path'])
                 dest_file = endpoints_dir / f"{endpoint_name}.json"
                 
-                # Copy file
-                import shutil
-                shutil.copy2(source_file, dest_file)
+                if is_columnar(source_file):
+                    ColumnarEndpoint(source_file).export_json(dest_file)
+                else:
+                    import shutil
+                    shutil.copy2(source_file, dest_file)
                 successful_endpoints.append(endpoint_name)
         
         # Create deployment manifest
@@ -971,15 +984,18 @@ def main():
     """Main function for command-line usage"""
     import sys
     
-    if len(sys.argv) < 3:
-        print("Usage: python endpoint_generator.py <models_dir> <combined_data.csv> [output_dir]")
+    args = [arg for arg in sys.argv[1:] if arg != '--columnar']
+    storage_format = 'columnar' if len(args) < len(sys.argv) - 1 else 'json'
+    
+    if len(args) < 2:
+        print("Usage: python endpoint_generator.py <models_dir> <combined_data.csv> [output_dir] [--columnar]")
         print("\nExample:")
         print("python endpoint_generator.py trained_models extracted_data/combined_data.csv ../../public/data/endpoints")
         sys.exit(1)
     
-    models_dir = sys.argv[1]
-    data_file = sys.argv[2]
-    output_dir = sys.argv[3] if len(sys.argv) > 3 else "../../public/data/endpoints"
+    models_dir = args[0]
+    data_file = args[1]
+    output_dir = args[2] if len(args) > 2 else "../../public/data/endpoints"
     
     print(f"🚀 Starting endpoint generation...")
     print(f"🤖 Models directory: {models_dir}")
@@ -987,7 +1003,7 @@ def main():
     print(f"📁 Output directory: {output_dir}")
     
     # Create generator and run
-    generator = EndpointGenerator(models_dir, output_dir)
+    generator = EndpointGenerator(models_dir, output_dir, storage_format)
     results = generator.generate_all_endpoints(data_file)
     
     # Print summary
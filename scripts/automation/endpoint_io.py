@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Endpoint I/O - Streaming reader and writer for endpoint JSON files
+Part of the ArcGIS to Microservice Automation Pipeline
+
+Endpoint files are one JSON object whose `results` array holds every
+record. EndpointReader parses the other top-level fields whole and the
+results array one record at a time, reading the file in fixed-size chunks,
+so the file text is never held in memory. EndpointWriter writes fields and
+records as they arrive with compact separators, into a temporary file that
+replaces the destination only once it is complete.
+
+    with EndpointWriter(path) as writer, EndpointReader(path) as reader:
+        writer.write_fields(reader.fields)
+        writer.write_records(pipeline(reader.records(), drop_empty, add_score))
+        writer.write_fields(reader.fields)  # fields that came after results
+
+Syntax errors raise json.JSONDecodeError with the same position as json.load.
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Union
+
+RESULTS_KEY = 'results'
+CHUNK_SIZE = 1 << 20  # Characters read per refill
+COMPACT_SEPARATORS = (',', ':')
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Text that could still belong to a number cut off at the end of the buffer
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*')
+
+
+class EndpointFormatError(ValueError):
+    """Raised when a file is valid JSON but not an endpoint object"""
+
+
+class _Scanner:
+    """Chunked JSON tokenizer over a text file, decoding one value at a time"""
+
+    def __init__(self, file, chunk_size: int = CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+        # Absolute position of buffer[0], for error messages
+        self.offset = 0
+        self.lines = 0
+        self.line_start = 0
+
+    def _fill(self, size: int) -> bool:
+        """Drop consumed text and append up to size more characters"""
+        if self.pos:
+            consumed = self.buffer[:self.pos]
+            newlines = consumed.count('\n')
+            if newlines:
+                self.lines += newlines
+                self.line_start = self.offset + consumed.rindex('\n') + 1
+            self.offset += self.pos
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        chunk = self.file.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer += chunk
+        return True
+
+    def error(self, message: str, pos: Optional[int] = None) -> json.JSONDecodeError:
+        """JSONDecodeError for a buffer position, reporting the position in the whole file"""
+        pos = self.pos if pos is None else pos
+        before = self.buffer[:pos]
+        lineno = self.lines + before.count('\n') + 1
+        newline = before.rfind('\n')
+        colno = pos - newline if newline >= 0 else self.offset + pos - self.line_start + 1
+        char = self.offset + pos
+        error = json.JSONDecodeError(message, '', 0)
+        error.pos, error.lineno, error.colno = char, lineno, colno
+        error.args = (f'{message}: line {lineno} column {colno} (char {char})',)
+        return error
+
+    def peek(self) -> str:
+        """Next non-whitespace character without consuming it, or '' at end of file"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill(self.chunk_size):
+                return ''
+
+    def take(self, expected: str, message: str) -> str:
+        """Consume the next non-whitespace character, which must be one of expected"""
+        char = self.peek()
+        if not char or char not in expected:
+            raise self.error(message)
+        self.pos += 1
+        return char
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value"""
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                # Most likely cut off by the end of the buffer; read more and retry
+                offset = self.offset
+                if self._fill(size):
+                    size *= 2
+                    continue
+                raise self.error(e.msg, e.pos - (self.offset - offset)) from None
+            # A number running up to the buffer end may continue in the next chunk
+            if not self.eof and _NUMBER_TAIL.fullmatch(self.buffer, end) and self._fill(size):
+                continue
+            self.pos = end
+            return value
+
+    def finish(self) -> None:
+        """Check nothing but whitespace follows the document"""
+        if self.peek():
+            raise self.error('Extra data')
+
+
+class EndpointReader:
+    """
+    Streaming reader for one endpoint file.
+
+    Opening the reader parses the top-level fields up to the results array
+    into `fields`. records() then yields the results one at a time; once it
+    is exhausted, `fields` also holds any fields that followed the array.
+    A results value that is not an array is kept in `fields` as-is.
+    """
+
+    def __init__(self, path: Union[str, Path], results_key: str = RESULTS_KEY, chunk_size: int = CHUNK_SIZE):
+        self.path = Path(path)
+        self.results_key = results_key
+        self.fields: Dict[str, Any] = {}
+        self.has_results = False
+        self._streaming = False
+        self._file = open(self.path, 'r', encoding='utf-8')
+        try:
+            self._scanner = _Scanner(self._file, chunk_size)
+            char = self._scanner.peek()
+            if not char:
+                raise self._scanner.error('Expecting value')
+            if char != '{':
+                # Still validate the document, so broken files fail the same way as json.load
+                self._scanner.value()
+                self._scanner.finish()
+                raise EndpointFormatError(f"{self.path.name} is not a JSON object")
+            self._scanner.pos += 1
+            self._first = True
+            self._read_fields()
+        except BaseException:
+            self._file.close()
+            raise
+
+    def _read_fields(self) -> None:
+        """Parse fields until the results array starts or the object ends"""
+        scanner = self._scanner
+        while True:
+            if self._first:
+                self._first = False
+                if scanner.peek() == '}':
+                    scanner.pos += 1
+                    break
+            elif scanner.take(',}', "Expecting ',' delimiter") == '}':
+                break
+
+            if scanner.peek() != '"':
+                raise scanner.error('Expecting property name enclosed in double quotes')
+            key = scanner.value()
+            scanner.take(':', "Expecting ':' delimiter")
+
+            if key == self.results_key:
+                self.has_results = True
+                if scanner.peek() == '[':
+                    scanner.pos += 1
+                    self._streaming = True
+                    return
+            self.fields[key] = scanner.value()
+        scanner.finish()
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Yield the results array one record at a time (only once per reader)"""
+        if not self._streaming:
+            return
+        self._streaming = False
+        scanner = self._scanner
+        if scanner.peek() == ']':
+            scanner.pos += 1
+        else:
+            while True:
+                yield scanner.value()
+                if scanner.take(',]', "Expecting ',' delimiter") == ']':
+                    break
+        self._read_fields()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> 'EndpointReader':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class EndpointWriter:
+    """
+    Incremental writer for one endpoint file.
+
+    Top-level fields and the results array are written in call order with
+    compact separators. Output goes to a temporary file next to the
+    destination, which replaces it on close; if the block raises, the
+    destination is left untouched. This also makes it safe to rewrite the
+    file an EndpointReader is reading.
+    """
+
+    def __init__(self, path: Union[str, Path], results_key: str = RESULTS_KEY,
+                 default: Optional[Callable[[Any], Any]] = str):
+        self.path = Path(path)
+        self.results_key = results_key
+        self.tmp_path = self.path.with_name(self.path.name + '.tmp')
+        self.written = set()
+        self.records_written = 0
+        self._encoder = json.JSONEncoder(separators=COMPACT_SEPARATORS, default=default)
+        self._file = open(self.tmp_path, 'w', encoding='utf-8')
+        self._file.write('{')
+        self._closed = False
+
+    def _write_key(self, key: str) -> None:
+        if key in self.written:
+            raise ValueError(f"Field {key!r} already written to {self.path.name}")
+        if self.written:
+            self._file.write(',')
+        self._file.write(self._encoder.encode(key) + ':')
+        self.written.add(key)
+
+    def write_field(self, key: str, value: Any) -> None:
+        """Write one top-level field"""
+        self._write_key(key)
+        for part in self._encoder.iterencode(value):
+            self._file.write(part)
+
+    def write_fields(self, fields: Dict[str, Any]) -> None:
+        """Write the fields that have not been written yet"""
+        for key, value in fields.items():
+            if key not in self.written:
+                self.write_field(key, value)
+
+    def write_records(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Write the results array from an iterable of records; returns the record count"""
+        self._write_key(self.results_key)
+        self._file.write('[')
+        encode = self._encoder.encode
+        write = self._file.write
+        count = 0
+        for record in records:
+            if count:
+                write(',')
+            write(encode(record))
+            count += 1
+        write(']')
+        self.records_written = count
+        return count
+
+    def close(self) -> None:
+        """Finish the object and move it into place"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._file.write('}')
+            self._file.close()
+        except BaseException:
+            self._discard()
+            raise
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        """Discard everything written; the destination is not touched"""
+        if not self._closed:
+            self._closed = True
+            self._discard()
+
+    def _discard(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+    def __enter__(self) -> 'EndpointWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def pipeline(records: Iterable[Dict[str, Any]],
+             *steps: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+    """Pass each record through the steps in order; a step returning None drops the record"""
+    for record in records:
+        for step in steps:
+            record = step(record)
+            if record is None:
+                break
+        else:
+            yield record
+
+
+def load_endpoint(path: Union[str, Path], results_key: str = RESULTS_KEY) -> Dict[str, Any]:
+    """
+    Load a whole endpoint object, keeping its field order
+
+    Parses the file incrementally, so only the decoded records are held in
+    memory. Raises EndpointFormatError if the file is not a JSON object.
+    """
+    with EndpointReader(path, results_key) as reader:
+        leading = list(reader.fields)
+        records = list(reader.records()) if reader.has_results and results_key not in reader.fields else None
+        if records is None:
+            return reader.fields
+        data = {key: reader.fields[key] for key in leading}
+        data[results_key] = records
+        data.update((key, value) for key, value in reader.fields.items() if key not in data)
+        return data
+
+
+def write_endpoint(path: Union[str, Path], endpoint_data: Dict[str, Any], results_key: str = RESULTS_KEY) -> int:
+    """
+    Write an endpoint object, streaming its results array; returns the record count
+
+    Non-serializable values are written with str(), as json.dump(default=str) did.
+    """
+    with EndpointWriter(path, results_key) as writer:
+        for key, value in endpoint_data.items():
+            if key == results_key and isinstance(value, list):
+                writer.write_records(value)
+            else:
+                writer.write_field(key, value)
+        return writer.records_written
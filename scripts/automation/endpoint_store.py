@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+"""
+Endpoint Store - Columnar on-disk format for endpoint data
+Part of the ArcGIS to Microservice Automation Pipeline
+
+A `.columnar` endpoint file stores the results column by column instead of
+as an array of records that repeats every field name:
+
+    line 1   JSON header: top-level fields, record count and a column index
+             (name, type, encoding, compression, byte offset and length)
+    rest     one block per column, zlib-compressed when that is smaller
+
+Columns are typed (bool, int, float, number, str, null or json) and encoded
+as a constant, a dictionary of distinct values with codes, or plain values;
+rows where a record lacks the field are listed as absent. Records whose
+fields are not in column order get their order stored in an extra block,
+so records read back with the fields in their original order. Readers use
+the index to seek to and decode only the columns they ask for.
+
+Today's `{"results": [...]}` JSON is produced only when publishing:
+
+    python3 endpoint_store.py export generated_endpoints/ deployment_ready/endpoints/
+"""
+
+import json
+import os
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+from endpoint_io import RESULTS_KEY, EndpointFormatError, EndpointWriter, load_endpoint, write_endpoint
+
+FORMAT_NAME = 'columnar-endpoint'
+FORMAT_VERSION = 1
+COLUMNAR_SUFFIX = '.columnar'
+COMPRESSION_LEVEL = 6
+STORAGE_FORMATS = ('json', 'columnar')
+
+_ABSENT = object()
+
+
+def is_columnar(path: Union[str, Path]) -> bool:
+    return Path(path).name.endswith(COLUMNAR_SUFFIX)
+
+
+def endpoint_name_of(path: Union[str, Path]) -> str:
+    """Endpoint name for a JSON or columnar endpoint file"""
+    name = Path(path).name
+    return name[:-len(COLUMNAR_SUFFIX)] if name.endswith(COLUMNAR_SUFFIX) else Path(name).stem
+
+
+def _value_key(value: Any, encode) -> Any:
+    """Hashable key that tells apart values JSON writes differently (1, 1.0, True, -0.0, nan)"""
+    if isinstance(value, float):
+        return float, float.__repr__(value)
+    if isinstance(value, (bool, int, str)) or value is None:
+        return type(value), value
+    return 'json', encode(value)
+
+
+def _value_type(value: Any) -> str:
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int'
+    if isinstance(value, float):
+        return 'float'
+    if isinstance(value, str):
+        return 'str'
+    return 'json'
+
+
+def _column_type(values: Sequence[Any]) -> Dict[str, Any]:
+    types = {_value_type(value) for value in values}
+    nullable = 'null' in types and len(types) > 1
+    if nullable:
+        types.discard('null')
+    if not types:
+        column_type = 'null'
+    elif len(types) == 1:
+        column_type = types.pop()
+    elif types == {'int', 'float'}:
+        column_type = 'number'
+    else:
+        column_type = 'json'
+    return {'type': column_type, 'nullable': nullable}
+
+
+def _encode_column(rows: Sequence[int], values: Sequence[Any], record_count: int,
+                   encoder: json.JSONEncoder) -> Dict[str, Any]:
+    """Block content for one column: its values (constant, dictionary or plain) and absent rows"""
+    block = {}
+    if len(rows) < record_count:
+        present = set(rows)
+        block['absent'] = [row for row in range(record_count) if row not in present]
+
+    if values:
+        distinct = {}
+        codes = [distinct.setdefault(_value_key(value, encoder.encode), len(distinct)) for value in values]
+        if len(distinct) == 1:
+            block['constant'] = values[0]
+        elif len(distinct) * 2 <= len(values):
+            dictionary = [None] * len(distinct)
+            for value, code in zip(values, codes):
+                dictionary[code] = value
+            block['dictionary'] = dictionary
+            block['codes'] = codes
+        else:
+            block['values'] = list(values)
+    return block
+
+
+def _decode_column(block: Dict[str, Any], record_count: int, default: Any) -> List[Any]:
+    """Full-length column with default in absent rows"""
+    absent = block.get('absent', ())
+    count = record_count - len(absent)
+
+    if 'constant' in block:
+        constant = block['constant']
+        if isinstance(constant, (dict, list)):
+            text = json.dumps(constant)
+            values = [json.loads(text) for _ in range(count)]
+        else:
+            values = [constant] * count
+    elif 'dictionary' in block:
+        dictionary = block['dictionary']
+        if any(isinstance(entry, (dict, list)) for entry in dictionary):
+            # Nested values are decoded per row, so records do not share them
+            texts = [json.dumps(entry) for entry in dictionary]
+            values = [json.loads(texts[code]) for code in block['codes']]
+        else:
+            values = [dictionary[code] for code in block['codes']]
+    else:
+        values = block.get('values', [])
+
+    if not absent:
+        return values
+    column = [default] * record_count
+    present_values = iter(values)
+    absent_rows = set(absent)
+    for row in range(record_count):
+        if row not in absent_rows:
+            column[row] = next(present_values)
+    return column
+
+
+def _collect_record_columns(records: Sequence[Dict[str, Any]]):
+    """
+    Split records into (name, rows, values) columns plus their key orders
+
+    Columns follow the records' field order. The key orders block lists the
+    records whose fields are in a different order (None if there are none).
+    """
+    order = []
+    columns = {}
+    layouts = {}
+    row_layouts = []
+    for row, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise ValueError(f"Record {row} is not an object")
+        previous = None
+        for key, value in record.items():
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = ([], [])
+                # New fields go right after the field that precedes them in this record
+                order.insert(order.index(previous) + 1 if previous is not None else 0, key)
+            column[0].append(row)
+            column[1].append(value)
+            previous = key
+        row_layouts.append(layouts.setdefault(tuple(record), len(layouts)))
+
+    positions = {key: position for position, key in enumerate(order)}
+    reordered = {}
+    for keys, layout in layouts.items():
+        key_positions = [positions[key] for key in keys]
+        if any(a > b for a, b in zip(key_positions, key_positions[1:])):
+            reordered[layout] = key_positions
+
+    key_orders = None
+    if reordered:
+        codes = {}
+        rows = []
+        row_codes = []
+        for row, layout in enumerate(row_layouts):
+            if layout in reordered:
+                rows.append(row)
+                row_codes.append(codes.setdefault(layout, len(codes)))
+        key_orders = {'layouts': [reordered[layout] for layout in codes], 'rows': rows, 'codes': row_codes}
+    return [(str(key), rows, values) for key in order for rows, values in [columns[key]]], key_orders
+
+
+def _collect_frame_columns(frame):
+    """(name, rows, values) columns of a DataFrame, valued as in frame.to_dict('records')"""
+    import numpy as np
+    import pandas as pd
+
+    def native(value):
+        # What to_dict does per value: pd.NA becomes None, NumPy scalars become Python ones
+        if value is pd.NA:
+            return None
+        if isinstance(value, np.datetime64):
+            return pd.Timestamp(value)
+        if isinstance(value, np.timedelta64):
+            return pd.Timedelta(value)
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    positions = {}
+    for position, name in enumerate(frame.columns):
+        positions[name] = position  # Duplicate names keep the last column, as to_dict does
+    all_rows = range(len(frame))
+    columns = []
+    for name, position in positions.items():
+        series = frame.iloc[:, position]
+        values = series.tolist()
+        # tolist() already gives Python values for NumPy numeric and datetime columns
+        if not isinstance(series.dtype, np.dtype) or series.dtype.kind == 'O':
+            values = [native(value) for value in values]
+        columns.append((str(name), all_rows, values))
+    return columns
+
+
+def _pack_block(content: Any, encoder: json.JSONEncoder, compression_level: int):
+    """(bytes, compression) for one block, zlib-compressed when that is smaller"""
+    raw = encoder.encode(content).encode('utf-8')
+    compressed = zlib.compress(raw, compression_level) if compression_level else raw
+    if len(compressed) < len(raw):
+        return compressed, 'zlib'
+    return raw, 'none'
+
+
+def _write_columnar_file(path: Path, header: Dict[str, Any], blocks: Sequence[bytes],
+                         encoder: json.JSONEncoder) -> None:
+    """Write the header line and blocks to a temporary file that then replaces path"""
+    tmp_path = path.with_name(path.name + '.tmp')
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(encoder.encode(header).encode('utf-8') + b'\n')
+            for block in blocks:
+                f.write(block)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
+
+def write_columnar_endpoint(path: Union[str, Path], endpoint_data: Dict[str, Any],
+                            results_key: str = RESULTS_KEY, compression_level: int = COMPRESSION_LEVEL) -> int:
+    """
+    Write an endpoint object in the columnar format; returns the record count
+
+    endpoint_data[results_key] is a list of records or a pandas DataFrame
+    (written column by column, without building records). Other top-level
+    fields are kept in the header. Values JSON cannot represent are written
+    with str(), as json.dump(default=str) did. The file is replaced atomically.
+    """
+    path = Path(path)
+    results = endpoint_data.get(results_key, [])
+    if hasattr(results, 'iloc') and hasattr(results, 'columns'):
+        record_count = len(results)
+        columns = _collect_frame_columns(results)
+        key_orders = None
+    else:
+        record_count = len(results)
+        columns, key_orders = _collect_record_columns(results)
+
+    encoder = json.JSONEncoder(separators=(',', ':'), default=str)
+    index = []
+    blocks = []
+    offset = 0
+    for name, rows, values in columns:
+        block, compression = _pack_block(_encode_column(rows, values, record_count, encoder), encoder,
+                                         compression_level)
+        entry = {'name': name, 'count': len(rows), 'offset': offset, 'length': len(block),
+                 'compression': compression}
+        entry.update(_column_type(values))
+        index.append(entry)
+        blocks.append(block)
+        offset += len(block)
+
+    header = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'results_key': results_key,
+        'field_order': list(endpoint_data),
+        'fields': {key: value for key, value in endpoint_data.items() if key != results_key},
+        'record_count': record_count,
+        'columns': index
+    }
+    if key_orders is not None:
+        block, compression = _pack_block(key_orders, encoder, compression_level)
+        header['key_orders'] = {'offset': offset, 'length': len(block), 'compression': compression}
+        blocks.append(block)
+
+    _write_columnar_file(path, header, blocks, encoder)
+    return record_count
+
+
+class ColumnarEndpoint:
+    """
+    Reader for a columnar endpoint file.
+
+    Only the header is read on open; column() and columns() read and decode
+    just the requested column blocks.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            header_line = f.readline()
+            self._data_start = f.tell()
+        try:
+            header = json.loads(header_line)
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get('format') != FORMAT_NAME:
+            raise EndpointFormatError(f"{self.path.name} is not a columnar endpoint file")
+        if header.get('version') != FORMAT_VERSION:
+            raise EndpointFormatError(f"Unsupported columnar endpoint version {header.get('version')} in {self.path.name}")
+
+        self.results_key = header['results_key']
+        self.field_order = header['field_order']
+        self.fields = header['fields']
+        self.record_count = header['record_count']
+        self.column_info = {entry['name']: entry for entry in header['columns']}
+        self.column_names = [entry['name'] for entry in header['columns']]
+        self._header = header
+
+    def _read_raw(self, f, entry: Dict[str, Any]) -> bytes:
+        f.seek(self._data_start + entry['offset'])
+        return f.read(entry['length'])
+
+    def _read_entry(self, f, entry: Dict[str, Any]) -> Any:
+        data = self._read_raw(f, entry)
+        if entry['compression'] == 'zlib':
+            data = zlib.decompress(data)
+        return json.loads(data)
+
+    def _read_block(self, f, name: str) -> Dict[str, Any]:
+        return self._read_entry(f, self.column_info[name])
+
+    def _key_orders(self) -> Dict[int, List[str]]:
+        """Field order of each record whose fields are not in column order"""
+        entry = self._header.get('key_orders')
+        if entry is None:
+            return {}
+        with open(self.path, 'rb') as f:
+            key_orders = self._read_entry(f, entry)
+        layouts = [[self.column_names[position] for position in layout] for layout in key_orders['layouts']]
+        return {row: layouts[code] for row, code in zip(key_orders['rows'], key_orders['codes'])}
+
+    def column(self, name: str, default: Any = None) -> List[Any]:
+        """Values of one column, one per record (default where the record lacks the field)"""
+        return self.columns([name], default)[name]
+
+    def columns(self, names: Optional[Sequence[str]] = None, default: Any = None) -> Dict[str, List[Any]]:
+        """Values of several columns (all if names is None); unknown names raise KeyError"""
+        names = self.column_names if names is None else list(names)
+        with open(self.path, 'rb') as f:
+            return {name: _decode_column(self._read_block(f, name), self.record_count, default) for name in names}
+
+    def records(self, names: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Yield records with the given columns (all if None), leaving out fields a record lacks"""
+        if names is not None:
+            wanted = set(names)
+            names = [name for name in self.column_names if name in wanted]
+        else:
+            names = self.column_names
+        columns = self.columns(names, _ABSENT)
+        values = [columns[name] for name in names]
+        key_orders = self._key_orders()
+        for row in range(self.record_count):
+            layout = key_orders.get(row)
+            if layout is None:
+                yield {name: column[row] for name, column in zip(names, values) if column[row] is not _ABSENT}
+            else:
+                yield {name: columns[name][row] for name in layout if name in columns}
+
+    def select_columns(self, names: Sequence[str], fields: Optional[Dict[str, Any]] = None,
+                       destination: Union[str, Path, None] = None) -> int:
+        """
+        Rewrite the endpoint with only the named columns; returns the column count
+
+        Kept column blocks are copied without decoding them. fields, if given,
+        replaces the top-level fields; fields that already existed keep their
+        position and new ones go last. Writes to destination (default: this
+        file) through a temporary file.
+        """
+        wanted = set(names)
+        kept = [entry for entry in self._header['columns'] if entry['name'] in wanted]
+        encoder = json.JSONEncoder(separators=(',', ':'), default=str)
+        index = []
+        blocks = []
+        offset = 0
+        with open(self.path, 'rb') as f:
+            for entry in kept:
+                block = self._read_raw(f, entry)
+                index.append(dict(entry, offset=offset))
+                blocks.append(block)
+                offset += len(block)
+            key_orders = self._header.get('key_orders')
+            if key_orders is not None:
+                key_orders = self._read_entry(f, key_orders)
+
+        header = dict(self._header, columns=index)
+        header.pop('key_orders', None)
+        if fields is not None:
+            field_order = [key for key in self.field_order if key == self.results_key or key in fields]
+            header['field_order'] = field_order + [key for key in fields if key not in field_order]
+            header['fields'] = {key: value for key, value in fields.items() if key != self.results_key}
+        if key_orders is not None:
+            # Renumber the stored layouts for the remaining columns
+            old_positions = {name: position for position, name in enumerate(self.column_names)}
+            positions = {old_positions[entry['name']]: new for new, entry in enumerate(kept)}
+            key_orders['layouts'] = [[positions[position] for position in layout if position in positions]
+                                     for layout in key_orders['layouts']]
+            block, compression = _pack_block(key_orders, encoder, COMPRESSION_LEVEL)
+            header['key_orders'] = {'offset': offset, 'length': len(block), 'compression': compression}
+            blocks.append(block)
+
+        _write_columnar_file(Path(destination) if destination is not None else self.path, header, blocks, encoder)
+        return len(index)
+
+    def to_endpoint(self) -> Dict[str, Any]:
+        """The whole endpoint as today's JSON object, with top-level fields in their original order"""
+        return {key: list(self.records()) if key == self.results_key else self.fields[key]
+                for key in self.field_order}
+
+    def export_json(self, destination: Union[str, Path]) -> int:
+        """Write today's `{"results": [...]}` JSON, streaming the records; returns the record count"""
+        with EndpointWriter(destination, self.results_key) as writer:
+            for key in self.field_order:
+                if key == self.results_key:
+                    writer.write_records(self.records())
+                else:
+                    writer.write_field(key, self.fields[key])
+            return writer.records_written
+
+
+def read_endpoint(path: Union[str, Path]) -> Dict[str, Any]:
+    """Load a JSON or columnar endpoint file as an endpoint object"""
+    if is_columnar(path):
+        return ColumnarEndpoint(path).to_endpoint()
+    return load_endpoint(path)
+
+
+def save_endpoint(path: Union[str, Path], endpoint_data: Dict[str, Any]) -> int:
+    """Write an endpoint object in the format its file name implies; returns the record count"""
+    if is_columnar(path):
+        return write_columnar_endpoint(path, endpoint_data)
+    return write_endpoint(path, endpoint_data)
+
+
+def export_endpoints(source: Union[str, Path], destination: Union[str, Path]) -> List[Path]:
+    """
+    Publish step: export columnar endpoint files as JSON
+
+    source is a columnar file or a directory of them; destination is a file
+    (for a single source file) or a directory that receives <endpoint>.json.
+    """
+    source, destination = Path(source), Path(destination)
+    sources = sorted(source.glob('*' + COLUMNAR_SUFFIX)) if source.is_dir() else [source]
+    if source.is_dir() or destination.is_dir() or not destination.suffix:
+        destination.mkdir(exist_ok=True, parents=True)
+        targets = [destination / f"{endpoint_name_of(path)}.json" for path in sources]
+    else:
+        targets = [destination]
+
+    for path, target in zip(sources, targets):
+        ColumnarEndpoint(path).export_json(target)
+    return targets
+
+
+def main():
+    """Command-line conversion between endpoint formats"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Columnar endpoint storage')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Export columnar endpoints as {"results": [...]} JSON')
+    export_parser.add_argument('source', help='Columnar endpoint file or directory')
+    export_parser.add_argument('destination', help='Output JSON file or directory')
+
+    import_parser = subparsers.add_parser('import', help='Convert a JSON endpoint file to the columnar format')
+    import_parser.add_argument('source', help='JSON endpoint file')
+    import_parser.add_argument('destination', nargs='?', help='Output file (default: next to the source)')
+
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        targets = export_endpoints(args.source, args.destination)
+        print(f"✅ Exported {len(targets)} endpoint(s) to JSON")
+    else:
+        source = Path(args.source)
+        destination = Path(args.destination) if args.destination else source.with_name(
+            endpoint_name_of(source) + COLUMNAR_SUFFIX)
+        record_count = write_columnar_endpoint(destination, load_endpoint(source))
+        size_change = destination.stat().st_size / max(source.stat().st_size, 1) * 100
+        print(f"✅ {destination}: {record_count} records ({size_change:.0f}% of the JSON size)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Formula Compiler - Compiles calculation-type semantic field formulas once
+Part of the Phase 3 implementation for unlimited project type scalability
+
+A `calculation` mapping such as {"formula": "TOTPOP_CY / HHPOP_CY", "fields": [...]}
+is parsed into a Python AST, checked against a small arithmetic whitelist and
+compiled to code objects that evaluate one record (Python floats) or whole
+columns (NumPy arrays). Column evaluation routes ** through Python's float pow
+so both give bit-identical results.
+"""
+
+import ast
+import math
+import re
+from typing import Dict, Any, Callable, Sequence
+
+import numpy as np
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Pow, ast.UAdd, ast.USub
+)
+
+
+class FormulaError(ValueError):
+    """Raised when a formula cannot be compiled"""
+
+
+def _column_pow(base, exponent):
+    """Elementwise Python float pow; np.power can differ from it in the last bit"""
+    base, exponent = np.broadcast_arrays(np.asarray(base, dtype=np.float64), np.asarray(exponent, dtype=np.float64))
+    result = np.empty(base.shape)
+    flat = result.reshape(-1)
+    for i, (b, e) in enumerate(zip(base.ravel().tolist(), exponent.ravel().tolist())):
+        try:
+            value = b ** e
+        except ArithmeticError:
+            value = math.nan
+        # A negative base with a fractional exponent gives a complex number
+        flat[i] = value if isinstance(value, float) else math.nan
+    return result
+
+
+class _ColumnPow(ast.NodeTransformer):
+    """Rewrite a ** b as _pow(a, b) for column evaluation"""
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Pow):
+            return ast.copy_location(
+                ast.Call(func=ast.Name(id='_pow', ctx=ast.Load()), args=[node.left, node.right], keywords=[]), node)
+        return node
+
+
+class CompiledFormula:
+    """
+    A validated, compiled calculation formula.
+
+    Field names are matched as whole names (longest first), so a field that is
+    a prefix of another never captures part of it, and names may be anything
+    that appears in `fields` (including ones that are not Python identifiers).
+    Any other name, a call, attribute access or other non-arithmetic syntax is
+    rejected when compiling.
+
+    Evaluation follows the engine's convention for bad input: division by
+    zero, overflow and other non-finite results evaluate to 0.0.
+    """
+
+    def __init__(self, formula: str, fields: Sequence[str]):
+        self.formula = formula
+        self.fields = list(dict.fromkeys(field for field in fields if isinstance(field, str) and field))
+        self.placeholders = {field: f'_f{i}' for i, field in enumerate(self.fields)}
+
+        expression = formula
+        if self.fields:
+            pattern = re.compile(
+                r'(?<![\w.])(' + '|'.join(re.escape(field) for field in sorted(self.fields, key=len, reverse=True))
+                + r')(?![\w])')
+            expression = pattern.sub(lambda match: self.placeholders[match.group(1)], formula)
+
+        try:
+            tree = ast.parse(expression.strip(), mode='eval')
+        except SyntaxError as e:
+            raise FormulaError(f"Invalid formula {formula!r}: {e.msg}") from None
+
+        known = set(self.placeholders.values())
+        used = set()
+        for node in ast.walk(tree):
+            if not isinstance(node, ALLOWED_NODES):
+                raise FormulaError(f"Unsupported syntax in formula {formula!r}: {type(node).__name__}")
+            if isinstance(node, ast.Name):
+                if node.id not in known:
+                    raise FormulaError(f"Unknown name {node.id!r} in formula {formula!r}")
+                used.add(node.id)
+            elif isinstance(node, ast.Constant) and (
+                    isinstance(node.value, bool) or not isinstance(node.value, (int, float))):
+                raise FormulaError(f"Unsupported constant {node.value!r} in formula {formula!r}")
+
+        # Fields the formula actually references, in config order
+        self.used_fields = [field for field in self.fields if self.placeholders[field] in used]
+        self._code = compile(tree, f'<formula {formula!r}>', 'eval')
+        column_tree = ast.fix_missing_locations(_ColumnPow().visit(ast.parse(expression.strip(), mode='eval')))
+        self._column_code = compile(column_tree, f'<formula {formula!r}>', 'eval')
+
+    def evaluate(self, values: Dict[str, float]) -> float:
+        """Evaluate for one record given field -> float values"""
+        namespace = {self.placeholders[field]: values.get(field, 0.0) for field in self.used_fields}
+        try:
+            result = float(eval(self._code, {'__builtins__': {}}, namespace))
+        except (ArithmeticError, TypeError):
+            return 0.0
+        return result if math.isfinite(result) else 0.0
+
+    def evaluate_record(self, record: Dict[str, Any], to_float: Callable[[Any], float]) -> float:
+        """Evaluate for one record, converting its raw field values with to_float"""
+        return self.evaluate({field: to_float(record.get(field, 0)) for field in self.used_fields})
+
+    def evaluate_columns(self, columns: Dict[str, np.ndarray], size: int) -> np.ndarray:
+        """Evaluate over whole float64 columns (field -> array of length size)"""
+        namespace = {self.placeholders[field]: columns[field] for field in self.used_fields}
+        with np.errstate(all='ignore'):
+            result = eval(self._column_code, {'__builtins__': {}, '_pow': _column_pow}, namespace)
+            result = np.broadcast_to(np.asarray(result, dtype=np.float64), (size,))
+            return np.where(np.isfinite(result), result, 0.0)
+
+
+def compile_formula(formula: str, fields: Sequence[str]) -> CompiledFormula:
+    """Compile a calculation formula; raises FormulaError if it is invalid"""
+    if not isinstance(formula, str) or not formula.strip():
+        raise FormulaError("Empty formula")
+    return CompiledFormula(formula, fields)
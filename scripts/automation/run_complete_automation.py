@@ -590,8 +590,9 @@ class CompleteAutomationPipeline:
         try:
             endpoints = self.results['endpoints']['endpoints']
             
-            # Initialize score calculator
-            calculator = AutomatedScoreCalculator()
+            # Initialize score calculator; endpoint files are scored in parallel
+            scoring_workers = self.config.get('scoring_workers', min(4, os.cpu_count() or 1))
+            calculator = AutomatedScoreCalculator(workers=scoring_workers)
             
             # Apply all scoring algorithms
             self.logger.info("🧮 Applying comprehensive scoring algorithms...")
@@ -603,6 +604,18 @@ class CompleteAutomationPipeline:
             
             scored_endpoints = scoring_results.get('endpoints_processed', 0)
             
+            # Slowest endpoints first, to show where Phase 6 time goes
+            endpoint_times = sorted(
+                ((name, result.get('wall_time_seconds', 0)) for name, result in scoring_results['scoring_results'].items()),
+                key=lambda item: item[1], reverse=True
+            )
+            for name, seconds in endpoint_times[:5]:
+                self.logger.info(f"   ⏱️  {name}: {seconds:.2f}s")
+            
+            unchanged = scoring_results.get('endpoints_unchanged', [])
+            if unchanged:
+                self.logger.info(f"⏭️  {len(unchanged)} endpoints unchanged since last scoring (see .scoring_manifest)")
+            
             # Store updated results
             self.results['endpoints']['endpoints'] = endpoints
             self.results['scores'] = {
@@ -1440,6 +1453,8 @@ Examples:
     parser.add_argument("--config", help="Optional configuration file path")
     parser.add_argument("--target", default="MP10128A_B_P", 
                        help="Target variable for model training (default: MP10128A_B_P - Used H&R Block Online to Prepare Taxes)")
+    parser.add_argument("--scoring-workers", type=int,
+                       help="Worker processes for Phase 6 score calculation (default: up to 4, 0 = one per CPU)")
     
     args = parser.parse_args()
     
@@ -1451,6 +1466,8 @@ Examples:
     
     # Add target variable to config
     config['target_variable'] = args.target
+    if args.scoring_workers is not None:
+        config['scoring_workers'] = args.scoring_workers
     
     # Initialize and run pipeline
     print(f"🚀 Starting Complete Automation Pipeline")
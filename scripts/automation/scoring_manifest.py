@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Scoring Manifest - Tracks which endpoint files are already scored with the current algorithms
+Part of the ArcGIS to Microservice Automation Pipeline
+
+The manifest records, per endpoint, the hash of the file as written after
+scoring and a fingerprint of the scoring code and configuration that
+produced it. An endpoint whose file and fingerprint both match can be
+skipped; regenerated endpoint files or edited algorithms are rescored.
+"""
+
+import hashlib
+import inspect
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+# Not a .json file, so tools that glob endpoint directories for *.json ignore it
+MANIFEST_FILENAME = '.scoring_manifest'
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's bytes"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_fingerprint(*parts: Any) -> str:
+    """
+    Fingerprint of code and configuration.
+
+    Functions, methods and classes contribute their source; anything else is
+    serialized as sorted JSON.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if inspect.isroutine(part) or inspect.isclass(part):
+            try:
+                text = inspect.getsource(part)
+            except (OSError, TypeError):
+                text = getattr(part, '__qualname__', repr(part))
+        else:
+            text = json.dumps(part, sort_keys=True, default=str)
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ScoringManifest:
+    """Per-endpoint record of the last successful scoring run, stored next to the endpoint files"""
+
+    def __init__(self, endpoints_dir: Path):
+        self.path = Path(endpoints_dir) / MANIFEST_FILENAME
+        self.logger = logging.getLogger(__name__)
+        self.entries = self._load()
+        self.dirty = False
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable scoring manifest {self.path}: {e}")
+            return {}
+        if data.get('version') != MANIFEST_VERSION:
+            return {}
+        return data.get('endpoints', {})
+
+    def get(self, endpoint_name: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(endpoint_name)
+
+    def record(self, endpoint_name: str, entry: Dict[str, Any]) -> None:
+        self.entries[endpoint_name] = entry
+        self.dirty = True
+
+    def forget(self, endpoint_name: str) -> None:
+        if self.entries.pop(endpoint_name, None) is not None:
+            self.dirty = True
+
+    def save(self) -> None:
+        """Write the manifest atomically if anything changed"""
+        if not self.dirty:
+            return
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'endpoints': self.entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
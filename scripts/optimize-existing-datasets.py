@@ -1,13 +1,19 @@
 #!/usr/bin/env python3
 """
 Optimize Existing Dataset Files
-Filters existing endpoint JSON files to only include fields from complete_field_list_keep.txt
+Filters existing endpoint JSON and columnar files to only include fields from complete_field_list_keep.txt
 """
 
-import json
 import os
+import sys
+from itertools import chain
+from pathlib import Path
 from typing import Dict, Any, Set
 
+sys.path.append(str(Path(__file__).parent / 'automation'))
+from endpoint_io import EndpointReader, EndpointWriter, pipeline
+from endpoint_store import COLUMNAR_SUFFIX, ColumnarEndpoint, is_columnar
+
 def load_fields_to_keep() -> Set[str]:
     """Load the list of fields to keep from the file."""
     try:
@@ -23,60 +29,82 @@ def filter_record(record: Dict[str, Any], fields_to_keep: Set[str]) -> Dict[str,
     """Filter a record to only include the specified fields."""
     return {key: value for key, value in record.items() if key in fields_to_keep}
 
+def optimization_metadata(original_field_count: int, filtered_field_count: int,
+                          fields_to_keep: Set[str]) -> Dict[str, Any]:
+    """Record of the optimization, stored in export_metadata."""
+    return {
+        'optimized': True,
+        'original_fields': original_field_count,
+        'filtered_fields': filtered_field_count,
+        'fields_kept': list(fields_to_keep),
+        'optimization_date': '2025-07-26'
+    }
+
+def optimize_columnar_file(file_path: str, fields_to_keep: Set[str]) -> bool:
+    """Drop columns from a columnar endpoint file; kept columns are copied without decoding."""
+    endpoint = ColumnarEndpoint(file_path)
+    if not endpoint.record_count:
+        print(f"   ⚠️ No results found in {file_path}")
+        return False
+    
+    kept = [name for name in endpoint.column_names if name in fields_to_keep]
+    print(f"   📊 Fields: {len(endpoint.column_names)} → {len(kept)}")
+    print(f"   📊 Records: {endpoint.record_count}")
+    
+    export_metadata = dict(endpoint.fields.get('export_metadata', {}))
+    export_metadata['optimization'] = optimization_metadata(len(endpoint.column_names), len(kept), fields_to_keep)
+    endpoint.select_columns(kept, fields=dict(endpoint.fields, export_metadata=export_metadata))
+    return True
+
+def optimize_json_file(file_path: str, fields_to_keep: Set[str]) -> bool:
+    """Stream a JSON endpoint file's records through the field filter."""
+    with EndpointWriter(file_path) as writer, EndpointReader(file_path) as reader:
+        records = reader.records()
+        first_record = next(records, None)
+        
+        # Filter the results if they exist
+        if first_record is None:
+            writer.abort()
+            print(f"   ⚠️ No results found in {file_path}")
+            return False
+        
+        original_field_count = len(first_record.keys())
+        filtered_field_count = len(filter_record(first_record, fields_to_keep).keys())
+        
+        # Export metadata is written after the results, once it has been updated
+        writer.write_fields({key: value for key, value in reader.fields.items() if key != 'export_metadata'})
+        record_count = writer.write_records(
+            pipeline(chain([first_record], records), lambda record: filter_record(record, fields_to_keep)))
+        
+        print(f"   📊 Fields: {original_field_count} → {filtered_field_count}")
+        print(f"   📊 Records: {record_count}")
+        
+        # Add optimization metadata
+        export_metadata = reader.fields.pop('export_metadata', {})
+        export_metadata['optimization'] = optimization_metadata(original_field_count, filtered_field_count,
+                                                                fields_to_keep)
+        writer.write_fields(reader.fields)
+        writer.write_field('export_metadata', export_metadata)
+    return True
+
 def optimize_endpoint_file(file_path: str, fields_to_keep: Set[str]) -> bool:
-    """Optimize a single endpoint JSON file by filtering fields."""
+    """Optimize a single endpoint JSON or columnar file by filtering fields."""
     print(f"\n📄 Optimizing: {os.path.basename(file_path)}")
     
     try:
-        # Load the file
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        
         # Get original file size
         original_size = os.path.getsize(file_path) / (1024 * 1024)  # MB
         
-        # Filter the results if they exist
-        if 'results' in data and data['results']:
-            original_field_count = len(data['results'][0].keys()) if data['results'] else 0
-            
-            # Filter each record
-            filtered_results = []
-            for record in data['results']:
-                filtered_record = filter_record(record, fields_to_keep)
-                filtered_results.append(filtered_record)
-            
-            data['results'] = filtered_results
-            
-            filtered_field_count = len(filtered_results[0].keys()) if filtered_results else 0
-            print(f"   📊 Fields: {original_field_count} → {filtered_field_count}")
-            print(f"   📊 Records: {len(filtered_results)}")
-            
-            # Add optimization metadata
-            if 'export_metadata' not in data:
-                data['export_metadata'] = {}
-            
-            data['export_metadata']['optimization'] = {
-                'optimized': True,
-                'original_fields': original_field_count,
-                'filtered_fields': filtered_field_count,
-                'fields_kept': list(fields_to_keep),
-                'optimization_date': '2025-07-26'
-            }
-            
-            # Save the optimized file (overwrite original)
-            with open(file_path, 'w') as f:
-                json.dump(data, f, indent=2, default=str)
-            
-            # Get new file size
-            new_size = os.path.getsize(file_path) / (1024 * 1024)  # MB
-            reduction = ((original_size - new_size) / original_size) * 100
-            
-            print(f"   💾 Size: {original_size:.1f}MB → {new_size:.1f}MB ({reduction:.1f}% reduction)")
-            return True
-            
-        else:
-            print(f"   ⚠️ No results found in {file_path}")
+        optimize = optimize_columnar_file if is_columnar(file_path) else optimize_json_file
+        if not optimize(file_path, fields_to_keep):
             return False
+        
+        # Get new file size
+        new_size = os.path.getsize(file_path) / (1024 * 1024)  # MB
+        reduction = ((original_size - new_size) / original_size) * 100
+        
+        print(f"   💾 Size: {original_size:.1f}MB → {new_size:.1f}MB ({reduction:.1f}% reduction)")
+        return True
             
     except Exception as e:
         print(f"   ❌ Error processing {file_path}: {str(e)}")
@@ -100,11 +128,12 @@ def main():
         print(f"❌ Directory {endpoints_dir} not found!")
         return
     
-    # Get all JSON files in the endpoints directory (excluding combined files)
-    json_files = [f for f in os.listdir(endpoints_dir) 
-                  if f.endswith('.json') and f not in ['all_endpoints.json', 'export_summary.json']]
+    # Get all JSON and columnar files in the endpoints directory (excluding combined files)
+    endpoint_files = [f for f in os.listdir(endpoints_dir) 
+                      if (f.endswith('.json') or f.endswith(COLUMNAR_SUFFIX))
+                      and f not in ['all_endpoints.json', 'export_summary.json']]
     
-    print(f"📁 Found {len(json_files)} endpoint files to optimize")
+    print(f"📁 Found {len(endpoint_files)} endpoint files to optimize")
     print(f"🎯 Will keep {len(fields_to_keep)} fields per record")
     
     successful_optimizations = 0
@@ -112,11 +141,11 @@ def main():
     total_new_size = 0
     
     # Process each file
-    for i, filename in enumerate(sorted(json_files), 1):
+    for i, filename in enumerate(sorted(endpoint_files), 1):
         file_path = os.path.join(endpoints_dir, filename)
         original_size = os.path.getsize(file_path) / (1024 * 1024)
         
-        print(f"\n[{i}/{len(json_files)}] {filename} ({original_size:.1f}MB)")
+        print(f"\n[{i}/{len(endpoint_files)}] {filename} ({original_size:.1f}MB)")
         
         if optimize_endpoint_file(file_path, fields_to_keep):
             successful_optimizations += 1
@@ -130,7 +159,7 @@ def main():
     print("\n" + "=" * 50)
     print("📊 OPTIMIZATION SUMMARY")
     print("=" * 50)
-    print(f"✅ Successfully optimized: {successful_optimizations}/{len(json_files)} files")
+    print(f"✅ Successfully optimized: {successful_optimizations}/{len(endpoint_files)} files")
     print(f"📋 Fields per record: {len(fields_to_keep)} (reduced from ~1,086)")
     print(f"💾 Total size: {total_original_size:.1f}MB → {total_new_size:.1f}MB")
     print(f"🎯 Overall reduction: {total_reduction:.1f}%")
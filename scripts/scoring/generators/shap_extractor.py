@@ -8,11 +8,22 @@ and microservice export data to support data-driven scoring algorithm generation
 
 import json
 import os
+import sys
+from array import array
+from itertools import chain
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, Iterable, List, Any, Optional, Tuple
 import pandas as pd
 import numpy as np
 
+sys.path.append(str(Path(__file__).resolve().parents[2] / 'automation'))
+from endpoint_io import EndpointReader
+from endpoint_store import COLUMNAR_SUFFIX, ColumnarEndpoint
+
+# Columnar types that can hold numbers; only these columns (and the target) are read.
+# A number stored as text in a str column therefore counts only in JSON records.
+NUMERIC_COLUMN_TYPES = ('int', 'float', 'number', 'bool', 'json')
+
 class LocalSHAPExtractor:
     """Extract and analyze SHAP feature importance from existing endpoint data"""
     
@@ -32,20 +43,20 @@ class LocalSHAPExtractor:
             
         print(f"🔍 Extracting SHAP data from {endpoints_path}")
         
-        # Load feature importance ranking endpoint
+        # Load feature importance ranking endpoint, preferring its columnar file
         feature_importance_file = endpoints_path / "feature-importance-ranking.json"
+        columnar_file = endpoints_path / f"feature-importance-ranking{COLUMNAR_SUFFIX}"
+        
+        if columnar_file.exists():
+            return self._analyze_columnar_feature_importance(ColumnarEndpoint(columnar_file))
         
         if not feature_importance_file.exists():
             print(f"❌ Feature importance file not found: {feature_importance_file}")
             return {}
             
-        with open(feature_importance_file, 'r') as f:
-            feature_data = json.load(f)
-            
-        print(f"📊 Loaded {len(feature_data.get('results', []))} feature importance records")
-        
-        # Extract SHAP importance patterns
-        shap_data = self._analyze_feature_importance(feature_data)
+        # Extract SHAP importance patterns, streaming the records
+        with EndpointReader(feature_importance_file) as reader:
+            shap_data = self._analyze_feature_importance(reader.records())
         
         return shap_data
     
@@ -109,17 +120,61 @@ class LocalSHAPExtractor:
         print("⚠️  Using default target variable: MP10128A_B_P")
         return "MP10128A_B_P"
     
-    def _analyze_feature_importance(self, feature_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Analyze feature importance from endpoint data"""
+    def _analyze_feature_importance(self, records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Analyze feature importance from endpoint records in a single pass"""
         
-        results = feature_data.get('results', [])
-        if not results:
+        records = iter(records)
+        sample_record = next(records, None)
+        if sample_record is None:
             return {}
-            
-        print(f"🔍 Analyzing all available fields from {len(results)} records...")
+        
+        target_variable, candidate_fields = self._select_candidate_fields(sample_record)
+        
+        # Collect only the candidate columns, so records can be discarded as they stream by
+        columns = {field_name: (array('d'), array('d')) for field_name in candidate_fields}
+        record_count = 0
+        for record in chain([sample_record], records):
+            record_count += 1
+            for field_name, (field_values, target_values) in columns.items():
+                self._collect_field_pair(record, field_name, target_variable, field_values, target_values)
+        
+        print(f"📊 Loaded {record_count} feature importance records")
+        return self._summarize_importance(columns)
+    
+    def _analyze_columnar_feature_importance(self, endpoint: ColumnarEndpoint) -> Dict[str, Any]:
+        """
+        Analyze feature importance from a columnar endpoint, decoding only the
+        columns whose stored type can hold numbers, plus the target
+        """
+        if not endpoint.record_count:
+            return {}
+        
+        target_variable = self._get_target_variable()
+        names = [name for name in endpoint.column_names
+                 if endpoint.column_info[name]['type'] in NUMERIC_COLUMN_TYPES or name == target_variable]
+        data = endpoint.columns(names)
+        # The first record's numeric values decide the candidates, as for JSON records
+        sample_record = {name: values[0] for name, values in data.items()}
+        _, candidate_fields = self._select_candidate_fields(sample_record, target_variable)
+        
+        target_column = data.get(target_variable, [None] * endpoint.record_count)
+        columns = {}
+        for field_name in candidate_fields:
+            field_values, target_values = array('d'), array('d')
+            for field_val, target_val in zip(data[field_name], target_column):
+                self._collect_value_pair(field_val, target_val, field_values, target_values)
+            columns[field_name] = (field_values, target_values)
+        
+        print(f"📊 Loaded {endpoint.record_count} feature importance records ({len(names)} columns read)")
+        return self._summarize_importance(columns)
+    
+    def _select_candidate_fields(self, sample_record: Dict[str, Any],
+                                 target_variable: Optional[str] = None) -> Tuple[str, List[str]]:
+        """Target variable and the numeric fields to correlate with it, judged by a sample record"""
+        
+        print("🔍 Analyzing all available fields from the feature importance records...")
         
         # Get first record to identify all available fields
-        sample_record = results[0]
         all_fields = list(sample_record.keys())
         
         print(f"📊 Found {len(all_fields)} total fields in dataset")
@@ -135,15 +190,20 @@ class LocalSHAPExtractor:
         # Prefer percentage fields over count fields when both exist
         preferred_fields = self._prefer_percentage_fields(numeric_fields)
         
+        if target_variable is None:
+            target_variable = self._get_target_variable()
+        # Skip target variable to avoid circular scoring
+        candidate_fields = [field_name for field_name in preferred_fields if field_name != target_variable]
+        return target_variable, candidate_fields
+    
+    def _summarize_importance(self, columns: Dict[str, Tuple[array, array]]) -> Dict[str, Any]:
+        """Importance analysis from each candidate field's paired field and target values"""
+        
         # Calculate importance scores for all preferred fields
         field_importance = {}
-        target_variable = self._get_target_variable()
         
-        for field_name in preferred_fields:
-            if field_name == target_variable:
-                continue  # Skip target variable to avoid circular scoring
-                
-            importance_score = self._calculate_field_importance(results, field_name, target_variable)
+        for field_name, (field_values, target_values) in columns.items():
+            importance_score = self._correlation_importance(field_values, target_values)
             if importance_score > 0.1:  # Only include fields with meaningful correlation
                 field_importance[field_name] = importance_score
         
@@ -641,23 +701,24 @@ class LocalSHAPExtractor:
         except (ValueError, TypeError):
             return False
     
-    def _calculate_field_importance(self, results: List[Dict], field_name: str, target_variable: str) -> float:
-        """Calculate importance score for a field based on correlation with target"""
-        
-        field_values = []
-        target_values = []
-        
-        for record in results:
-            field_val = record.get(field_name, 0)
-            target_val = record.get(target_variable, 0)
-            
-            # Only include records with both values
-            if field_val and target_val:
-                try:
-                    field_values.append(float(field_val))
-                    target_values.append(float(target_val))
-                except (ValueError, TypeError):
-                    continue
+    def _collect_field_pair(self, record: Dict, field_name: str, target_variable: str,
+                            field_values, target_values) -> None:
+        """Append a record's field and target values when both are present"""
+        self._collect_value_pair(record.get(field_name, 0), record.get(target_variable, 0),
+                                 field_values, target_values)
+    
+    def _collect_value_pair(self, field_val: Any, target_val: Any, field_values, target_values) -> None:
+        """Append a field and target value pair when both are present"""
+        # Only include records with both values
+        if field_val and target_val:
+            try:
+                field_values.append(float(field_val))
+                target_values.append(float(target_val))
+            except (ValueError, TypeError):
+                pass
+    
+    def _correlation_importance(self, field_values, target_values) -> float:
+        """Importance score from paired field and target values"""
         
         if len(field_values) < 10:  # Need minimum data points
             return 0.0
@@ -4,10 +4,16 @@ Smart Dataset Optimization
 Preserves analysis-specific computed fields while filtering unnecessary raw demographic data
 """
 
-import json
 import os
+import sys
+from itertools import chain
+from pathlib import Path
 from typing import Dict, Any, Set, List
 
+sys.path.append(str(Path(__file__).parent / 'automation'))
+from endpoint_io import EndpointReader, EndpointWriter, pipeline
+from endpoint_store import COLUMNAR_SUFFIX, ColumnarEndpoint, endpoint_name_of, is_columnar
+
 def load_core_fields() -> Set[str]:
     """Load the core demographic fields to keep from complete_field_list_keep.txt."""
     try:
@@ -72,8 +78,8 @@ def get_computed_field_patterns() -> Dict[str, List[str]]:
 
 def detect_analysis_type(filename: str) -> str:
     """Detect analysis type from filename."""
-    # Remove .json extension and convert hyphens to underscores
-    base_name = filename.replace('.json', '').replace('-', '_')
+    # Remove the .json/.columnar extension and convert hyphens to underscores
+    base_name = endpoint_name_of(filename).replace('-', '_')
     
     # Check for exact matches first
     computed_patterns = get_computed_field_patterns()
@@ -124,8 +130,79 @@ def get_fields_to_preserve(all_fields: List[str], analysis_type: str, core_field
     
     return fields_to_keep
 
+def smart_optimization_metadata(analysis_type: str, original_field_count: int, fields_to_preserve: Set[str],
+                                core_fields: Set[str]) -> Dict[str, Any]:
+    """Record of the optimization, stored in export_metadata."""
+    return {
+        'optimized': True,
+        'analysis_type': analysis_type,
+        'original_fields': original_field_count,
+        'preserved_fields': len(fields_to_preserve),
+        'core_demographic_fields': len(core_fields),
+        'computed_fields_preserved': len(fields_to_preserve) - len(core_fields & fields_to_preserve),
+        'optimization_date': '2025-07-26',
+        'preserved_field_sample': sorted(list(fields_to_preserve))[:20]  # Sample for debugging
+    }
+
+def optimize_columnar_file(file_path: str, analysis_type: str, core_fields: Set[str]) -> bool:
+    """Drop columns from a columnar endpoint file; kept columns are copied without decoding."""
+    endpoint = ColumnarEndpoint(file_path)
+    if not endpoint.record_count:
+        print(f"   ⚠️ No results found in {file_path}")
+        return False
+    
+    all_fields = endpoint.column_names
+    original_field_count = len(all_fields)
+    fields_to_preserve = get_fields_to_preserve(all_fields, analysis_type, core_fields)
+    
+    print(f"   📊 Fields: {original_field_count} → {len(fields_to_preserve)} (preserving {len(fields_to_preserve)}/{original_field_count})")
+    print(f"   📊 Records: {endpoint.record_count}")
+    
+    export_metadata = dict(endpoint.fields.get('export_metadata', {}))
+    export_metadata['smart_optimization'] = smart_optimization_metadata(
+        analysis_type, original_field_count, fields_to_preserve, core_fields)
+    endpoint.select_columns([name for name in all_fields if name in fields_to_preserve],
+                            fields=dict(endpoint.fields, export_metadata=export_metadata))
+    return True
+
+def optimize_json_file(file_path: str, analysis_type: str, core_fields: Set[str]) -> bool:
+    """Stream a JSON endpoint file's records through the analysis-aware field filter."""
+    with EndpointWriter(file_path) as writer, EndpointReader(file_path) as reader:
+        records = reader.records()
+        sample_record = next(records, None)
+        
+        # Process the results if they exist
+        if sample_record is None:
+            writer.abort()
+            print(f"   ⚠️ No results found in {file_path}")
+            return False
+        
+        all_fields = list(sample_record.keys())
+        original_field_count = len(all_fields)
+        
+        # Determine fields to preserve for this analysis type
+        fields_to_preserve = get_fields_to_preserve(all_fields, analysis_type, core_fields)
+        
+        print(f"   📊 Fields: {original_field_count} → {len(fields_to_preserve)} (preserving {len(fields_to_preserve)}/{original_field_count})")
+        
+        # Filter each record; export metadata is written after the results, once it has been updated
+        writer.write_fields({key: value for key, value in reader.fields.items() if key != 'export_metadata'})
+        record_count = writer.write_records(pipeline(
+            chain([sample_record], records),
+            lambda record: {key: value for key, value in record.items() if key in fields_to_preserve}))
+        
+        print(f"   📊 Records: {record_count}")
+        
+        # Add optimization metadata
+        export_metadata = reader.fields.pop('export_metadata', {})
+        export_metadata['smart_optimization'] = smart_optimization_metadata(
+            analysis_type, original_field_count, fields_to_preserve, core_fields)
+        writer.write_fields(reader.fields)
+        writer.write_field('export_metadata', export_metadata)
+    return True
+
 def optimize_endpoint_file(file_path: str, core_fields: Set[str]) -> bool:
-    """Optimize a single endpoint JSON file with analysis-aware field preservation."""
+    """Optimize a single endpoint JSON or columnar file with analysis-aware field preservation."""
     filename = os.path.basename(file_path)
     analysis_type = detect_analysis_type(filename)
     
@@ -133,64 +210,19 @@ def optimize_endpoint_file(file_path: str, core_fields: Set[str]) -> bool:
     print(f"   🔍 Analysis type: {analysis_type}")
     
     try:
-        # Load the file
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        
         # Get original file size
         original_size = os.path.getsize(file_path) / (1024 * 1024)  # MB
         
-        # Process the results if they exist
-        if 'results' in data and data['results']:
-            sample_record = data['results'][0]
-            all_fields = list(sample_record.keys())
-            original_field_count = len(all_fields)
-            
-            # Determine fields to preserve for this analysis type
-            fields_to_preserve = get_fields_to_preserve(all_fields, analysis_type, core_fields)
-            
-            print(f"   📊 Fields: {original_field_count} → {len(fields_to_preserve)} (preserving {len(fields_to_preserve)}/{original_field_count})")
-            
-            # Filter each record
-            filtered_results = []
-            for record in data['results']:
-                filtered_record = {key: value for key, value in record.items() 
-                                 if key in fields_to_preserve}
-                filtered_results.append(filtered_record)
-            
-            data['results'] = filtered_results
-            
-            print(f"   📊 Records: {len(filtered_results)}")
-            
-            # Add optimization metadata
-            if 'export_metadata' not in data:
-                data['export_metadata'] = {}
-            
-            data['export_metadata']['smart_optimization'] = {
-                'optimized': True,
-                'analysis_type': analysis_type,
-                'original_fields': original_field_count,
-                'preserved_fields': len(fields_to_preserve),
-                'core_demographic_fields': len(core_fields),
-                'computed_fields_preserved': len(fields_to_preserve) - len(core_fields & fields_to_preserve),
-                'optimization_date': '2025-07-26',
-                'preserved_field_sample': sorted(list(fields_to_preserve))[:20]  # Sample for debugging
-            }
-            
-            # Save the optimized file (overwrite original)
-            with open(file_path, 'w') as f:
-                json.dump(data, f, indent=2, default=str)
-            
-            # Get new file size
-            new_size = os.path.getsize(file_path) / (1024 * 1024)  # MB
-            reduction = ((original_size - new_size) / original_size) * 100
-            
-            print(f"   💾 Size: {original_size:.1f}MB → {new_size:.1f}MB ({reduction:.1f}% reduction)")
-            return True
-            
-        else:
-            print(f"   ⚠️ No results found in {file_path}")
+        optimize = optimize_columnar_file if is_columnar(file_path) else optimize_json_file
+        if not optimize(file_path, analysis_type, core_fields):
             return False
+        
+        # Get new file size
+        new_size = os.path.getsize(file_path) / (1024 * 1024)  # MB
+        reduction = ((original_size - new_size) / original_size) * 100
+        
+        print(f"   💾 Size: {original_size:.1f}MB → {new_size:.1f}MB ({reduction:.1f}% reduction)")
+        return True
             
     except Exception as e:
         print(f"   ❌ Error processing {file_path}: {str(e)}")
@@ -214,11 +246,12 @@ def main():
         print(f"❌ Directory {endpoints_dir} not found!")
         return
     
-    # Get all JSON files in the endpoints directory (excluding combined files)
-    json_files = [f for f in os.listdir(endpoints_dir) 
-                  if f.endswith('.json') and f not in ['all_endpoints.json', 'export_summary.json']]
+    # Get all JSON and columnar files in the endpoints directory (excluding combined files)
+    endpoint_files = [f for f in os.listdir(endpoints_dir) 
+                      if (f.endswith('.json') or f.endswith(COLUMNAR_SUFFIX))
+                      and f not in ['all_endpoints.json', 'export_summary.json']]
     
-    print(f"📁 Found {len(json_files)} endpoint files to optimize")
+    print(f"📁 Found {len(endpoint_files)} endpoint files to optimize")
     print(f"🎯 Core demographic fields: {len(core_fields)}")
     print(f"🧠 Will preserve analysis-specific computed fields per endpoint")
     
@@ -228,14 +261,14 @@ def main():
     analysis_type_counts = {}
     
     # Process each file
-    for i, filename in enumerate(sorted(json_files), 1):
+    for i, filename in enumerate(sorted(endpoint_files), 1):
         file_path = os.path.join(endpoints_dir, filename)
         original_size = os.path.getsize(file_path) / (1024 * 1024)
         
         analysis_type = detect_analysis_type(filename)
         analysis_type_counts[analysis_type] = analysis_type_counts.get(analysis_type, 0) + 1
         
-        print(f"\n[{i}/{len(json_files)}] {filename} ({original_size:.1f}MB)")
+        print(f"\n[{i}/{len(endpoint_files)}] {filename} ({original_size:.1f}MB)")
         
         if optimize_endpoint_file(file_path, core_fields):
             successful_optimizations += 1
@@ -249,7 +282,7 @@ def main():
     print("\n" + "=" * 60)
     print("📊 SMART OPTIMIZATION SUMMARY")
     print("=" * 60)
-    print(f"✅ Successfully optimized: {successful_optimizations}/{len(json_files)} files")
+    print(f"✅ Successfully optimized: {successful_optimizations}/{len(endpoint_files)} files")
     print(f"📋 Core demographic fields: {len(core_fields)}")
     print(f"💾 Total size: {total_original_size:.1f}MB → {total_new_size:.1f}MB")
     print(f"🎯 Overall reduction: {total_reduction:.1f}%")